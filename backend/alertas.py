@@ -0,0 +1,612 @@
+"""
+Regras de alerta avaliadas sobre as leituras aceitas pela API
+Substitui o alerta enviado pelo próprio robô (CallMeBot chamado direto do
+ESP32, com um http.GET() que travava o loop de amostragem): cada leitura
+gravada passa pelas regras no servidor e as notificações saem por uma
+thread de envio, sem atrasar a ingestão
+
+Tipos de regra (lista JSON no arquivo indicado em ALERTAS_REGRAS):
+- limite: valor do campo comparado ao limiar
+- variacao: variação do campo por segundo desde a leitura anterior do robô
+- media: média das últimas N leituras do robô
+
+Também pode ser executado como script:
+    python alertas.py --receptor --porta 8098
+    python alertas.py --benchmark 200000 --regras 50 --robos 100
+"""
+
+import argparse
+import json
+import operator
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.append(os.path.dirname(__file__))
+
+from influxdb_service import CAMPOS_PONTUACAO, ROBO_PADRAO
+from validacao import CAMPOS_OBRIGATORIOS, timestamp_leitura_ns
+
+
+TIPOS_REGRA = ('limite', 'variacao', 'media')
+
+OPERADORES = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le
+}
+
+# Campos que podem ser usados em regras (os de pontuação só existem com PONTUACAO=1)
+CAMPOS_ALERTA = CAMPOS_OBRIGATORIOS + [campo for campo, _ in CAMPOS_PONTUACAO]
+
+# Regra usada sem ALERTAS_REGRAS: a mesma decisão de tomarDecisao() no firmware
+REGRAS_PADRAO = [{
+    'nome': 'vida_detectada',
+    'tipo': 'limite',
+    'campo': 'probabilidade_vida',
+    'operador': '>',
+    'valor': 75,
+    'cooldown_s': 300,
+    'mensagem': '🚨 ALERTA! Alta probabilidade de vida detectada no planeta. '
+                '🌎 Probabilidade: {valor:.1f}% ({robo_id})'
+}]
+
+# Colocado na fila por fechar() para encerrar a thread de envio
+_PARAR = object()
+
+
+class EstadoRegra:
+    """Estado incremental de uma regra para um robô"""
+
+    __slots__ = ('valor_anterior', 'epoch_anterior', 'janela', 'soma', 'atualizacoes',
+                 'consecutivas', 'ultimo_disparo')
+
+    def __init__(self, tamanho_janela):
+        self.valor_anterior = None
+        self.epoch_anterior = None
+        self.janela = deque(maxlen=tamanho_janela) if tamanho_janela else None
+        self.soma = 0.0
+        self.atualizacoes = 0
+        self.consecutivas = 0
+        self.ultimo_disparo = None
+
+
+class Regra:
+    """Condição sobre um campo, avaliada em O(1) por leitura com estado por robô"""
+
+    def __init__(self, nome, tipo, campo, operador, valor, janela=10, consecutivas=1,
+                 cooldown_s=300, robo=None, mensagem=None):
+        """
+        Inicializar regra
+
+        Args:
+            nome: Identificador da regra (aparece nos alertas)
+            tipo: 'limite', 'variacao' (por segundo) ou 'media' (últimas N leituras)
+            campo: Campo da leitura avaliado
+            operador: '>', '>=', '<' ou '<='
+            valor: Limiar comparado ao valor medido
+            janela: Leituras na média (apenas tipo 'media')
+            consecutivas: Leituras seguidas com a condição antes de disparar (debounce)
+            cooldown_s: Intervalo mínimo entre alertas da regra para o mesmo robô
+            robo: Avaliar apenas este robô (None = todos)
+            mensagem: Texto do alerta; aceita os campos do alerta entre chaves
+                      (ex: '{robo_id}: {valor:.1f}')
+
+        Raises:
+            ValueError: Se algum parâmetro for inválido
+        """
+        if tipo not in TIPOS_REGRA:
+            raise ValueError(f'Regra {nome}: tipo deve ser um de {", ".join(TIPOS_REGRA)}')
+        if campo not in CAMPOS_ALERTA:
+            raise ValueError(f'Regra {nome}: campo desconhecido {campo}')
+        if operador not in OPERADORES:
+            raise ValueError(f'Regra {nome}: operador deve ser um de {" ".join(OPERADORES)}')
+        if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+            raise ValueError(f'Regra {nome}: valor deve ser numérico')
+        if tipo == 'media' and int(janela) < 1:
+            raise ValueError(f'Regra {nome}: janela deve ser maior que zero')
+
+        self.nome = nome
+        self.tipo = tipo
+        self.campo = campo
+        self.operador = operador
+        self.comparar = OPERADORES[operador]
+        self.valor = valor
+        self.janela = int(janela) if tipo == 'media' else 0
+        self.consecutivas = max(1, int(consecutivas))
+        self.cooldown_s = float(cooldown_s)
+        self.robo = robo
+        self.mensagem = mensagem or f'{nome}: {campo} {operador} {valor} ' + '({robo_id}: {valor:.2f})'
+
+        self.robos_acompanhados = 0
+        self.disparos = 0
+
+        # Validar o modelo da mensagem agora, e não no primeiro alerta
+        try:
+            self.mensagem.format(**self._alerta(ROBO_PADRAO, 0.0, 0.0))
+        except (KeyError, IndexError, ValueError) as e:
+            raise ValueError(f'Regra {nome}: mensagem inválida ({e})')
+
+    def novo_estado(self):
+        """Criar o estado da regra para um robô"""
+        self.robos_acompanhados += 1
+        return EstadoRegra(self.janela)
+
+    def medir(self, estado, valor, epoch):
+        """
+        Atualizar o estado com a leitura (tipos 'variacao' e 'media')
+
+        Returns:
+            float: Valor comparado ao limiar, ou None enquanto não há dados suficientes
+        """
+        if self.tipo == 'variacao':
+            anterior, epoch_anterior = estado.valor_anterior, estado.epoch_anterior
+            if epoch_anterior is not None and epoch <= epoch_anterior:
+                # Leitura atrasada ou repetida: não define uma variação
+                return None
+            estado.valor_anterior, estado.epoch_anterior = valor, epoch
+            if anterior is None:
+                return None
+            return (valor - anterior) / (epoch - epoch_anterior)
+
+        janela = estado.janela
+        if len(janela) == janela.maxlen:
+            estado.soma -= janela[0]
+        janela.append(valor)
+        estado.soma += valor
+        estado.atualizacoes += 1
+        if estado.atualizacoes % (self.janela * 100) == 0:
+            # Recalcular de tempos em tempos para não acumular erro de arredondamento
+            estado.soma = sum(janela)
+        if len(janela) < janela.maxlen:
+            return None
+        return estado.soma / len(janela)
+
+    def _alerta(self, robo, medido, epoch):
+        """Montar o dicionário do alerta"""
+        return {
+            'regra': self.nome,
+            'tipo': self.tipo,
+            'robo_id': robo,
+            'campo': self.campo,
+            'operador': self.operador,
+            'limiar': self.valor,
+            'valor': medido,
+            'timestamp': datetime.fromtimestamp(epoch, tz=timezone.utc).isoformat()
+        }
+
+    def disparar(self, robo, estado, medido, epoch, agora):
+        """
+        Registrar uma leitura que satisfez a condição e aplicar debounce e cooldown
+
+        Args:
+            robo: Robô da leitura
+            estado: EstadoRegra do robô
+            medido: Valor que satisfez a condição
+            epoch: Timestamp da leitura em segundos
+            agora: Instante atual (time.monotonic()) para o cooldown
+
+        Returns:
+            dict: Alerta disparado, ou None
+        """
+        estado.consecutivas += 1
+        if estado.consecutivas < self.consecutivas:
+            return None
+        if estado.ultimo_disparo is not None and agora - estado.ultimo_disparo < self.cooldown_s:
+            return None
+
+        estado.ultimo_disparo = agora
+        self.disparos += 1
+        alerta = self._alerta(robo, medido, epoch)
+        alerta['mensagem'] = self.mensagem.format(**alerta)
+        return alerta
+
+    def descrever(self):
+        """Configuração e contador de disparos (GET /alertas)"""
+        descricao = {
+            'nome': self.nome,
+            'tipo': self.tipo,
+            'campo': self.campo,
+            'operador': self.operador,
+            'valor': self.valor,
+            'consecutivas': self.consecutivas,
+            'cooldown_s': self.cooldown_s,
+            'robo': self.robo,
+            'robos_acompanhados': self.robos_acompanhados,
+            'disparos': self.disparos
+        }
+        if self.tipo == 'media':
+            descricao['janela'] = self.janela
+        return descricao
+
+
+def carregar_regras(caminho=None):
+    """
+    Ler as regras de um arquivo JSON (lista de objetos com os parâmetros de Regra)
+
+    Args:
+        caminho: Arquivo de regras (None = REGRAS_PADRAO)
+
+    Returns:
+        list: Regras
+
+    Raises:
+        ValueError: Se o arquivo não for uma lista de regras válidas
+        OSError: Se o arquivo não puder ser lido
+    """
+    if caminho is None:
+        especificacoes = REGRAS_PADRAO
+    else:
+        with open(caminho, encoding='utf-8') as arquivo:
+            try:
+                especificacoes = json.load(arquivo)
+            except json.JSONDecodeError as e:
+                raise ValueError(f'Arquivo de regras inválido: {e}')
+    if not isinstance(especificacoes, list):
+        raise ValueError('O arquivo de regras deve conter uma lista JSON')
+
+    regras = []
+    nomes = set()
+    for indice, especificacao in enumerate(especificacoes):
+        if not isinstance(especificacao, dict):
+            raise ValueError(f'Regra {indice} deve ser um objeto JSON')
+        especificacao = dict(especificacao)
+        especificacao.setdefault('nome', f'regra_{indice}')
+        if especificacao['nome'] in nomes:
+            raise ValueError(f'Regra {especificacao["nome"]} duplicada')
+        nomes.add(especificacao['nome'])
+        try:
+            regras.append(Regra(**especificacao))
+        except TypeError as e:
+            raise ValueError(f'Regra {especificacao["nome"]}: {e}')
+    return regras
+
+
+class MotorAlertas:
+    """Avalia as regras sobre cada leitura aceita e entrega os alertas ao despachante"""
+
+    def __init__(self, regras, despachante=None, historico=100, ocioso_s=3600, max_robos=10000):
+        """
+        Inicializar motor
+
+        Args:
+            regras: Lista de Regra
+            despachante: DespachanteAlertas que envia as notificações (None = apenas histórico)
+            historico: Alertas recentes mantidos para GET /alertas
+            ocioso_s: Tempo sem leituras após o qual o estado de um robô é descartado
+                      (nunca menor que o maior cooldown_s das regras)
+            max_robos: Máximo de robôs com estado; acima dele, o que está há mais
+                       tempo sem enviar é descartado
+        """
+        self.regras = list(regras)
+        self.despachante = despachante
+        self.ocioso_s = max([float(ocioso_s)] + [regra.cooldown_s for regra in self.regras])
+        self.max_robos = max(1, int(max_robos))
+
+        # Regras de todos os robôs e, à parte, as restritas a um robô
+        self._gerais = [regra for regra in self.regras if regra.robo is None]
+        self._por_robo = {}
+        for regra in self.regras:
+            if regra.robo is not None:
+                self._por_robo.setdefault(regra.robo, []).append(regra)
+
+        # robo -> [regras aplicáveis, estados na mesma ordem, última leitura
+        # (time.monotonic())], do robô que enviou há mais tempo para o mais recente
+        self._robos = OrderedDict()
+
+        self._recentes = deque(maxlen=max(1, int(historico)))
+        self._lock = threading.Lock()
+        self.disparados = 0
+        self.robos_descartados = 0
+
+    def _descartar_ociosos(self, agora):
+        """Descartar o estado dos robôs ociosos ou acima de max_robos (lock já adquirido)"""
+        robos = self._robos
+        limite = agora - self.ocioso_s
+        while robos and (len(robos) > self.max_robos or next(iter(robos.values()))[2] <= limite):
+            _, (regras, _, _) = robos.popitem(last=False)
+            for regra in regras:
+                regra.robos_acompanhados -= 1
+            self.robos_descartados += 1
+
+    def avaliar(self, leituras):
+        """
+        Avaliar leituras aceitas (chamado após a gravação)
+
+        Args:
+            leituras: Lista de leituras validadas
+
+        Returns:
+            list: Alertas disparados
+        """
+        alertas = []
+        agora = time.monotonic()
+        with self._lock:
+            for dados in leituras:
+                robo = dados.get('robo_id', ROBO_PADRAO)
+                aplicaveis = self._robos.get(robo)
+                if aplicaveis is None:
+                    regras = self._gerais + self._por_robo.get(robo, [])
+                    aplicaveis = self._robos[robo] = [
+                        regras, [regra.novo_estado() for regra in regras], agora
+                    ]
+                else:
+                    aplicaveis[2] = agora
+                    self._robos.move_to_end(robo)
+                epoch = timestamp_leitura_ns(dados) / 1_000_000_000
+
+                # Laço quente: uma comparação por regra, sem chamadas no caso comum
+                for regra, estado in zip(aplicaveis[0], aplicaveis[1]):
+                    valor = dados.get(regra.campo)
+                    if valor is None:
+                        continue
+                    if regra.tipo != 'limite':
+                        valor = regra.medir(estado, valor, epoch)
+                        if valor is None:
+                            continue
+                    if not regra.comparar(valor, regra.valor):
+                        estado.consecutivas = 0
+                        continue
+                    alerta = regra.disparar(robo, estado, valor, epoch, agora)
+                    if alerta is not None:
+                        alertas.append(alerta)
+            if alertas:
+                self._recentes.extend(alertas)
+                self.disparados += len(alertas)
+            self._descartar_ociosos(agora)
+
+        if self.despachante is not None:
+            for alerta in alertas:
+                self.despachante.enviar(alerta)
+        return alertas
+
+    def recentes(self, robo=None, limite=50):
+        """Últimos alertas disparados (mais recentes primeiro)"""
+        with self._lock:
+            alertas = list(self._recentes)
+        alertas.reverse()
+        if robo is not None:
+            alertas = [alerta for alerta in alertas if alerta['robo_id'] == robo]
+        return alertas[:limite]
+
+    def fechar(self):
+        """Encerrar o despachante, enviando os alertas pendentes"""
+        if self.despachante is not None:
+            self.despachante.fechar()
+
+
+class DestinoLog:
+    """Escreve o alerta no log do processo"""
+
+    nome = 'log'
+
+    def enviar(self, alerta):
+        print(f"🚨 {alerta['mensagem']}")
+
+
+class DestinoWebhook:
+    """Envia o alerta em JSON por POST (ex: o receptor local deste módulo)"""
+
+    nome = 'webhook'
+
+    def __init__(self, url, timeout_s=5):
+        self.url = url
+        self.timeout_s = timeout_s
+        self._sessao = requests.Session()
+
+    def enviar(self, alerta):
+        resposta = self._sessao.post(self.url, json=alerta, timeout=self.timeout_s)
+        resposta.raise_for_status()
+
+
+class DestinoCallMeBot:
+    """Envia a mensagem do alerta por WhatsApp via CallMeBot (como o firmware fazia)"""
+
+    nome = 'callmebot'
+    URL = 'https://api.callmebot.com/whatsapp.php'
+
+    def __init__(self, telefone, apikey, timeout_s=10):
+        self.telefone = telefone
+        self.apikey = apikey
+        self.timeout_s = timeout_s
+        self._sessao = requests.Session()
+
+    def enviar(self, alerta):
+        resposta = self._sessao.get(self.URL, params={
+            'phone': self.telefone,
+            'apikey': self.apikey,
+            'text': alerta['mensagem']
+        }, timeout=self.timeout_s)
+        resposta.raise_for_status()
+
+
+class DespachanteAlertas:
+    """Fila limitada com thread que entrega cada alerta aos destinos configurados"""
+
+    def __init__(self, destinos, capacidade=1000):
+        """
+        Inicializar despachante e thread de envio
+
+        Args:
+            destinos: Objetos com método enviar(alerta) (ex: DestinoWebhook)
+            capacidade: Alertas aguardando envio; acima disso os novos são descartados
+        """
+        self.destinos = list(destinos)
+        self._fila = queue.Queue(maxsize=max(1, int(capacidade)))
+
+        self.enviados = 0
+        self.falhas = 0
+        self.descartados = 0
+
+        self._thread = threading.Thread(target=self._executar, name='alertas', daemon=True)
+        self._thread.start()
+
+    def enviar(self, alerta):
+        """Enfileirar alerta (não bloqueia; descarta se a fila estiver cheia)"""
+        try:
+            self._fila.put_nowait(alerta)
+        except queue.Full:
+            self.descartados += 1
+
+    def pendentes(self):
+        """Número de alertas aguardando envio"""
+        return self._fila.qsize()
+
+    def _executar(self):
+        """Loop da thread de envio"""
+        while True:
+            alerta = self._fila.get()
+            if alerta is _PARAR:
+                return
+            for destino in self.destinos:
+                try:
+                    destino.enviar(alerta)
+                    self.enviados += 1
+                except Exception as e:
+                    print(f"Erro ao enviar alerta ({destino.nome}): {e}")
+                    self.falhas += 1
+
+    def fechar(self, timeout=10):
+        """Enviar os alertas pendentes e parar a thread"""
+        if not self._thread.is_alive():
+            return
+        try:
+            self._fila.put(_PARAR, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout=timeout)
+
+
+class ReceptorAlertas:
+    """Servidor HTTP local que recebe os alertas do DestinoWebhook (testes sem WhatsApp)"""
+
+    def __init__(self, host='127.0.0.1', porta=0, exibir=False):
+        """
+        Criar servidor (porta 0 escolhe uma porta livre)
+
+        Args:
+            host: Endereço de escuta
+            porta: Porta de escuta
+            exibir: Se True, imprime cada alerta recebido
+        """
+        self.recebidos = []
+        self._lock = threading.Lock()
+
+        receptor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                corpo = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                try:
+                    alerta = json.loads(corpo)
+                except ValueError:
+                    self.send_response(400)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                with receptor._lock:
+                    receptor.recebidos.append(alerta)
+                if exibir:
+                    print(f"📨 {alerta.get('mensagem', alerta)}")
+                self.send_response(204)
+                self.end_headers()
+
+        self._http = ThreadingHTTPServer((host, porta), Handler)
+        self._http.daemon_threads = True
+        self.host, self.porta = self._http.server_address[:2]
+
+    @property
+    def url(self):
+        """URL para configurar ALERTAS_WEBHOOK_URL"""
+        return f'http://{self.host}:{self.porta}/alertas'
+
+    def iniciar(self):
+        """Iniciar o servidor em uma thread em segundo plano"""
+        threading.Thread(target=self._http.serve_forever, name='receptor-alertas',
+                         daemon=True).start()
+        return self
+
+    def parar(self):
+        """Parar o servidor"""
+        self._http.shutdown()
+        self._http.server_close()
+
+
+def benchmark(quantidade, total_regras=50, robos=100):
+    """Medir o custo de avaliação por leitura com regras dos três tipos"""
+    gerador = random.Random(42)
+    regras = []
+    for indice in range(total_regras):
+        tipo = TIPOS_REGRA[indice % len(TIPOS_REGRA)]
+        regras.append(Regra(f'regra_{indice}', tipo, gerador.choice(CAMPOS_OBRIGATORIOS),
+                            gerador.choice(list(OPERADORES)), gerador.uniform(0, 100),
+                            janela=gerador.randint(5, 60), cooldown_s=60))
+    motor = MotorAlertas(regras)
+
+    inicio_ms = int(time.time() * 1000)
+    leituras = [{
+        'robo_id': f'robo_{indice % robos:03d}',
+        'timestamp': inicio_ms + indice * 10,
+        'temperatura_c': gerador.uniform(20, 30),
+        'umidade_pct': gerador.uniform(40, 70),
+        'luminosidade': gerador.randint(0, 1023),
+        'presenca': gerador.randint(0, 1),
+        'probabilidade_vida': gerador.uniform(0, 100)
+    } for indice in range(quantidade)]
+
+    inicio = time.perf_counter()
+    for posicao in range(0, quantidade, 100):
+        motor.avaliar(leituras[posicao:posicao + 100])
+    duracao = time.perf_counter() - inicio
+    print(f"📊 {quantidade} leituras de {robos} robôs x {total_regras} regras em {duracao:.3f}s "
+          f"({duracao / quantidade * 1e6:.1f} µs/leitura, {motor.disparados} alertas)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Regras de alerta das leituras')
+    parser.add_argument('--receptor', action='store_true',
+                        help='Subir um receptor local de alertas (ALERTAS_WEBHOOK_URL)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8098)
+    parser.add_argument('--validar', metavar='ARQUIVO', help='Verificar um arquivo de regras')
+    parser.add_argument('--benchmark', type=int, metavar='N',
+                        help='Avaliar N leituras sintéticas e medir o custo por leitura')
+    parser.add_argument('--regras', type=int, default=50, help='Regras no benchmark')
+    parser.add_argument('--robos', type=int, default=100, help='Robôs no benchmark')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark, args.regras, args.robos)
+    elif args.validar:
+        try:
+            regras = carregar_regras(args.validar)
+        except (OSError, ValueError) as e:
+            sys.exit(f"❌ {e}")
+        print(f"✅ {len(regras)} regras válidas")
+    elif args.receptor:
+        receptor = ReceptorAlertas(args.host, args.porta, exibir=True)
+        print(f"🧪 Receptor de alertas em {receptor.url}")
+        try:
+            receptor._http.serve_forever()
+        except KeyboardInterrupt:
+            print(f"\n📊 Alertas recebidos: {len(receptor.recebidos)}")
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
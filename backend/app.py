@@ -3,12 +3,34 @@ API Flask para receber e armazenar dados do robô explorador espacial
 Integração com InfluxDB Cloud
 """
 
-from flask import Flask, request, jsonify
-from flask_cors import CORS
+from flask import Flask, Response, request, jsonify, stream_with_context
 from datetime import datetime
+from flask_cors import CORS
+import atexit
+import json
+import math
 import os
+import time
 from dotenv import load_dotenv
-from influxdb_service import InfluxDBService
+from alertas import (DespachanteAlertas, DestinoCallMeBot, DestinoLog, DestinoWebhook,
+                     MotorAlertas, carregar_regras)
+from influxdb_service import ROBO_PADRAO, InfluxDBService, formatar_rfc3339
+from memoria_service import MemoriaService
+from compressao import CompressaoWSGI
+from deduplicacao import IndiceDeduplicacao, JanelaReordenacao, sem_timestamp
+from eventos import DifusorEventos, LimiteAssinantesError, formatar_evento
+from fila_escrita import FilaCheiaError
+from formato_binario import FormatoNaoSuportadoError, formato_binario, ler_binario
+from validacao import (CAMPOS_OBRIGATORIOS, leitura_publica, ler_lote, robo_id_valido,
+                       timestamp_leitura_ns, validar_leitura, validar_lote)
+from estatisticas_rolantes import EstatisticasRolantes
+from cache_consultas import CacheConsultas
+from leituras_recentes import BufferLeituras
+from metricas import ETAPAS, LEITURAS, REGISTRO
+from monitor_conexao import ESTADO_ERRO, MonitorConexao
+from perfil import AmostradorPerfil
+from pontuacao import PontuadorLeituras
+from rollups import CompactadorRollups
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -16,14 +38,396 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app)  # Permitir requisições de outros domínios
 
-# Inicializar serviço do InfluxDB
-influx_service = InfluxDBService(
-    url=os.getenv('INFLUXDB_URL'),
-    token=os.getenv('INFLUXDB_TOKEN'),
-    org=os.getenv('INFLUXDB_ORG'),
-    bucket=os.getenv('INFLUXDB_BUCKET')
+# Content-Encoding: descomprimir requisições (gzip/deflate/zstd) e comprimir
+# respostas conforme o Accept-Encoding
+app.wsgi_app = CompressaoWSGI(
+    app.wsgi_app,
+    comprimir_respostas=os.getenv('COMPRESSAO_RESPOSTAS', '1') == '1',
+    minimo_bytes=int(os.getenv('COMPRESSAO_MINIMO_BYTES', 1024)),
+    nivel=int(os.getenv('COMPRESSAO_NIVEL', 6)),
+    limite_descomprimido=int(os.getenv('MAX_CORPO_DESCOMPRIMIDO_MB', 16)) * 1024 * 1024
 )
 
+# Processos que atendem a API (workers do Gunicorn, definido pelo gunicorn.conf.py).
+# O estado em memória é de cada processo: com mais de um, os componentes que
+# respondem a partir do que o próprio processo recebeu ficam desligados por padrão
+PROCESSOS_API = int(os.getenv('PROCESSOS_API', 1))
+PADRAO_POR_PROCESSO = '1' if PROCESSOS_API == 1 else '0'
+
+# Backend de armazenamento: 'influxdb' (padrão) ou 'memoria' (local, sem rede)
+BACKEND_ARMAZENAMENTO = os.getenv('BACKEND_ARMAZENAMENTO', 'influxdb')
+
+# Inicializar serviço de armazenamento
+if BACKEND_ARMAZENAMENTO == 'memoria':
+    influx_service = MemoriaService(
+        arquivo_sqlite=os.getenv('MEMORIA_SQLITE') or None,
+        capacidade=int(os.getenv('MEMORIA_CAPACIDADE', 1000000)),
+        retencao_horas=float(os.getenv('MEMORIA_RETENCAO_HORAS', 0)) or None
+    )
+else:
+    influx_service = InfluxDBService(
+        url=os.getenv('INFLUXDB_URL'),
+        token=os.getenv('INFLUXDB_TOKEN'),
+        org=os.getenv('INFLUXDB_ORG'),
+        bucket=os.getenv('INFLUXDB_BUCKET'),
+        modo_escrita=os.getenv('INFLUXDB_MODO_ESCRITA', 'sincrono'),
+        opcoes_lote={
+            'tamanho_lote': int(os.getenv('INFLUXDB_LOTE_TAMANHO', 500)),
+            'intervalo_ms': int(os.getenv('INFLUXDB_LOTE_INTERVALO_MS', 1000)),
+            'capacidade': int(os.getenv('INFLUXDB_FILA_CAPACIDADE', 10000)),
+            'max_tentativas': int(os.getenv('INFLUXDB_LOTE_TENTATIVAS', 5)),
+            'jitter_ms': int(os.getenv('INFLUXDB_LOTE_JITTER_MS', 500))
+        },
+        diretorio_spool=os.getenv('SPOOL_DIR', 'spool'),
+        opcoes_spool={
+            'tamanho_segmento': int(os.getenv('SPOOL_SEGMENTO_MB', 16)) * 1024 * 1024,
+            'max_bytes': int(os.getenv('SPOOL_MAX_MB', 1024)) * 1024 * 1024,
+            'fsync_intervalo_ms': int(os.getenv('SPOOL_FSYNC_MS', 100)),
+            'tamanho_lote': int(os.getenv('SPOOL_LOTE_TAMANHO', 5000))
+        },
+        opcoes_cliente={
+            'timeout_ms': int(os.getenv('INFLUXDB_TIMEOUT_MS', 10000)),
+            'timeout_conexao_ms': int(os.getenv('INFLUXDB_TIMEOUT_CONEXAO_MS', 5000)),
+            'gzip': os.getenv('INFLUXDB_GZIP', '1') == '1',
+            'conexoes': int(os.getenv('INFLUXDB_POOL_CONEXOES', 0)) or None,
+            'keepalive_s': int(os.getenv('INFLUXDB_KEEPALIVE_S', 60)) or None
+        }
+    )
+
+# Limite de leituras aceitas em uma única requisição de lote
+MAX_LEITURAS_LOTE = int(os.getenv('MAX_LEITURAS_LOTE', 10000))
+
+# Janela aceita para o timestamp das leituras em torno do relógio do servidor
+# (TIMESTAMP_MAX_PASSADO_S=0: sem limite, para lotes offline antigos)
+JANELA_TIMESTAMP = {
+    'max_futuro_s': float(os.getenv('TIMESTAMP_MAX_FUTURO_S', 300)),
+    'max_passado_s': float(os.getenv('TIMESTAMP_MAX_PASSADO_S', 0)) or None
+}
+
+# Responder POST /leituras sem corpo mesmo sem o header Prefer: return=minimal
+RESPOSTA_MINIMA = os.getenv('RESPOSTA_MINIMA', '0') == '1'
+
+# Rollups de 1 minuto e 1 hora para consultas de períodos longos.
+# Só o processo que trava ROLLUPS_ESTADO compacta; os outros workers da
+# mesma máquina leem dele o período coberto
+if BACKEND_ARMAZENAMENTO != 'memoria' and os.getenv('ROLLUPS', '0') == '1':
+    influx_service.rollups = CompactadorRollups(
+        influx_service,
+        intervalo_s=int(os.getenv('ROLLUPS_INTERVALO_S', 60)),
+        atraso_s=int(os.getenv('ROLLUPS_ATRASO_S', 300)),
+        preenchimento_horas=int(os.getenv('ROLLUPS_PREENCHIMENTO_HORAS', 720)),
+        arquivo_estado=os.getenv('ROLLUPS_ESTADO', 'rollups_estado.json') or None
+    )
+
+# Máximo de pontos aceito em GET /leituras?pontos=N
+MAX_PONTOS = int(os.getenv('MAX_PONTOS', 5000))
+
+# Verificação periódica do banco em segundo plano; GET /health usa o último resultado
+monitor_conexao = None
+if os.getenv('MONITOR_CONEXAO', '1') == '1':
+    monitor_conexao = MonitorConexao(
+        influx_service,
+        intervalo_s=float(os.getenv('MONITOR_INTERVALO_S', 10)),
+        latencia_degradada_ms=float(os.getenv('MONITOR_LATENCIA_DEGRADADA_MS', 1000)),
+        backlog_degradado=float(os.getenv('MONITOR_BACKLOG_DEGRADADO', 0.5)),
+        sonda_escrita=os.getenv('MONITOR_SONDA_ESCRITA', '1') == '1'
+    )
+
+# Reenvios e replays já gravados são descartados antes da escrita
+deduplicacao = None
+if os.getenv('DEDUPLICACAO', '1') == '1':
+    deduplicacao = IndiceDeduplicacao(
+        janela_s=float(os.getenv('DEDUP_JANELA_S', 300)),
+        max_por_robo=int(os.getenv('DEDUP_MAX_POR_ROBO', 10000)),
+        janela_sem_timestamp_s=float(os.getenv('DEDUP_JANELA_SEM_TIMESTAMP_S', 0))
+    )
+
+
+def _apos_gravar_reordenadas(leituras, chaves):
+    """Chamado pela janela de reordenação depois da gravação: só então a leitura conta"""
+    if deduplicacao is not None:
+        deduplicacao.registrar(chaves)
+    _registrar_ingestao(leituras)
+
+
+def _liberar_reserva(chaves):
+    """Liberar as chaves reservadas pela deduplicação para leituras que não foram gravadas"""
+    if chaves and deduplicacao is not None:
+        deduplicacao.liberar(chaves)
+
+
+# Leituras retidas por alguns instantes e gravadas em ordem de robô e timestamp.
+# O 201 sai ao reter a leitura; deduplicação, estatísticas, eventos e alertas
+# são atualizados só depois da gravação
+janela_reordenacao = None
+if os.getenv('REORDENACAO', '0') == '1':
+    janela_reordenacao = JanelaReordenacao(
+        influx_service.salvar_leituras,
+        atraso_ms=int(os.getenv('REORDENACAO_ATRASO_MS', 2000)),
+        capacidade=int(os.getenv('REORDENACAO_CAPACIDADE', 10000)),
+        max_tentativas=int(os.getenv('REORDENACAO_TENTATIVAS', 5)),
+        arquivo_quarentena=os.getenv('REORDENACAO_QUARENTENA', 'reordenacao_quarentena.ndjson') or None,
+        apos_gravar=_apos_gravar_reordenadas,
+        apos_descartar=_liberar_reserva
+    )
+
+
+def encerrar():
+    """
+    Parar as threads em segundo plano e enviar as escritas pendentes
+    
+    Chamado ao encerrar o processo (atexit) e pelo hook worker_exit do
+    gunicorn.conf.py; chamadas repetidas não têm efeito.
+    """
+    if monitor_conexao is not None:
+        monitor_conexao.fechar()
+    if janela_reordenacao is not None:
+        janela_reordenacao.fechar()
+    if motor_alertas is not None:
+        motor_alertas.fechar()
+    influx_service.fechar()
+
+
+atexit.register(encerrar)
+
+# Estatísticas incrementais em memória (aquecidas com uma query ao InfluxDB)
+estatisticas_rolantes = None
+if os.getenv('ESTATISTICAS_MEMORIA', PADRAO_POR_PROCESSO) == '1':
+    estatisticas_rolantes = EstatisticasRolantes(
+        horizonte_horas=int(os.getenv('ESTATISTICAS_HORIZONTE_HORAS', 24)),
+        tolerancia_futuro_s=float(os.getenv('ESTATISTICAS_TOLERANCIA_FUTURO_S', 60))
+    )
+    estatisticas_rolantes.aquecer(influx_service)
+
+# Cache de curta duração para consultas repetidas ao InfluxDB
+cache_consultas = None
+if os.getenv('CACHE_CONSULTAS', '1') == '1':
+    cache_consultas = CacheConsultas(
+        ttl_ms=int(os.getenv('CACHE_TTL_MS', 1000)),
+        max_entradas=int(os.getenv('CACHE_MAX_ENTRADAS', 256)),
+        max_bytes=int(os.getenv('CACHE_MAX_MB', 32)) * 1024 * 1024
+    )
+
+# Últimas leituras de cada robô em memória, para GET /leituras sem InfluxDB
+buffer_leituras = None
+if os.getenv('BUFFER_LEITURAS', PADRAO_POR_PROCESSO) == '1':
+    buffer_leituras = BufferLeituras(
+        capacidade=int(os.getenv('BUFFER_CAPACIDADE', 1000)),
+        max_robos=int(os.getenv('BUFFER_MAX_ROBOS', 1000))
+    )
+    buffer_leituras.aquecer(influx_service)
+
+# Pontuação no servidor (probabilidade recalculada e anomalias por z-score),
+# gravada como campos extras de cada leitura
+pontuador = None
+if os.getenv('PONTUACAO', '0') == '1':
+    try:
+        pontuador = PontuadorLeituras(
+            janela=int(os.getenv('PONTUACAO_JANELA', 60)),
+            limiar=float(os.getenv('PONTUACAO_LIMIAR', 3.0))
+        )
+    except RuntimeError as e:
+        print(f"⚠️ {e}; pontuação desabilitada")
+
+# Regras de alerta avaliadas sobre as leituras aceitas (no lugar do alerta
+# enviado pelo firmware); as notificações saem por uma thread própria
+motor_alertas = None
+if os.getenv('ALERTAS', '1') == '1':
+    destinos_alertas = []
+    if os.getenv('ALERTAS_LOG', '1') == '1':
+        destinos_alertas.append(DestinoLog())
+    if os.getenv('ALERTAS_WEBHOOK_URL'):
+        destinos_alertas.append(DestinoWebhook(
+            os.getenv('ALERTAS_WEBHOOK_URL'),
+            timeout_s=float(os.getenv('ALERTAS_TIMEOUT_S', 5))
+        ))
+    if os.getenv('ALERTAS_CALLMEBOT_TELEFONE') and os.getenv('ALERTAS_CALLMEBOT_APIKEY'):
+        destinos_alertas.append(DestinoCallMeBot(
+            os.getenv('ALERTAS_CALLMEBOT_TELEFONE'),
+            os.getenv('ALERTAS_CALLMEBOT_APIKEY'),
+            timeout_s=float(os.getenv('ALERTAS_TIMEOUT_S', 5))
+        ))
+    try:
+        motor_alertas = MotorAlertas(
+            carregar_regras(os.getenv('ALERTAS_REGRAS') or None),
+            DespachanteAlertas(destinos_alertas,
+                               capacidade=int(os.getenv('ALERTAS_CAPACIDADE', 1000))),
+            historico=int(os.getenv('ALERTAS_HISTORICO', 100)),
+            ocioso_s=float(os.getenv('ALERTAS_OCIOSO_S', 3600)),
+            max_robos=int(os.getenv('ALERTAS_MAX_ROBOS', 10000))
+        )
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Regras de alerta inválidas ({e}); alertas desabilitados")
+
+# Difusão das leituras aceitas em GET /leituras/eventos (Server-Sent Events)
+difusor_eventos = None
+EVENTOS_HEARTBEAT_S = float(os.getenv('EVENTOS_HEARTBEAT_S', 15))
+if os.getenv('EVENTOS_HABILITADO', PADRAO_POR_PROCESSO) == '1':
+    difusor_eventos = DifusorEventos(
+        capacidade_assinante=int(os.getenv('EVENTOS_CAPACIDADE', 100)),
+        max_assinantes=int(os.getenv('EVENTOS_MAX_ASSINANTES', 100))
+    )
+
+# Com vários processos, avisar sobre o estado em memória que cada um mantém sozinho
+if PROCESSOS_API > 1:
+    por_processo = [nome for nome, componente in (
+        ('ESTATISTICAS_MEMORIA', estatisticas_rolantes), ('BUFFER_LEITURAS', buffer_leituras),
+        ('EVENTOS_HABILITADO', difusor_eventos), ('DEDUPLICACAO', deduplicacao),
+        ('REORDENACAO', janela_reordenacao), ('PONTUACAO', pontuador), ('ALERTAS', motor_alertas)
+    ) if componente is not None]
+    if BACKEND_ARMAZENAMENTO == 'memoria':
+        por_processo.insert(0, 'BACKEND_ARMAZENAMENTO=memoria')
+    if por_processo:
+        print(f"⚠️ {PROCESSOS_API} processos: {', '.join(por_processo)} mantêm estado em memória "
+              f"por processo e só enxergam as leituras recebidas por este worker")
+
+# Estado dos componentes, lido a cada coleta de GET /metrics
+if BACKEND_ARMAZENAMENTO == 'memoria':
+    REGISTRO.medidor('robo_memoria_descartadas_total',
+                     'Leituras antigas descartadas pelo limite do backend memoria',
+                     lambda: influx_service.descartadas, tipo='counter')
+fila_escrita = getattr(influx_service, 'fila', None)
+if fila_escrita is not None:
+    REGISTRO.medidor('robo_fila_profundidade', 'Leituras aguardando envio na fila de escrita',
+                     fila_escrita.profundidade)
+    REGISTRO.medidor('robo_fila_enviadas_total', 'Leituras enviadas pela fila de escrita',
+                     lambda: fila_escrita.enviados, tipo='counter')
+    REGISTRO.medidor('robo_fila_descartadas_total', 'Leituras descartadas após esgotar as tentativas',
+                     lambda: fila_escrita.descartados, tipo='counter')
+    REGISTRO.medidor('robo_fila_rejeitadas_total', 'Leituras recusadas pelo banco (4xx) e descartadas',
+                     lambda: fila_escrita.rejeitados, tipo='counter')
+spool_escrita = getattr(influx_service, 'spool', None)
+if spool_escrita is not None:
+    REGISTRO.medidor('robo_spool_pendentes_bytes', 'Bytes gravados no spool ainda não enviados',
+                     spool_escrita.pendentes_bytes)
+    REGISTRO.medidor('robo_spool_falhas_total', 'Falhas ao enviar o spool ao banco',
+                     lambda: spool_escrita.falhas, tipo='counter')
+    REGISTRO.medidor('robo_spool_rejeitadas_total', 'Linhas recusadas pelo banco e movidas para a quarentena',
+                     lambda: spool_escrita.rejeitados, tipo='counter')
+if estatisticas_rolantes is not None:
+    REGISTRO.medidor('robo_estatisticas_ignoradas_total',
+                     'Leituras com timestamp futuro ignoradas pelas estatísticas em memória',
+                     lambda: estatisticas_rolantes.ignoradas_futuro, tipo='counter')
+if cache_consultas is not None:
+    for nome in ('acertos', 'falhas', 'coalescidas', 'despejos'):
+        REGISTRO.medidor(f'robo_cache_{nome}_total', f'Cache de consultas: {nome}',
+                         lambda nome=nome: cache_consultas.estatisticas()[nome], tipo='counter')
+    REGISTRO.medidor('robo_cache_taxa_acertos', 'Fração das consultas atendidas pelo cache',
+                     lambda: cache_consultas.estatisticas()['taxa_acertos'])
+if buffer_leituras is not None:
+    REGISTRO.medidor('robo_buffer_acertos_total', 'Consultas respondidas pelo buffer de leituras',
+                     lambda: buffer_leituras.acertos, tipo='counter')
+    REGISTRO.medidor('robo_buffer_falhas_total', 'Consultas não cobertas pelo buffer de leituras',
+                     lambda: buffer_leituras.falhas, tipo='counter')
+    REGISTRO.medidor('robo_buffer_robos_descartados_total',
+                     'Buffers de robôs descartados pelo limite BUFFER_MAX_ROBOS',
+                     lambda: buffer_leituras.robos_descartados, tipo='counter')
+if difusor_eventos is not None:
+    REGISTRO.medidor('robo_eventos_assinantes', 'Clientes conectados em /leituras/eventos',
+                     difusor_eventos.total_assinantes)
+    REGISTRO.medidor('robo_eventos_descartados_total', 'Assinantes desconectados por lentidão',
+                     lambda: difusor_eventos.descartados, tipo='counter')
+
+if monitor_conexao is not None:
+    REGISTRO.medidor('robo_saude_estado', 'Estado do /health (0 = OK, 1 = DEGRADADO, 2 = ERRO)',
+                     monitor_conexao.codigo_estado)
+    REGISTRO.medidor('robo_banco_latencia_query_ms', 'Latência da última query de verificação',
+                     lambda: monitor_conexao.estado()['latencia_query_ms'])
+
+if motor_alertas is not None:
+    REGISTRO.medidor('robo_alertas_disparados_total', 'Alertas disparados pelas regras',
+                     lambda: motor_alertas.disparados, tipo='counter')
+    REGISTRO.medidor('robo_alertas_pendentes', 'Alertas aguardando envio',
+                     motor_alertas.despachante.pendentes)
+    REGISTRO.medidor('robo_alertas_falhas_total', 'Falhas ao enviar alertas aos destinos',
+                     lambda: motor_alertas.despachante.falhas, tipo='counter')
+    REGISTRO.medidor('robo_alertas_descartados_total', 'Alertas descartados com a fila de envio cheia',
+                     lambda: motor_alertas.despachante.descartados, tipo='counter')
+    REGISTRO.medidor('robo_alertas_robos_descartados_total',
+                     'Robôs cujo estado das regras foi descartado (ociosos ou acima do limite)',
+                     lambda: motor_alertas.robos_descartados, tipo='counter')
+
+if deduplicacao is not None:
+    REGISTRO.medidor('robo_dedup_duplicadas_total', 'Leituras descartadas por já terem sido gravadas',
+                     lambda: deduplicacao.duplicadas, tipo='counter')
+    REGISTRO.medidor('robo_dedup_chaves', 'Chaves guardadas no índice de deduplicação',
+                     deduplicacao.tamanho)
+if janela_reordenacao is not None:
+    REGISTRO.medidor('robo_reordenacao_pendentes', 'Leituras retidas na janela de reordenação',
+                     janela_reordenacao.pendentes)
+    REGISTRO.medidor('robo_reordenacao_fora_de_ordem_total',
+                     'Leituras gravadas depois de uma mais recente do mesmo robô',
+                     lambda: janela_reordenacao.fora_de_ordem, tipo='counter')
+    REGISTRO.medidor('robo_reordenacao_descartadas_total',
+                     'Leituras da janela de reordenação enviadas à quarentena',
+                     lambda: janela_reordenacao.descartadas, tipo='counter')
+
+# Profiler por amostragem, ligado sob demanda por POST /perfil
+amostrador_perfil = None
+if os.getenv('PERFIL_HABILITADO', '0') == '1':
+    amostrador_perfil = AmostradorPerfil(intervalo_ms=int(os.getenv('PERFIL_INTERVALO_MS', 10)))
+
+
+def _consultar_com_cache(chave, carregar):
+    """
+    Executar consulta passando pelo cache, quando habilitado
+
+    Chaves no formato (tipo, robô ou None, horas, demais parâmetros), usado
+    por _invalidar_cache
+    """
+    if cache_consultas is None:
+        return carregar()
+    return cache_consultas.obter(chave, carregar)
+
+
+def _invalidar_cache(leituras):
+    """
+    Invalidar só as consultas que passam a incluir as novas leituras: as do
+    mesmo robô (ou de todos) cuja janela alcança a leitura mais recente
+    """
+    agora = time.time()
+    # robô -> idade (horas) da leitura mais recente recebida
+    idades = {}
+    for dados in leituras:
+        robo = dados.get('robo_id', ROBO_PADRAO)
+        idade = (agora - timestamp_leitura_ns(dados) / 1_000_000_000) / 3600
+        if idade < idades.get(robo, math.inf):
+            idades[robo] = idade
+    idade_frota = min(idades.values())
+
+    def afetada(chave):
+        _, robo, hours = chave[:3]
+        idade = idade_frota if robo is None else idades.get(robo)
+        return idade is not None and idade <= hours
+
+    cache_consultas.invalidar(filtro=afetada)
+
+
+def _confirmar_leitura(mensagem, dados, status):
+    """
+    Resposta de POST /leituras aceita: mensagem e leitura ecoada, ou corpo
+    vazio se o cliente enviou Prefer: return=minimal (RFC 7240)
+    """
+    if RESPOSTA_MINIMA or 'return=minimal' in request.headers.get('Prefer', ''):
+        return Response(status=status, headers={'Preference-Applied': 'return=minimal'})
+    return jsonify({'mensagem': mensagem, 'dados': leitura_publica(dados)}), status
+
+
+def _registrar_ingestao(leituras):
+    """Atualizar os componentes em memória após leituras serem aceitas"""
+    if estatisticas_rolantes is not None:
+        for dados in leituras:
+            estatisticas_rolantes.registrar(dados)
+    if buffer_leituras is not None:
+        for dados in leituras:
+            buffer_leituras.registrar(dados, dados.get('robo_id', ROBO_PADRAO))
+    if cache_consultas is not None and leituras:
+        _invalidar_cache(leituras)
+    if difusor_eventos is not None:
+        difusor_eventos.publicar(leituras)
+    if motor_alertas is not None:
+        motor_alertas.avaliar(leituras)
+
 
 @app.route('/', methods=['GET'])
 def home():
@@ -33,8 +437,14 @@ def home():
         'versao': '1.0.0',
         'endpoints': {
             'POST /leituras': 'Receber dados dos sensores',
+            'POST /leituras/lote': 'Receber várias leituras (array JSON ou NDJSON)',
             'GET /leituras': 'Consultar últimas leituras',
-            'GET /leituras/estatisticas': 'Obter estatísticas gerais'
+            'GET /leituras/eventos': 'Receber novas leituras em tempo real (Server-Sent Events)',
+            'GET /leituras/estatisticas': 'Obter estatísticas gerais',
+            'GET /frota': 'Última leitura e estatísticas de cada robô',
+            'GET /cache': 'Contadores do cache de consultas',
+            'GET /alertas': 'Regras de alerta e últimos alertas disparados',
+            'GET /metrics': 'Métricas no formato do Prometheus'
         }
     }), 200
 
@@ -45,6 +455,7 @@ def receber_leitura():
     Endpoint para receber dados dos sensores do ESP32
     Formato esperado:
     {
+        "robo_id": "explorador_01",
         "timestamp": "2025-09-02T14:35:00Z",
         "temperatura_c": 24.3,
         "umidade_pct": 55,
@@ -52,45 +463,189 @@ def receber_leitura():
         "presenca": 1,
         "probabilidade_vida": 78.0
     }
+    O robo_id também pode vir no header X-Robo-Id (o do payload tem
+    prioridade); sem nenhum dos dois, a leitura fica com o robô padrão.
+    
+    Também aceita MessagePack (application/msgpack) e o quadro compacto
+    (application/vnd.robo.quadro) com uma única amostra.
     """
+    chaves = None
     try:
-        dados = request.get_json()
+        try:
+            with ETAPAS.medir(rota='leitura', etapa='json'):
+                if formato_binario(request.mimetype):
+                    leituras = ler_binario(request.get_data(), request.mimetype)
+                    if len(leituras) != 1:
+                        return jsonify({
+                            'erro': 'Envie uma única leitura (use /leituras/lote para várias)'
+                        }), 400
+                    dados = leituras[0]
+                else:
+                    dados = request.get_json()
+        except FormatoNaoSuportadoError as e:
+            return jsonify({'erro': str(e)}), 415
+        except ValueError as e:
+            return jsonify({'erro': str(e)}), 400
         
         # Validar dados recebidos
-        campos_obrigatorios = [
-            'temperatura_c', 'umidade_pct', 'luminosidade', 
-            'presenca', 'probabilidade_vida'
-        ]
+        with ETAPAS.medir(rota='leitura', etapa='validacao'):
+            sem_ts = sem_timestamp([dados])
+            erro = validar_leitura(dados, request.headers.get('X-Robo-Id'), **JANELA_TIMESTAMP)
+        if erro:
+            LEITURAS.incrementar(rota='leitura', resultado='rejeitada')
+            return jsonify({'erro': erro}), 400
         
-        for campo in campos_obrigatorios:
-            if campo not in dados:
-                return jsonify({
-                    'erro': f'Campo obrigatório ausente: {campo}'
-                }), 400
+        # Reenvio de uma leitura já gravada (ou em gravação): confirmar sem gravar de novo
+        if deduplicacao is not None:
+            with ETAPAS.medir(rota='leitura', etapa='deduplicacao'):
+                novas, chaves, _ = deduplicacao.filtrar([dados], sem_ts)
+            if not novas:
+                LEITURAS.incrementar(rota='leitura', resultado='duplicada')
+                return _confirmar_leitura('Leitura já registrada', dados, 200)
         
-        # Se não houver timestamp, usar o atual
-        if 'timestamp' not in dados:
-            dados['timestamp'] = datetime.utcnow().isoformat() + 'Z'
+        if pontuador is not None:
+            with ETAPAS.medir(rota='leitura', etapa='pontuacao'):
+                pontuador.pontuar([dados])
         
         # Salvar no InfluxDB
-        sucesso = influx_service.salvar_leitura(dados)
+        with ETAPAS.medir(rota='leitura', etapa='armazenamento'):
+            if janela_reordenacao is not None:
+                sucesso = janela_reordenacao.adicionar([dados], chaves)
+            else:
+                sucesso = influx_service.salvar_leitura(dados)
         
         if sucesso:
-            return jsonify({
-                'mensagem': 'Leitura registrada com sucesso',
-                'dados': dados
-            }), 201
+            # Com a janela de reordenação, isso acontece depois da gravação
+            if janela_reordenacao is None:
+                with ETAPAS.medir(rota='leitura', etapa='pos_ingestao'):
+                    if chaves:
+                        deduplicacao.registrar(chaves)
+                    _registrar_ingestao([dados])
+            LEITURAS.incrementar(rota='leitura', resultado='aceita')
+            return _confirmar_leitura('Leitura registrada com sucesso', dados, 201)
         else:
+            _liberar_reserva(chaves)
+            LEITURAS.incrementar(rota='leitura', resultado='falha')
             return jsonify({
                 'erro': 'Falha ao salvar no banco de dados'
             }), 500
             
+    except FilaCheiaError as e:
+        # Backpressure: o robô deve tentar novamente mais tarde
+        _liberar_reserva(chaves)
+        LEITURAS.incrementar(rota='leitura', resultado='recusada')
+        resposta = jsonify({'erro': str(e)})
+        resposta.headers['Retry-After'] = '1'
+        return resposta, 503
     except Exception as e:
+        _liberar_reserva(chaves)
         return jsonify({
             'erro': f'Erro ao processar requisição: {str(e)}'
         }), 500
 
 
+@app.route('/leituras/lote', methods=['POST'])
+def receber_lote():
+    """
+    Endpoint para receber várias leituras em uma única requisição
+    Formatos aceitos:
+    - application/json: array de leituras no mesmo formato de POST /leituras
+    - application/x-ndjson: uma leitura JSON por linha
+    - application/msgpack: array de leituras em MessagePack
+    - application/vnd.robo.quadro: quadro compacto com várias amostras
+    
+    Leituras inválidas são reportadas individualmente e as válidas
+    são gravadas no InfluxDB em uma única escrita. O header X-Robo-Id
+    vale para as leituras que não trazem robo_id.
+    """
+    chaves = None
+    try:
+        ndjson = request.mimetype in ('application/x-ndjson', 'application/jsonlines')
+        try:
+            with ETAPAS.medir(rota='lote', etapa='json'):
+                if formato_binario(request.mimetype):
+                    leituras, erros = ler_binario(request.get_data(), request.mimetype), []
+                else:
+                    leituras, erros = ler_lote(request.get_data(), ndjson=ndjson)
+        except FormatoNaoSuportadoError as e:
+            return jsonify({'erro': str(e)}), 415
+        except ValueError as e:
+            return jsonify({'erro': str(e)}), 400
+        
+        if len(leituras) > MAX_LEITURAS_LOTE:
+            return jsonify({
+                'erro': f'Lote excede o limite de {MAX_LEITURAS_LOTE} leituras'
+            }), 413
+        
+        # Validar cada leitura com as mesmas regras do endpoint individual
+        with ETAPAS.medir(rota='lote', etapa='validacao'):
+            sem_ts = sem_timestamp(leituras)
+            validas, erros = validar_lote(leituras, erros, request.headers.get('X-Robo-Id'),
+                                          **JANELA_TIMESTAMP)
+        if erros:
+            LEITURAS.incrementar(len(erros), rota='lote', resultado='rejeitada')
+        
+        if not validas:
+            return jsonify({
+                'erro': 'Nenhuma leitura válida no lote',
+                'erros': erros
+            }), 400
+        
+        # Descartar reenvios e leituras repetidas dentro do lote
+        chaves, duplicadas = None, 0
+        if deduplicacao is not None:
+            with ETAPAS.medir(rota='lote', etapa='deduplicacao'):
+                validas, chaves, duplicadas = deduplicacao.filtrar(validas, sem_ts)
+            if duplicadas:
+                LEITURAS.incrementar(duplicadas, rota='lote', resultado='duplicada')
+        
+        if validas:
+            if pontuador is not None:
+                with ETAPAS.medir(rota='lote', etapa='pontuacao'):
+                    pontuador.pontuar(validas)
+            
+            # Salvar todas as leituras válidas em uma única escrita
+            with ETAPAS.medir(rota='lote', etapa='armazenamento'):
+                if janela_reordenacao is not None:
+                    sucesso = janela_reordenacao.adicionar(validas, chaves)
+                else:
+                    sucesso = influx_service.salvar_leituras(validas)
+            if not sucesso:
+                _liberar_reserva(chaves)
+                LEITURAS.incrementar(len(validas), rota='lote', resultado='falha')
+                return jsonify({
+                    'erro': 'Falha ao salvar no banco de dados'
+                }), 500
+            # Com a janela de reordenação, isso acontece depois da gravação
+            if janela_reordenacao is None:
+                with ETAPAS.medir(rota='lote', etapa='pos_ingestao'):
+                    if chaves:
+                        deduplicacao.registrar(chaves)
+                    _registrar_ingestao(validas)
+            LEITURAS.incrementar(len(validas), rota='lote', resultado='aceita')
+        
+        return jsonify({
+            'mensagem': 'Lote registrado',
+            'recebidas': len(leituras),
+            'aceitas': len(validas),
+            'duplicadas': duplicadas,
+            'rejeitadas': len(erros),
+            'erros': erros
+        }), 201 if validas else 200
+        
+    except FilaCheiaError as e:
+        _liberar_reserva(chaves)
+        LEITURAS.incrementar(len(validas), rota='lote', resultado='recusada')
+        resposta = jsonify({'erro': str(e)})
+        resposta.headers['Retry-After'] = '1'
+        return resposta, 503
+    except Exception as e:
+        _liberar_reserva(chaves)
+        return jsonify({
+            'erro': f'Erro ao processar lote: {str(e)}'
+        }), 500
+
+
 @app.route('/leituras', methods=['GET'])
 def consultar_leituras():
     """
@@ -98,13 +653,53 @@ def consultar_leituras():
     Parâmetros de query:
     - limit: número de leituras a retornar (padrão: 100)
     - hours: buscar leituras das últimas N horas (padrão: 24)
+    - formato: 'ndjson' ou 'chunked' para resposta em streaming (padrão: json)
+    - antes: cursor (timestamp ISO) para continuar a paginação no modo streaming
+    - pontos: retornar no máximo N janelas agregadas (média por campo) em vez
+      das leituras brutas, em ordem cronológica
+    - extremos: se 1, inclui mínimo e máximo de cada janela (requer pontos)
+    - robo: retornar apenas as leituras deste robô (padrão: todos)
     """
     try:
         limit = request.args.get('limit', default=100, type=int)
         hours = request.args.get('hours', default=24, type=int)
+        formato = request.args.get('formato', default='json')
+        pontos = request.args.get('pontos', type=int)
+        robo = request.args.get('robo')
         
-        # Buscar leituras no InfluxDB
-        leituras = influx_service.buscar_leituras(limit=limit, hours=hours)
+        if robo is not None and not robo_id_valido(robo):
+            return jsonify({'erro': f'Robô inválido: {robo}'}), 400
+        
+        if pontos is not None:
+            if not 1 <= pontos <= MAX_PONTOS:
+                return jsonify({'erro': f'pontos deve estar entre 1 e {MAX_PONTOS}'}), 400
+            return _responder_agregadas(hours, pontos,
+                                        request.args.get('extremos', default=0, type=int) == 1,
+                                        robo)
+        
+        if formato in ('ndjson', 'chunked'):
+            antes = request.args.get('antes')
+            if antes:
+                try:
+                    # '+' do fuso horário vira espaço quando não codificado na URL
+                    antes = datetime.fromisoformat(
+                        antes.strip().replace(' ', '+').replace('Z', '+00:00')
+                    )
+                except ValueError:
+                    return jsonify({'erro': f'Cursor inválido: {antes}'}), 400
+            return _responder_stream(limit, hours, antes, formato, robo)
+        
+        # Responder da memória quando o buffer cobre a janela pedida
+        leituras = None
+        if buffer_leituras is not None:
+            leituras = buffer_leituras.consultar(limit=limit, hours=hours, robo=robo)
+        
+        if leituras is None:
+            # Buscar leituras no InfluxDB
+            leituras = _consultar_com_cache(
+                ('leituras', robo, hours, limit),
+                lambda: influx_service.buscar_leituras(limit=limit, hours=hours, robo=robo)
+            )
         
         return jsonify({
             'total': len(leituras),
@@ -117,18 +712,158 @@ def consultar_leituras():
         }), 500
 
 
+def _responder_agregadas(hours, pontos, extremos, robo=None):
+    """
+    Responder GET /leituras com no máximo `pontos` janelas agregadas
+    
+    A duração das janelas é escolhida para cobrir o período inteiro,
+    em segundos inteiros. Como as janelas são alinhadas ao relógio, a
+    primeira pode ficar parcial e é descartada se exceder o limite.
+    """
+    intervalo_s = max(1, math.ceil(hours * 3600 / pontos))
+    leituras = _consultar_com_cache(
+        ('agregadas', robo, hours, intervalo_s, extremos),
+        lambda: influx_service.buscar_leituras_agregadas(
+            hours=hours, intervalo_s=intervalo_s, extremos=extremos, robo=robo
+        )
+    )[-pontos:]
+    return jsonify({
+        'total': len(leituras),
+        'intervalo_s': intervalo_s,
+        'leituras': leituras
+    }), 200
+
+
+def _responder_stream(limit, hours, antes, formato, robo=None):
+    """
+    Enviar leituras em streaming conforme são lidas do InfluxDB
+    
+    - ndjson: uma leitura JSON por linha; o timestamp da última linha
+      serve como cursor ('antes') da próxima página
+    - chunked: documento JSON {"leituras": [...], "total", "proximo_cursor"}
+      escrito incrementalmente
+    """
+    leituras = influx_service.buscar_leituras_stream(limit=limit, hours=hours, antes=antes,
+                                                     robo=robo)
+    
+    def gerar_ndjson():
+        try:
+            for leitura in leituras:
+                yield json.dumps(leitura) + '\n'
+        except Exception as e:
+            print(f"Erro ao transmitir leituras: {e}")
+            yield json.dumps({'erro': f'Erro ao consultar leituras: {str(e)}'}) + '\n'
+    
+    def gerar_chunked():
+        total = 0
+        ultima = None
+        erro = None
+        yield '{"leituras": ['
+        try:
+            for leitura in leituras:
+                yield (',' if total else '') + json.dumps(leitura)
+                total += 1
+                ultima = leitura
+        except Exception as e:
+            print(f"Erro ao transmitir leituras: {e}")
+            erro = f'Erro ao consultar leituras: {str(e)}'
+        
+        # Só há próxima página se o limite foi atingido
+        proximo_cursor = None
+        if ultima is not None and total >= limit:
+            proximo_cursor = formatar_rfc3339(datetime.fromisoformat(ultima['timestamp']))
+        final = {'total': total, 'proximo_cursor': proximo_cursor}
+        if erro:
+            final['erro'] = erro
+        yield '], ' + json.dumps(final)[1:]
+    
+    if formato == 'ndjson':
+        return Response(stream_with_context(gerar_ndjson()), mimetype='application/x-ndjson')
+    return Response(stream_with_context(gerar_chunked()), mimetype='application/json')
+
+
+@app.route('/leituras/eventos', methods=['GET'])
+def eventos_leituras():
+    """
+    Endpoint de assinatura: envia cada leitura aceita assim que chega
+    (text/event-stream), sem consultar o InfluxDB
+    Parâmetros de query:
+    - robo: receber apenas as leituras deste robô (padrão: todos)
+    - campos: campos enviados, separados por vírgula (padrão: todos)
+    
+    Cada cliente tem uma fila de EVENTOS_CAPACIDADE eventos; se ela
+    encher, o cliente recebe o evento 'descartado' e é desconectado.
+    """
+    if difusor_eventos is None:
+        return jsonify({'erro': 'Eventos desabilitados (EVENTOS_HABILITADO=0)'}), 404
+    
+    robo = request.args.get('robo')
+    if robo is not None and not robo_id_valido(robo):
+        return jsonify({'erro': f'Robô inválido: {robo}'}), 400
+    campos = None
+    if request.args.get('campos'):
+        campos = [campo.strip() for campo in request.args['campos'].split(',') if campo.strip()]
+        desconhecidos = [campo for campo in campos if campo not in CAMPOS_OBRIGATORIOS]
+        if desconhecidos:
+            return jsonify({'erro': f'Campos desconhecidos: {", ".join(desconhecidos)}'}), 400
+    
+    try:
+        assinante = difusor_eventos.inscrever(robo=robo, campos=campos)
+    except LimiteAssinantesError as e:
+        resposta = jsonify({'erro': str(e)})
+        resposta.headers['Retry-After'] = '5'
+        return resposta, 503
+    
+    def gerar():
+        try:
+            yield formatar_evento('inscrito', {'robo': robo, 'campos': campos})
+            while True:
+                if assinante.descartado and assinante.fila.empty():
+                    yield formatar_evento('descartado', {
+                        'erro': 'Cliente lento: fila de eventos cheia'
+                    })
+                    return
+                # Comentário periódico mantém a conexão e detecta clientes desconectados
+                yield assinante.proximo(EVENTOS_HEARTBEAT_S) or ': ping\n\n'
+        finally:
+            difusor_eventos.cancelar(assinante)
+    
+    return Response(gerar(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
 @app.route('/leituras/estatisticas', methods=['GET'])
 def obter_estatisticas():
     """
     Endpoint para obter estatísticas das leituras
     Parâmetros de query:
     - hours: calcular estatísticas das últimas N horas (padrão: 24)
+    - percentis: se 1, inclui p50, p95 e p99 (padrão: 0)
+    - robo: calcular apenas com as leituras deste robô (padrão: todos)
     """
     try:
         hours = request.args.get('hours', default=24, type=int)
+        percentis = request.args.get('percentis', default=0, type=int) == 1
+        robo = request.args.get('robo')
         
-        # Buscar estatísticas no InfluxDB
-        stats = influx_service.buscar_estatisticas(hours=hours)
+        if robo is not None and not robo_id_valido(robo):
+            return jsonify({'erro': f'Robô inválido: {robo}'}), 400
+        
+        # Responder da memória quando a janela estiver coberta
+        # (percentis exigem os dados brutos e as estatísticas em memória
+        # são da frota inteira, então esses casos vão ao InfluxDB)
+        if (estatisticas_rolantes is not None and not percentis and robo is None
+                and estatisticas_rolantes.cobre(hours)):
+            stats = estatisticas_rolantes.consultar(hours=hours)
+        else:
+            # Buscar estatísticas no InfluxDB
+            stats = _consultar_com_cache(
+                ('estatisticas', robo, hours, percentis),
+                lambda: influx_service.buscar_estatisticas(hours=hours, percentis=percentis,
+                                                           robo=robo)
+            )
         
         return jsonify({
             'periodo_horas': hours,
@@ -141,10 +876,118 @@ def obter_estatisticas():
         }), 500
 
 
+@app.route('/frota', methods=['GET'])
+def consultar_frota():
+    """
+    Endpoint com a visão da frota: última leitura e estatísticas de cada robô
+    Parâmetros de query:
+    - hours: considerar as leituras das últimas N horas (padrão: 24)
+    
+    São sempre duas consultas agrupadas por robô, independente do
+    número de robôs.
+    """
+    try:
+        hours = request.args.get('hours', default=24, type=int)
+        robos = _consultar_com_cache(
+            ('frota', None, hours),
+            lambda: influx_service.buscar_frota(hours=hours)
+        )
+        return jsonify({
+            'periodo_horas': hours,
+            'total': len(robos),
+            'robos': robos
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'erro': f'Erro ao consultar frota: {str(e)}'
+        }), 500
+
+
+@app.route('/cache', methods=['GET'])
+def estatisticas_cache():
+    """Endpoint para consultar os contadores do cache de consultas"""
+    if cache_consultas is None:
+        return jsonify({'habilitado': False}), 200
+    return jsonify({
+        'habilitado': True,
+        **cache_consultas.estatisticas()
+    }), 200
+
+
+@app.route('/alertas', methods=['GET'])
+def consultar_alertas():
+    """
+    Endpoint com as regras de alerta e os últimos alertas disparados
+    Parâmetros de query:
+    - robo: apenas os alertas deste robô (padrão: todos)
+    - limit: número máximo de alertas (padrão: 50)
+    """
+    if motor_alertas is None:
+        return jsonify({'erro': 'Alertas desabilitados (ALERTAS=0)'}), 404
+    
+    robo = request.args.get('robo')
+    if robo is not None and not robo_id_valido(robo):
+        return jsonify({'erro': f'Robô inválido: {robo}'}), 400
+    limite = request.args.get('limit', default=50, type=int)
+    
+    alertas = motor_alertas.recentes(robo=robo, limite=limite)
+    return jsonify({
+        'regras': [regra.descrever() for regra in motor_alertas.regras],
+        'disparados': motor_alertas.disparados,
+        'pendentes': motor_alertas.despachante.pendentes(),
+        'total': len(alertas),
+        'alertas': alertas
+    }), 200
+
+
+@app.route('/metrics', methods=['GET'])
+def metricas():
+    """Endpoint de métricas no formato de exposição do Prometheus"""
+    return Response(REGISTRO.exportar(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/perfil', methods=['GET', 'POST'])
+def perfil():
+    """
+    Profiler por amostragem (requer PERFIL_HABILITADO=1)
+    - POST com acao=iniciar|parar|limpar (e intervalo_ms opcional) controla a coleta
+    - GET retorna as pilhas no formato folded, para gerar flame graphs
+    """
+    if amostrador_perfil is None:
+        return jsonify({'erro': 'Profiler desabilitado (PERFIL_HABILITADO=0)'}), 404
+    
+    if request.method == 'GET':
+        return Response(amostrador_perfil.exportar(), mimetype='text/plain')
+    
+    acao = request.args.get('acao')
+    if acao == 'iniciar':
+        amostrador_perfil.iniciar(request.args.get('intervalo_ms', type=int))
+    elif acao == 'parar':
+        amostrador_perfil.parar()
+    elif acao == 'limpar':
+        amostrador_perfil.limpar()
+    else:
+        return jsonify({'erro': 'acao deve ser iniciar, parar ou limpar'}), 400
+    
+    return jsonify({
+        'ativo': amostrador_perfil.ativo,
+        'amostras': amostrador_perfil.amostras
+    }), 200
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Endpoint para verificar status da API e conexão com InfluxDB"""
+    """
+    Endpoint para verificar status da API e conexão com InfluxDB
+    Com o monitor habilitado, responde o último estado medido (DEGRADADO
+    continua com 200; apenas ERRO retorna 503)
+    """
     try:
+        if monitor_conexao is not None:
+            estado = monitor_conexao.estado()
+            return jsonify(estado), 503 if estado['status'] == ESTADO_ERRO else 200
+        
         # Verificar conexão com InfluxDB
         conexao_ok = influx_service.verificar_conexao()
         
@@ -0,0 +1,289 @@
+"""
+API assíncrona (ASGI) para receber e armazenar dados do robô explorador espacial
+Mesmas rotas principais do app.py, com I/O concorrente no InfluxDB
+
+Executar com:
+    uvicorn app_async:app --host 0.0.0.0 --port 5000
+"""
+
+import contextlib
+import io
+import json
+import os
+
+from dotenv import load_dotenv
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from compressao import CodificacaoNaoSuportadaError, CorpoGrandeError, descomprimir
+from formato_binario import FormatoNaoSuportadoError, formato_binario, ler_binario
+from influxdb_service_async import InfluxDBServiceAsync
+from validacao import leitura_publica, ler_lote, robo_id_valido, validar_leitura, validar_lote
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+# Limite de leituras aceitas em uma única requisição de lote
+MAX_LEITURAS_LOTE = int(os.getenv('MAX_LEITURAS_LOTE', 10000))
+
+# Janela aceita para o timestamp das leituras em torno do relógio do servidor
+# (TIMESTAMP_MAX_PASSADO_S=0: sem limite, para lotes offline antigos)
+JANELA_TIMESTAMP = {
+    'max_futuro_s': float(os.getenv('TIMESTAMP_MAX_FUTURO_S', 300)),
+    'max_passado_s': float(os.getenv('TIMESTAMP_MAX_PASSADO_S', 0)) or None
+}
+
+# Compressão (mesmas variáveis do app.py)
+COMPRESSAO_RESPOSTAS = os.getenv('COMPRESSAO_RESPOSTAS', '1') == '1'
+COMPRESSAO_MINIMO_BYTES = int(os.getenv('COMPRESSAO_MINIMO_BYTES', 1024))
+COMPRESSAO_NIVEL = int(os.getenv('COMPRESSAO_NIVEL', 6))
+MAX_CORPO_DESCOMPRIMIDO = int(os.getenv('MAX_CORPO_DESCOMPRIMIDO_MB', 16)) * 1024 * 1024
+
+# Serviço criado no startup, dentro do event loop
+influx_service = None
+
+
+@contextlib.asynccontextmanager
+async def ciclo_de_vida(app):
+    """Abrir o cliente assíncrono do InfluxDB no startup e fechá-lo no shutdown"""
+    global influx_service
+    influx_service = InfluxDBServiceAsync(
+        url=os.getenv('INFLUXDB_URL'),
+        token=os.getenv('INFLUXDB_TOKEN'),
+        org=os.getenv('INFLUXDB_ORG'),
+        bucket=os.getenv('INFLUXDB_BUCKET')
+    )
+    try:
+        yield
+    finally:
+        await influx_service.fechar()
+
+
+def _inteiro(request, nome, padrao):
+    """Ler parâmetro inteiro da query string (padrão se ausente ou inválido)"""
+    try:
+        return int(request.query_params.get(nome, padrao))
+    except ValueError:
+        return padrao
+
+
+async def home(request):
+    """Endpoint raiz - informações da API"""
+    return JSONResponse({
+        'nome': 'API Robô Explorador Espacial (assíncrona)',
+        'versao': '1.0.0',
+        'endpoints': {
+            'POST /leituras': 'Receber dados dos sensores',
+            'POST /leituras/lote': 'Receber várias leituras (array JSON ou NDJSON)',
+            'GET /leituras': 'Consultar últimas leituras',
+            'GET /leituras/estatisticas': 'Obter estatísticas gerais'
+        }
+    }, status_code=200)
+
+
+async def ler_corpo(request):
+    """Ler o corpo da requisição, descomprimindo conforme o Content-Encoding"""
+    corpo = await request.body()
+    codificacao = request.headers.get('content-encoding', '').strip().lower()
+    if not codificacao or codificacao == 'identity':
+        return corpo
+    # Descompressão é CPU: fora do event loop
+    return await run_in_threadpool(descomprimir, io.BytesIO(corpo), codificacao,
+                                   MAX_CORPO_DESCOMPRIMIDO)
+
+
+def erro_corpo(e):
+    """Resposta para falhas de leitura do corpo (compressão ou formato)"""
+    if isinstance(e, CorpoGrandeError):
+        return JSONResponse({
+            'erro': f'Corpo descomprimido excede o limite de {MAX_CORPO_DESCOMPRIMIDO} bytes'
+        }, status_code=413)
+    if isinstance(e, (CodificacaoNaoSuportadaError, FormatoNaoSuportadoError)):
+        return JSONResponse({'erro': str(e)}, status_code=415)
+    return JSONResponse({'erro': str(e)}, status_code=400)
+
+
+async def receber_leitura(request):
+    """Endpoint para receber dados dos sensores do ESP32 (mesmos formatos do app.py)"""
+    try:
+        tipo = request.headers.get('content-type', '').split(';')[0].strip()
+        try:
+            corpo = await ler_corpo(request)
+            if formato_binario(tipo):
+                leituras = ler_binario(corpo, tipo)
+                if len(leituras) != 1:
+                    return JSONResponse({
+                        'erro': 'Envie uma única leitura (use /leituras/lote para várias)'
+                    }, status_code=400)
+                dados = leituras[0]
+            else:
+                dados = json.loads(corpo)
+        except (CorpoGrandeError, CodificacaoNaoSuportadaError,
+                FormatoNaoSuportadoError, ValueError) as e:
+            return erro_corpo(e)
+
+        erro = validar_leitura(dados, request.headers.get('x-robo-id'), **JANELA_TIMESTAMP)
+        if erro:
+            return JSONResponse({'erro': erro}, status_code=400)
+
+        if await influx_service.salvar_leitura(dados):
+            return JSONResponse({
+                'mensagem': 'Leitura registrada com sucesso',
+                'dados': leitura_publica(dados)
+            }, status_code=201)
+        return JSONResponse({'erro': 'Falha ao salvar no banco de dados'}, status_code=500)
+
+    except Exception as e:
+        return JSONResponse({
+            'erro': f'Erro ao processar requisição: {str(e)}'
+        }, status_code=500)
+
+
+async def receber_lote(request):
+    """Endpoint para receber várias leituras (array JSON, NDJSON, MessagePack ou quadro)"""
+    try:
+        tipo = request.headers.get('content-type', '').split(';')[0].strip()
+        ndjson = tipo in ('application/x-ndjson', 'application/jsonlines')
+        try:
+            corpo = await ler_corpo(request)
+            if formato_binario(tipo):
+                leituras, erros = ler_binario(corpo, tipo), []
+            else:
+                leituras, erros = ler_lote(corpo, ndjson=ndjson)
+        except (CorpoGrandeError, CodificacaoNaoSuportadaError,
+                FormatoNaoSuportadoError, ValueError) as e:
+            return erro_corpo(e)
+
+        if len(leituras) > MAX_LEITURAS_LOTE:
+            return JSONResponse({
+                'erro': f'Lote excede o limite de {MAX_LEITURAS_LOTE} leituras'
+            }, status_code=413)
+
+        validas, erros = validar_lote(leituras, erros, request.headers.get('x-robo-id'),
+                                      **JANELA_TIMESTAMP)
+
+        if not validas:
+            return JSONResponse({
+                'erro': 'Nenhuma leitura válida no lote',
+                'erros': erros
+            }, status_code=400)
+
+        if not await influx_service.salvar_leituras(validas):
+            return JSONResponse({'erro': 'Falha ao salvar no banco de dados'}, status_code=500)
+
+        return JSONResponse({
+            'mensagem': 'Lote registrado',
+            'recebidas': len(leituras),
+            'aceitas': len(validas),
+            'rejeitadas': len(erros),
+            'erros': erros
+        }, status_code=201)
+
+    except Exception as e:
+        return JSONResponse({
+            'erro': f'Erro ao processar lote: {str(e)}'
+        }, status_code=500)
+
+
+async def leituras(request):
+    """Despachar POST (receber) e GET (consultar) em /leituras"""
+    if request.method == 'POST':
+        return await receber_leitura(request)
+    return await consultar_leituras(request)
+
+
+async def consultar_leituras(request):
+    """
+    Endpoint para consultar últimas leituras
+    Parâmetros de query: limit, hours, robo e formato=ndjson (streaming)
+    """
+    try:
+        limit = _inteiro(request, 'limit', 100)
+        hours = _inteiro(request, 'hours', 24)
+        robo = request.query_params.get('robo')
+
+        if robo is not None and not robo_id_valido(robo):
+            return JSONResponse({'erro': f'Robô inválido: {robo}'}, status_code=400)
+
+        if request.query_params.get('formato') == 'ndjson':
+            async def gerar():
+                try:
+                    async for leitura in influx_service.buscar_leituras_stream(limit, hours, robo=robo):
+                        yield json.dumps(leitura) + '\n'
+                except Exception as e:
+                    print(f"Erro ao transmitir leituras: {e}")
+                    yield json.dumps({'erro': f'Erro ao consultar leituras: {str(e)}'}) + '\n'
+            return StreamingResponse(gerar(), media_type='application/x-ndjson')
+
+        resultado = await influx_service.buscar_leituras(limit=limit, hours=hours, robo=robo)
+        return JSONResponse({
+            'total': len(resultado),
+            'leituras': resultado
+        }, status_code=200)
+
+    except Exception as e:
+        return JSONResponse({
+            'erro': f'Erro ao consultar leituras: {str(e)}'
+        }, status_code=500)
+
+
+async def obter_estatisticas(request):
+    """
+    Endpoint para obter estatísticas das leituras
+    Parâmetros de query: hours e percentis=1
+    """
+    try:
+        hours = _inteiro(request, 'hours', 24)
+        percentis = _inteiro(request, 'percentis', 0) == 1
+
+        stats = await influx_service.buscar_estatisticas(hours=hours, percentis=percentis)
+        return JSONResponse({
+            'periodo_horas': hours,
+            'estatisticas': stats
+        }, status_code=200)
+
+    except Exception as e:
+        return JSONResponse({
+            'erro': f'Erro ao calcular estatísticas: {str(e)}'
+        }, status_code=500)
+
+
+async def health_check(request):
+    """Endpoint para verificar status da API e conexão com InfluxDB"""
+    try:
+        if await influx_service.verificar_conexao():
+            return JSONResponse({'status': 'OK', 'banco_dados': 'conectado'}, status_code=200)
+        return JSONResponse({'status': 'ERRO', 'banco_dados': 'desconectado'}, status_code=503)
+
+    except Exception as e:
+        return JSONResponse({'status': 'ERRO', 'mensagem': str(e)}, status_code=503)
+
+
+app = Starlette(
+    routes=[
+        Route('/', home, methods=['GET']),
+        Route('/leituras', leituras, methods=['GET', 'POST']),
+        Route('/leituras/lote', receber_lote, methods=['POST']),
+        Route('/leituras/estatisticas', obter_estatisticas, methods=['GET']),
+        Route('/health', health_check, methods=['GET'])
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'])] + (
+        # GZipMiddleware também comprime respostas em streaming
+        [Middleware(GZipMiddleware, minimum_size=COMPRESSAO_MINIMO_BYTES,
+                    compresslevel=COMPRESSAO_NIVEL)]
+        if COMPRESSAO_RESPOSTAS else []
+    ),
+    lifespan=ciclo_de_vida
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    port = int(os.getenv('PORT', 5000))
+    uvicorn.run('app_async:app', host='0.0.0.0', port=port)
@@ -0,0 +1,94 @@
+"""
+Interface comum dos backends de armazenamento das leituras
+Permite trocar o InfluxDB Cloud por um armazenamento local (BACKEND_ARMAZENAMENTO)
+"""
+
+from abc import ABC, abstractmethod
+
+
+class ServicoArmazenamento(ABC):
+    """Operações que a API usa para gravar e consultar leituras"""
+
+    @abstractmethod
+    def salvar_leitura(self, dados):
+        """
+        Salvar uma leitura validada
+
+        Returns:
+            bool: True se salvou com sucesso, False caso contrário
+        """
+
+    @abstractmethod
+    def salvar_leituras(self, lista_dados):
+        """
+        Salvar várias leituras validadas de uma vez
+
+        Returns:
+            bool: True se salvou com sucesso, False caso contrário
+        """
+
+    @abstractmethod
+    def buscar_leituras(self, limit=100, hours=24, silenciar_erros=True, robo=None):
+        """
+        Buscar as últimas leituras
+
+        Returns:
+            list: Leituras da mais recente para a mais antiga
+        """
+
+    @abstractmethod
+    def buscar_leituras_stream(self, limit=100, hours=24, antes=None, robo=None):
+        """
+        Buscar leituras de forma incremental
+
+        Yields:
+            dict: Leituras da mais recente para a mais antiga
+        """
+
+    @abstractmethod
+    def buscar_leituras_agregadas(self, hours=24, intervalo_s=60, extremos=False, robo=None):
+        """
+        Buscar leituras agregadas em janelas de intervalo_s segundos
+
+        Returns:
+            list: Janelas em ordem cronológica, no formato de formatar_leitura_agregada
+        """
+
+    @abstractmethod
+    def buscar_estatisticas(self, hours=24, percentis=False, robo=None):
+        """
+        Calcular estatísticas de cada campo numérico
+
+        Returns:
+            dict: campo -> estatísticas no formato de formatar_estatisticas
+        """
+
+    @abstractmethod
+    def buscar_frota(self, hours=24):
+        """
+        Última leitura e estatísticas de cada robô
+
+        Returns:
+            list: Dicionários com robo_id, ultima_leitura e estatisticas, ordenados por robo_id
+        """
+
+    @abstractmethod
+    def buscar_agregados_por_minuto(self, hours=24):
+        """
+        Agregados por minuto usados no aquecimento das estatísticas em memória
+
+        Returns:
+            list: Tuplas (campo, início do minuto em epoch segundos, estatística, valor)
+        """
+
+    @abstractmethod
+    def verificar_conexao(self):
+        """
+        Verificar se o armazenamento está acessível
+
+        Returns:
+            bool: True se conectado, False caso contrário
+        """
+
+    def fechar(self):
+        """Liberar recursos, gravando antes o que estiver pendente"""
@@ -0,0 +1,351 @@
+"""
+Benchmark de carga do backend
+Simula N robôs enviando leituras em paralelo e mede vazão, taxa de erros
+e latência (p50/p95/p99)
+
+Por padrão sobe a API localmente apontando para um InfluxDB falso, para
+resultados reproduzíveis sem rede:
+    python benchmark.py --robos 50 --taxa 0.5 --duracao 30
+
+Contra uma API já em execução:
+    python benchmark.py --url http://localhost:5000 --robos 20 --lote 100
+
+Comparar formatos de ingestão (bytes enviados e latência):
+    python benchmark.py --formato quadro --lote 30
+
+Custo por leitura do caminho de ingestão (validação, line protocol e
+tamanho da resposta), sem rede:
+    python benchmark.py --micro 50000
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+import requests
+
+sys.path.append(os.path.dirname(__file__))
+
+from fake_influxdb import ServidorInfluxFalso
+from formato_binario import TIPO_QUADRO, montar_quadro
+from test_simulator import gerar_dados_simulados
+
+try:
+    import msgpack
+except ImportError:  # necessário apenas com --formato msgpack
+    msgpack = None
+
+
+def percentil(valores_ordenados, p):
+    """Percentil pelo método nearest-rank (lista já ordenada)"""
+    if not valores_ordenados:
+        return 0.0
+    indice = max(0, min(len(valores_ordenados) - 1,
+                        int(round(p / 100.0 * len(valores_ordenados) + 0.5)) - 1))
+    return valores_ordenados[indice]
+
+
+def iniciar_api_local(latencia_influx_ms, ambiente):
+    """
+    Subir o InfluxDB falso e a API Flask no mesmo processo
+
+    Args:
+        latencia_influx_ms: Latência artificial do InfluxDB falso
+        ambiente: Variáveis de ambiente extras para a API
+
+    Returns:
+        tuple: (URL da API, InfluxDB falso, servidor HTTP da API)
+    """
+    influx = ServidorInfluxFalso(latencia_ms=latencia_influx_ms).iniciar()
+
+    os.environ.update({
+        'INFLUXDB_URL': influx.url,
+        'INFLUXDB_TOKEN': 'benchmark',
+        'INFLUXDB_ORG': 'benchmark',
+        'INFLUXDB_BUCKET': 'benchmark'
+    })
+    os.environ.update(ambiente)
+
+    # Importar só depois de configurar o ambiente
+    from werkzeug.serving import make_server
+    import app as api
+
+    # Não registrar cada requisição no terminal
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    servidor = make_server('127.0.0.1', 0, api.app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, name='api', daemon=True).start()
+    return f'http://127.0.0.1:{servidor.server_port}', influx, servidor
+
+
+class Robo(threading.Thread):
+    """Robô simulado que envia leituras em ritmo constante"""
+
+    def __init__(self, url, taxa, lote, fim, semente, formato='json'):
+        super().__init__(daemon=True)
+        self.url = url
+        self.formato = formato
+        self.intervalo = lote / taxa
+        self.lote = lote
+        self.fim = fim
+        self.random = random.Random(semente)
+        self.latencias = []
+        self.erros = 0
+        self.leituras = 0
+        self.bytes_enviados = 0
+
+    def _corpo(self, leituras):
+        """Codificar as leituras no formato escolhido: (corpo, Content-Type)"""
+        if self.formato == 'quadro':
+            return montar_quadro(leituras), TIPO_QUADRO
+        dados = leituras[0] if self.lote == 1 else leituras
+        if self.formato == 'msgpack':
+            return msgpack.packb(dados), 'application/msgpack'
+        return json.dumps(dados).encode('utf-8'), 'application/json'
+
+    def run(self):
+        sessao = requests.Session()
+        # Espalhar os robôs ao longo do primeiro intervalo
+        proximo = time.monotonic() + self.random.uniform(0, self.intervalo)
+        while True:
+            espera = proximo - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+            if time.monotonic() >= self.fim:
+                break
+            proximo += self.intervalo
+
+            leituras = [gerar_dados_simulados() for _ in range(self.lote)]
+            corpo, tipo = self._corpo(leituras)
+            rota = '/leituras' if self.lote == 1 else '/leituras/lote'
+            self.bytes_enviados += len(corpo)
+            inicio = time.perf_counter()
+            try:
+                resposta = sessao.post(f'{self.url}{rota}', data=corpo,
+                                       headers={'Content-Type': tipo}, timeout=30)
+                sucesso = resposta.status_code == 201
+            except requests.RequestException:
+                sucesso = False
+            self.latencias.append(time.perf_counter() - inicio)
+            if sucesso:
+                self.leituras += self.lote
+            else:
+                self.erros += 1
+
+
+def executar(args):
+    """Executar o benchmark e retornar o relatório"""
+    random.seed(args.semente)
+    influx = servidor = None
+    url = args.url
+    if url is None:
+        ambiente = {
+            'BACKEND_ARMAZENAMENTO': args.backend,
+            'INFLUXDB_MODO_ESCRITA': args.modo_escrita
+        }
+        url, influx, servidor = iniciar_api_local(args.latencia_influx_ms, ambiente)
+
+    inicio = time.monotonic()
+    fim = inicio + args.duracao
+    robos = [Robo(url, args.taxa, args.lote, fim, args.semente + i, args.formato)
+             for i in range(args.robos)]
+    for robo in robos:
+        robo.start()
+    for robo in robos:
+        robo.join()
+    duracao = time.monotonic() - inicio
+
+    latencias = sorted(l for robo in robos for l in robo.latencias)
+    requisicoes = len(latencias)
+    erros = sum(robo.erros for robo in robos)
+    leituras = sum(robo.leituras for robo in robos)
+    bytes_enviados = sum(robo.bytes_enviados for robo in robos)
+
+    relatorio = {
+        'configuracao': {
+            'url': args.url or 'local',
+            'robos': args.robos,
+            'taxa_por_robo': args.taxa,
+            'lote': args.lote,
+            'formato': args.formato,
+            'duracao_s': args.duracao,
+            'backend': args.backend if args.url is None else None,
+            'modo_escrita': args.modo_escrita if args.url is None else None,
+            'latencia_influx_ms': args.latencia_influx_ms if args.url is None else None
+        },
+        'requisicoes': requisicoes,
+        'leituras_aceitas': leituras,
+        'erros': erros,
+        'taxa_erros': round(erros / requisicoes, 4) if requisicoes else 0,
+        'vazao_req_s': round(requisicoes / duracao, 2),
+        'vazao_leituras_s': round(leituras / duracao, 2),
+        'bytes_por_leitura': round(bytes_enviados / (requisicoes * args.lote), 1) if requisicoes else 0,
+        'latencia_ms': {
+            'p50': round(percentil(latencias, 50) * 1000, 2),
+            'p95': round(percentil(latencias, 95) * 1000, 2),
+            'p99': round(percentil(latencias, 99) * 1000, 2),
+            'max': round(latencias[-1] * 1000, 2) if latencias else 0
+        }
+    }
+
+    if servidor is not None:
+        servidor.shutdown()
+        import app as api
+        api.influx_service.fechar()
+        relatorio['influx_falso'] = {
+            'escritas': influx.escritas,
+            'linhas': influx.linhas,
+            'queries': influx.queries
+        }
+        influx.parar()
+
+    return relatorio
+
+
+def imprimir_tabela(relatorio):
+    """Exibir o relatório em formato de tabela"""
+    latencia = relatorio['latencia_ms']
+    linhas = [
+        ('Requisições', relatorio['requisicoes']),
+        ('Leituras aceitas', relatorio['leituras_aceitas']),
+        ('Erros', f"{relatorio['erros']} ({relatorio['taxa_erros'] * 100:.2f}%)"),
+        ('Vazão (req/s)', relatorio['vazao_req_s']),
+        ('Vazão (leituras/s)', relatorio['vazao_leituras_s']),
+        ('Bytes por leitura', relatorio['bytes_por_leitura']),
+        ('Latência p50 (ms)', latencia['p50']),
+        ('Latência p95 (ms)', latencia['p95']),
+        ('Latência p99 (ms)', latencia['p99']),
+        ('Latência máx (ms)', latencia['max'])
+    ]
+    print("=" * 50)
+    print("📊 BENCHMARK - ROBÔ ESPACIAL")
+    print("=" * 50)
+    for nome, valor in linhas:
+        print(f"{nome:<25}{valor:>25}")
+    print("=" * 50)
+
+
+def _tempo_us(funcao, itens):
+    """Tempo médio por item, em microssegundos"""
+    inicio = time.perf_counter()
+    for item in itens:
+        funcao(item)
+    return round((time.perf_counter() - inicio) / len(itens) * 1e6, 2)
+
+
+def micro(n, semente):
+    """
+    Medir, no próprio processo, o custo por leitura de cada etapa da ingestão
+
+    Compara o validador compilado com uma validação campo a campo genérica,
+    o encoder de line protocol direto com Point.to_line_protocol() e o corpo
+    da resposta completa com o de Prefer: return=minimal.
+
+    Args:
+        n: Número de leituras simuladas
+        semente: Semente dos dados simulados
+
+    Returns:
+        dict: Tempos em µs por leitura e bytes por resposta
+    """
+    from datetime import datetime
+
+    from influxdb_client import Point, WritePrecision
+    from influxdb_service import CAMPOS_PONTUACAO, ROBO_PADRAO, linha_leitura
+    from validacao import ESQUEMA_LEITURA, leitura_publica, validar_campos, validar_leitura
+
+    random.seed(semente)
+    leituras = [gerar_dados_simulados() for _ in range(n)]
+    for dados in leituras:
+        validar_leitura(dados, 'explorador_01')
+
+    def validar_generico(dados):
+        # Referência: uma checagem por campo com isinstance e comparação de faixa
+        for campo, (inteiro, minimo, maximo) in ESQUEMA_LEITURA.items():
+            valor = dados[campo]
+            tipos = int if inteiro else (int, float)
+            if isinstance(valor, bool) or not isinstance(valor, tipos):
+                raise ValueError(campo)
+            if not minimo <= valor <= maximo:
+                raise ValueError(campo)
+
+    def criar_point(dados):
+        # Referência: a leitura montada como Point do cliente do InfluxDB
+        point = Point("leitura_sensores") \
+            .tag("robo", dados.get('robo_id', ROBO_PADRAO)) \
+            .field("temperatura_c", float(dados['temperatura_c'])) \
+            .field("umidade_pct", float(dados['umidade_pct'])) \
+            .field("luminosidade", int(dados['luminosidade'])) \
+            .field("presenca", int(dados['presenca'])) \
+            .field("probabilidade_vida", float(dados['probabilidade_vida']))
+        for campo, tipo in CAMPOS_PONTUACAO:
+            if campo in dados:
+                point = point.field(campo, tipo(dados[campo]))
+        if isinstance(dados['timestamp'], int):
+            return point.time(dados['timestamp'] * 1_000_000, WritePrecision.NS)
+        timestamp = datetime.fromisoformat(dados['timestamp'].replace('Z', '+00:00'))
+        return point.time(timestamp, WritePrecision.NS)
+
+    completa = json.dumps({'mensagem': 'Leitura registrada com sucesso',
+                           'dados': leitura_publica(leituras[0])})
+    return {
+        'leituras': n,
+        'validacao_us': {
+            'generica': _tempo_us(validar_generico, leituras),
+            'validar_campos': _tempo_us(validar_campos, leituras),
+            'validar_leitura': _tempo_us(lambda dados: validar_leitura(dict(dados)), leituras)
+        },
+        'line_protocol_us': {
+            'point': _tempo_us(lambda dados: criar_point(dados).to_line_protocol(), leituras),
+            'linha_leitura': _tempo_us(linha_leitura, leituras)
+        },
+        'resposta_bytes': {
+            'completa': len(completa.encode('utf-8')),
+            'minima': 0
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de carga do backend')
+    parser.add_argument('--url', help='URL de uma API em execução (padrão: API local com InfluxDB falso)')
+    parser.add_argument('--robos', type=int, default=10, help='Robôs simultâneos')
+    parser.add_argument('--taxa', type=float, default=0.5, help='Leituras por segundo por robô')
+    parser.add_argument('--duracao', type=float, default=10, help='Duração em segundos')
+    parser.add_argument('--lote', type=int, default=1, help='Leituras por requisição (>1 usa /leituras/lote)')
+    parser.add_argument('--formato', default='json', choices=['json', 'msgpack', 'quadro'],
+                        help='Codificação do corpo das requisições')
+    parser.add_argument('--backend', default='influxdb', choices=['influxdb', 'memoria'],
+                        help='BACKEND_ARMAZENAMENTO da API local')
+    parser.add_argument('--modo-escrita', default='sincrono', choices=['sincrono', 'lote', 'spool'],
+                        help='INFLUXDB_MODO_ESCRITA da API local')
+    parser.add_argument('--latencia-influx-ms', type=int, default=0,
+                        help='Latência artificial do InfluxDB falso')
+    parser.add_argument('--semente', type=int, default=42, help='Semente dos dados simulados')
+    parser.add_argument('--json', dest='arquivo_json', help='Salvar relatório JSON neste arquivo')
+    parser.add_argument('--micro', type=int, metavar='N',
+                        help='Medir o custo por leitura da ingestão com N leituras, sem carga HTTP')
+    args = parser.parse_args()
+    if args.micro:
+        print(json.dumps(micro(args.micro, args.semente), indent=2, ensure_ascii=False))
+        return
+    if args.formato == 'msgpack' and msgpack is None:
+        parser.error('--formato msgpack requer o pacote msgpack')
+
+    relatorio = executar(args)
+    imprimir_tabela(relatorio)
+
+    saida = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.arquivo_json:
+        with open(args.arquivo_json, 'w') as arquivo:
+            arquivo.write(saida)
+    else:
+        print(saida)
+
+
+if __name__ == '__main__':
+    main()
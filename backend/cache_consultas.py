@@ -0,0 +1,167 @@
+"""
+Cache de resultados de consultas ao InfluxDB
+TTL curto, despejo LRU limitado por entradas e por memória, e coalescência
+de requisições idênticas em andamento
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Carregamento:
+    """Consulta em andamento compartilhada pelas requisições idênticas"""
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.valor = None
+        self.erro = None
+        # Invalidada durante a consulta: o resultado não é guardado
+        self.invalidado = False
+
+
+class CacheConsultas:
+    """Cache TTL + LRU com contadores de acertos e falhas"""
+
+    def __init__(self, ttl_ms=1000, max_entradas=256, max_bytes=32 * 1024 * 1024):
+        """
+        Inicializar cache
+
+        Args:
+            ttl_ms: Tempo de vida de cada entrada em milissegundos
+            max_entradas: Número máximo de entradas mantidas
+            max_bytes: Tamanho aproximado máximo (JSON serializado) somando as entradas
+        """
+        self.ttl = ttl_ms / 1000.0
+        self.max_entradas = max(1, int(max_entradas))
+        self.max_bytes = int(max_bytes)
+
+        # chave -> (expira_em, tamanho, valor), da menos para a mais recente
+        self._entradas = OrderedDict()
+        self._em_andamento = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.acertos = 0
+        self.falhas = 0
+        self.coalescidas = 0
+        self.despejos = 0
+        self.invalidacoes = 0
+
+    def obter(self, chave, carregar):
+        """
+        Obter valor do cache ou carregá-lo (uma única vez por chave)
+
+        Resultados vazios não são armazenados, pois os métodos do
+        InfluxDBService também retornam vazio em caso de erro.
+
+        Args:
+            chave: Tupla hashable com os parâmetros normalizados da consulta
+            carregar: Função sem argumentos que executa a consulta
+
+        Returns:
+            Valor em cache ou recém-carregado
+        """
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None:
+                if entrada[0] > time.monotonic():
+                    self._entradas.move_to_end(chave)
+                    self.acertos += 1
+                    return entrada[2]
+                self._remover(chave)
+
+            carregamento = self._em_andamento.get(chave)
+            if carregamento is not None:
+                self.coalescidas += 1
+                lider = False
+            else:
+                carregamento = _Carregamento()
+                self._em_andamento[chave] = carregamento
+                self.falhas += 1
+                lider = True
+
+        if not lider:
+            carregamento.evento.wait()
+            if carregamento.erro is not None:
+                raise carregamento.erro
+            return carregamento.valor
+
+        try:
+            carregamento.valor = carregar()
+        except Exception as e:
+            carregamento.erro = e
+        finally:
+            with self._lock:
+                del self._em_andamento[chave]
+                if (carregamento.erro is None and carregamento.valor
+                        and not carregamento.invalidado):
+                    self._armazenar(chave, carregamento.valor)
+            carregamento.evento.set()
+
+        if carregamento.erro is not None:
+            raise carregamento.erro
+        return carregamento.valor
+
+    def _armazenar(self, chave, valor):
+        """Guardar entrada e despejar as menos usadas (lock já adquirido)"""
+        tamanho = len(json.dumps(valor, default=str))
+        if tamanho > self.max_bytes:
+            return
+        self._entradas[chave] = (time.monotonic() + self.ttl, tamanho, valor)
+        self._bytes += tamanho
+        while len(self._entradas) > self.max_entradas or self._bytes > self.max_bytes:
+            chave_antiga = next(iter(self._entradas))
+            self._remover(chave_antiga)
+            self.despejos += 1
+
+    def _remover(self, chave):
+        """Remover entrada (lock já adquirido)"""
+        _, tamanho, _ = self._entradas.pop(chave)
+        self._bytes -= tamanho
+
+    def invalidar(self, prefixo=None, filtro=None):
+        """
+        Invalidar entradas após novas leituras
+
+        Consultas em andamento com chave invalidada também não são guardadas.
+
+        Args:
+            prefixo: Se informado, invalida apenas chaves cujo primeiro
+                     elemento é igual ao prefixo (ex: 'leituras')
+            filtro: Se informado, função chave -> bool que indica as chaves
+                    afetadas pelas novas leituras
+        """
+        def afetada(chave):
+            return ((prefixo is None or chave[0] == prefixo)
+                    and (filtro is None or filtro(chave)))
+
+        with self._lock:
+            self.invalidacoes += 1
+            for chave, carregamento in self._em_andamento.items():
+                if afetada(chave):
+                    carregamento.invalidado = True
+            if prefixo is None and filtro is None:
+                self._entradas.clear()
+                self._bytes = 0
+                return
+            for chave in [c for c in self._entradas if afetada(c)]:
+                self._remover(chave)
+
+    def estatisticas(self):
+        """Contadores de uso do cache"""
+        with self._lock:
+            # Requisições coalescidas também evitaram uma consulta ao banco
+            atendidas = self.acertos + self.coalescidas
+            consultas = atendidas + self.falhas
+            return {
+                'entradas': len(self._entradas),
+                'bytes': self._bytes,
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'coalescidas': self.coalescidas,
+                'despejos': self.despejos,
+                'invalidacoes': self.invalidacoes,
+                'taxa_acertos': round(atendidas / consultas, 4) if consultas else 0
+            }
@@ -0,0 +1,312 @@
+"""
+Content-Encoding nos dois sentidos para a API Flask (middleware WSGI)
+
+- Requisições com Content-Encoding gzip, deflate ou zstd são
+  descomprimidas antes de chegar às rotas, com limite de tamanho
+  descomprimido (proteção contra zip bombs)
+- Respostas são comprimidas com gzip ou zstd conforme o Accept-Encoding,
+  a partir de um tamanho mínimo; respostas em streaming (sem
+  Content-Length) são comprimidas bloco a bloco, com flush a cada bloco
+"""
+
+import io
+import json
+import zlib
+
+from werkzeug.wsgi import get_input_stream
+
+try:
+    import zstandard
+except ImportError:  # dependência opcional
+    zstandard = None
+
+
+# Tipos de conteúdo que valem a pena comprimir
+TIPOS_COMPRIMIVEIS = (
+    'application/json', 'application/x-ndjson', 'text/'
+)
+
+TAMANHO_BLOCO = 64 * 1024
+
+
+class CorpoGrandeError(Exception):
+    """Corpo descomprimido excede o limite configurado"""
+
+
+class CodificacaoNaoSuportadaError(Exception):
+    """Content-Encoding da requisição não suportado"""
+
+
+def codificacoes_suportadas():
+    """Codificações aceitas nas requisições, na ordem de preferência para respostas"""
+    if zstandard is not None:
+        return ('zstd', 'gzip', 'deflate')
+    return ('gzip', 'deflate')
+
+
+def _descomprimir_zlib(fonte, wbits, limite):
+    """Descomprimir gzip/deflate lendo em blocos, sem passar de `limite` bytes"""
+    descompressor = zlib.decompressobj(wbits)
+    partes = []
+    total = 0
+    try:
+        while not descompressor.eof:
+            bloco = fonte.read(TAMANHO_BLOCO)
+            if not bloco:
+                break
+            # max_length impede que um bloco pequeno gere uma saída gigante
+            saida = descompressor.decompress(bloco, limite - total + 1)
+            total += len(saida)
+            if total > limite:
+                raise CorpoGrandeError
+            partes.append(saida)
+    except zlib.error as e:
+        raise ValueError(f'Corpo comprimido inválido: {e}')
+    if not descompressor.eof:
+        raise ValueError('Corpo comprimido truncado')
+    return b''.join(partes)
+
+
+def _descomprimir_zstd(fonte, limite):
+    """Descomprimir zstd lendo em blocos, sem passar de `limite` bytes"""
+    partes = []
+    total = 0
+    try:
+        with zstandard.ZstdDecompressor().stream_reader(fonte) as leitor:
+            while True:
+                saida = leitor.read(min(TAMANHO_BLOCO, limite - total + 1))
+                if not saida:
+                    break
+                total += len(saida)
+                if total > limite:
+                    raise CorpoGrandeError
+                partes.append(saida)
+    except zstandard.ZstdError as e:
+        raise ValueError(f'Corpo comprimido inválido: {e}')
+    return b''.join(partes)
+
+
+def descomprimir(fonte, codificacao, limite):
+    """
+    Descomprimir o corpo de uma requisição
+
+    Args:
+        fonte: Objeto file-like com o corpo comprimido
+        codificacao: Valor do header Content-Encoding
+        limite: Tamanho máximo descomprimido em bytes
+
+    Returns:
+        bytes: Corpo descomprimido
+
+    Raises:
+        CorpoGrandeError: Se o corpo descomprimido exceder o limite
+        CodificacaoNaoSuportadaError: Se a codificação não for suportada
+        ValueError: Se o corpo não puder ser descomprimido
+    """
+    if codificacao in ('gzip', 'x-gzip'):
+        return _descomprimir_zlib(fonte, 16 + zlib.MAX_WBITS, limite)
+    if codificacao == 'deflate':
+        # zlib (RFC 1950) ou gzip, detectado automaticamente
+        return _descomprimir_zlib(fonte, 32 + zlib.MAX_WBITS, limite)
+    if codificacao == 'zstd' and zstandard is not None:
+        return _descomprimir_zstd(fonte, limite)
+    raise CodificacaoNaoSuportadaError(f'Content-Encoding não suportado: {codificacao}')
+
+
+def negociar(accept_encoding, disponiveis):
+    """
+    Escolher a codificação da resposta a partir do Accept-Encoding
+
+    Args:
+        accept_encoding: Valor do header Accept-Encoding
+        disponiveis: Codificações do servidor, em ordem de preferência
+
+    Returns:
+        str: Codificação escolhida, ou None para não comprimir
+    """
+    aceitas = {}
+    for item in accept_encoding.lower().split(','):
+        nome, _, parametros = item.strip().partition(';')
+        if not nome:
+            continue
+        qualidade = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith('q='):
+            try:
+                qualidade = float(parametros[2:])
+            except ValueError:
+                qualidade = 0.0
+        aceitas[nome.strip()] = qualidade
+
+    melhor = None
+    for nome in disponiveis:
+        qualidade = aceitas.get(nome, aceitas.get('*', 0.0))
+        if qualidade > 0 and (melhor is None or qualidade > melhor[1]):
+            melhor = (nome, qualidade)
+    return melhor[0] if melhor else None
+
+
+class _Compressor:
+    """Interface comum para gzip e zstd (compress/flush de bloco/finalizar)"""
+
+    def __init__(self, codificacao, nivel):
+        if codificacao == 'zstd':
+            self._objeto = zstandard.ZstdCompressor(level=nivel).compressobj()
+            self._flush_bloco = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        else:
+            self._objeto = zlib.compressobj(nivel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._flush_bloco = zlib.Z_SYNC_FLUSH
+
+    def comprimir(self, dados, descarregar=False):
+        saida = self._objeto.compress(dados)
+        if descarregar:
+            saida += self._objeto.flush(self._flush_bloco)
+        return saida
+
+    def finalizar(self):
+        return self._objeto.flush()
+
+
+class CompressaoWSGI:
+    """Middleware WSGI de descompressão de requisições e compressão de respostas"""
+
+    def __init__(self, app, comprimir_respostas=True, minimo_bytes=1024, nivel=6,
+                 limite_descomprimido=16 * 1024 * 1024):
+        """
+        Args:
+            app: Aplicação WSGI (ex: flask_app.wsgi_app)
+            comprimir_respostas: Se False, apenas descomprime as requisições
+            minimo_bytes: Respostas menores que isso não são comprimidas
+            nivel: Nível de compressão (gzip 1-9; o mesmo valor é usado no zstd)
+            limite_descomprimido: Tamanho máximo de um corpo descomprimido
+        """
+        self.app = app
+        self.comprimir_respostas = comprimir_respostas
+        self.minimo_bytes = minimo_bytes
+        self.nivel = nivel
+        self.limite_descomprimido = limite_descomprimido
+        self.disponiveis = tuple(c for c in codificacoes_suportadas() if c != 'deflate')
+
+    def __call__(self, environ, start_response):
+        codificacao = environ.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        if codificacao and codificacao != 'identity':
+            try:
+                corpo = descomprimir(get_input_stream(environ), codificacao,
+                                     self.limite_descomprimido)
+            except CorpoGrandeError:
+                return self._erro(start_response, '413 Request Entity Too Large',
+                                  'Corpo descomprimido excede o limite de '
+                                  f'{self.limite_descomprimido} bytes')
+            except CodificacaoNaoSuportadaError as e:
+                return self._erro(start_response, '415 Unsupported Media Type', str(e))
+            except ValueError as e:
+                return self._erro(start_response, '400 Bad Request', str(e))
+            environ['wsgi.input'] = io.BytesIO(corpo)
+            environ['CONTENT_LENGTH'] = str(len(corpo))
+            environ.pop('HTTP_CONTENT_ENCODING', None)
+            environ.pop('HTTP_TRANSFER_ENCODING', None)
+
+        if not self.comprimir_respostas:
+            return self.app(environ, start_response)
+        escolhida = None
+        if environ.get('REQUEST_METHOD') != 'HEAD':
+            escolhida = negociar(environ.get('HTTP_ACCEPT_ENCODING', ''), self.disponiveis)
+        if escolhida is None:
+            # Sem compressão, a resposta ainda depende de Accept-Encoding para caches
+            def iniciar_sem_compressao(status, headers, exc_info=None):
+                return start_response(status, self._variar(headers), exc_info)
+            return self.app(environ, iniciar_sem_compressao)
+
+        estado = {}
+
+        def iniciar(status, headers, exc_info=None):
+            estado['modo'] = self._modo(status, headers)
+            if estado['modo'] == 'inteiro':
+                # Adiado até o corpo ser comprimido (Content-Length muda)
+                estado['resposta'] = (status, headers, exc_info)
+                return lambda dados: None
+            if estado['modo'] == 'stream':
+                headers = self._cabecalhos(headers, escolhida)
+            else:
+                headers = self._variar(headers)
+            return start_response(status, headers, exc_info)
+
+        iteravel = self.app(environ, iniciar)
+        modo = estado.get('modo')
+        if modo == 'inteiro':
+            try:
+                corpo = b''.join(iteravel)
+            finally:
+                if hasattr(iteravel, 'close'):
+                    iteravel.close()
+            compressor = _Compressor(escolhida, self.nivel)
+            comprimido = compressor.comprimir(corpo) + compressor.finalizar()
+            status, headers, exc_info = estado['resposta']
+            headers = self._cabecalhos(headers, escolhida) + [('Content-Length', str(len(comprimido)))]
+            start_response(status, headers, exc_info)
+            return [comprimido]
+        if modo == 'stream':
+            return self._comprimir_stream(iteravel, escolhida)
+        return iteravel
+
+    def _modo(self, status, headers):
+        """'inteiro', 'stream' ou None (não comprimir) para uma resposta"""
+        if status[:3] in ('204', '206', '304') or int(status[:3]) < 200:
+            return None
+        tipo = tamanho = None
+        for nome, valor in headers:
+            nome = nome.lower()
+            if nome == 'content-encoding':
+                return None
+            if nome == 'content-type':
+                tipo = valor.lower()
+            elif nome == 'content-length':
+                tamanho = int(valor)
+        if tipo is None or not tipo.startswith(TIPOS_COMPRIMIVEIS):
+            return None
+        if tamanho is None:
+            return 'stream'
+        return 'inteiro' if tamanho >= self.minimo_bytes else None
+
+    @staticmethod
+    def _variar(headers):
+        """Acrescentar Vary: Accept-Encoding às respostas de tipo comprimível"""
+        tipo = None
+        for nome, valor in headers:
+            nome = nome.lower()
+            if nome == 'content-type':
+                tipo = valor.lower()
+            elif nome == 'vary' and (valor.strip() == '*' or 'accept-encoding' in valor.lower()):
+                return headers
+        if tipo is None or not tipo.startswith(TIPOS_COMPRIMIVEIS):
+            return headers
+        return list(headers) + [('Vary', 'Accept-Encoding')]
+
+    @classmethod
+    def _cabecalhos(cls, headers, codificacao):
+        """Cabeçalhos da resposta comprimida (sem o Content-Length original)"""
+        novos = [(nome, valor) for nome, valor in headers if nome.lower() != 'content-length']
+        novos.append(('Content-Encoding', codificacao))
+        return cls._variar(novos)
+
+    def _comprimir_stream(self, iteravel, codificacao):
+        """Comprimir cada bloco do stream e enviá-lo imediatamente"""
+        compressor = _Compressor(codificacao, self.nivel)
+        try:
+            for bloco in iteravel:
+                if bloco:
+                    saida = compressor.comprimir(bloco, descarregar=True)
+                    if saida:
+                        yield saida
+            yield compressor.finalizar()
+        finally:
+            if hasattr(iteravel, 'close'):
+                iteravel.close()
+
+    @staticmethod
+    def _erro(start_response, status, mensagem):
+        """Resposta de erro em JSON, no mesmo formato das rotas"""
+        corpo = json.dumps({'erro': mensagem}).encode('utf-8')
+        start_response(status, [('Content-Type', 'application/json'),
+                                ('Content-Length', str(len(corpo)))])
+        return [corpo]
@@ -0,0 +1,382 @@
+"""
+Deduplicação e reordenação das leituras antes da gravação
+
+- IndiceDeduplicacao: lembra, por robô, as leituras gravadas recentemente
+  (timestamp + hash do conteúdo) e descarta reenvios do firmware e replays
+- JanelaReordenacao: retém as leituras aceitas por alguns instantes e as
+  grava ordenadas por robô e timestamp, encaixando amostras levemente
+  atrasadas antes do envio
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from fila_escrita import FilaCheiaError
+from influxdb_service import ROBO_PADRAO
+from validacao import CAMPOS_OBRIGATORIOS, leitura_publica, timestamp_leitura_ns
+
+
+def chave_leitura(dados, sem_timestamp=False):
+    """
+    Chave de deduplicação de uma leitura validada
+
+    Args:
+        dados: Leitura validada
+        sem_timestamp: True se o timestamp foi atribuído pelo servidor (a
+                       chave usa apenas o conteúdo)
+
+    Returns:
+        tuple: (timestamp em ms ou None, hash dos campos medidos)
+    """
+    conteudo = hash(tuple(dados[campo] for campo in CAMPOS_OBRIGATORIOS))
+    if sem_timestamp:
+        return None, conteudo
+    return round(timestamp_leitura_ns(dados) / 1_000_000), conteudo
+
+
+def sem_timestamp(leituras):
+    """
+    Identificar as leituras enviadas sem timestamp (antes da validação, que o completa)
+
+    Returns:
+        set: id() de cada leitura sem timestamp
+    """
+    return {id(dados) for dados in leituras if isinstance(dados, dict) and 'timestamp' not in dados}
+
+
+class IndiceDeduplicacao:
+    """Leituras gravadas recentemente por robô, com expiração por tempo e tamanho limitado"""
+
+    def __init__(self, janela_s=300, max_por_robo=10000, janela_sem_timestamp_s=0):
+        """
+        Inicializar índice
+
+        Args:
+            janela_s: Tempo que uma leitura gravada continua sendo reconhecida
+            max_por_robo: Máximo de chaves guardadas por robô (as mais antigas saem primeiro)
+            janela_sem_timestamp_s: Para leituras sem timestamp, intervalo em que
+                                    o mesmo conteúdo é tratado como reenvio (0 = não deduplicar)
+        """
+        self.janela_s = janela_s
+        self.max_por_robo = max(1, int(max_por_robo))
+        self.janela_sem_timestamp_s = janela_sem_timestamp_s
+
+        # robo -> OrderedDict(chave -> instante do registro), em ordem de chegada
+        self._robos = {}
+        # (robo, chave) -> instante da reserva, das leituras ainda em gravação
+        self._pendentes = {}
+        self._lock = threading.Lock()
+        self._ultima_limpeza = time.monotonic()
+
+        self.duplicadas = 0
+
+    def _expirar(self, chaves, agora):
+        """Remover do início as chaves mais antigas que a janela"""
+        limite = agora - self.janela_s
+        while chaves and next(iter(chaves.values())) <= limite:
+            chaves.popitem(last=False)
+
+    def filtrar(self, leituras, sem_timestamp_ids=()):
+        """
+        Separar as leituras novas das já gravadas e reservar suas chaves
+
+        As chaves das leituras novas ficam pendentes até registrar() (gravação
+        bem-sucedida) ou liberar() (falha, para que um reenvio seja aceito).
+        Um reenvio que chega enquanto a original está em gravação, assim como
+        repetições dentro do próprio lote, conta como duplicada.
+
+        Args:
+            leituras: Leituras validadas
+            sem_timestamp_ids: Retorno de sem_timestamp() para estas leituras
+
+        Returns:
+            tuple: (leituras novas, chave de cada leitura nova - None se ela não
+                    é deduplicada -, número de duplicadas)
+        """
+        agora = time.monotonic()
+        novas = []
+        chaves_novas = []
+        with self._lock:
+            for dados in leituras:
+                robo = dados.get('robo_id', ROBO_PADRAO)
+                sem_ts = id(dados) in sem_timestamp_ids
+                if sem_ts and not self.janela_sem_timestamp_s:
+                    novas.append(dados)
+                    chaves_novas.append(None)
+                    continue
+                chave = chave_leitura(dados, sem_ts)
+                chaves = self._robos.get(robo)
+                if chaves is not None:
+                    self._expirar(chaves, agora)
+                    instante = chaves.get(chave)
+                    if instante is not None and (
+                            not sem_ts or agora - instante <= self.janela_sem_timestamp_s):
+                        continue
+                if (robo, chave) in self._pendentes:
+                    continue
+                self._pendentes[(robo, chave)] = agora
+                novas.append(dados)
+                chaves_novas.append((robo, chave))
+            self.duplicadas += len(leituras) - len(novas)
+        return novas, chaves_novas, len(leituras) - len(novas)
+
+    def registrar(self, chaves):
+        """Registrar as chaves de leituras gravadas com sucesso"""
+        agora = time.monotonic()
+        with self._lock:
+            for item in chaves:
+                if item is None:
+                    continue
+                self._pendentes.pop(item, None)
+                robo, chave = item
+                indice = self._robos.setdefault(robo, OrderedDict())
+                indice.pop(chave, None)
+                indice[chave] = agora
+                if len(indice) > self.max_por_robo:
+                    indice.popitem(last=False)
+
+            # Robôs que pararam de enviar também liberam memória
+            if agora - self._ultima_limpeza > self.janela_s:
+                for robo in list(self._robos):
+                    self._expirar(self._robos[robo], agora)
+                    if not self._robos[robo]:
+                        del self._robos[robo]
+                # Reservas esquecidas (gravação que nunca terminou) também expiram
+                limite = agora - self.janela_s
+                for item, instante in list(self._pendentes.items()):
+                    if instante <= limite:
+                        del self._pendentes[item]
+                self._ultima_limpeza = agora
+
+    def liberar(self, chaves):
+        """Desfazer a reserva das chaves de leituras que não foram gravadas"""
+        with self._lock:
+            for item in chaves:
+                if item is not None:
+                    self._pendentes.pop(item, None)
+
+    def tamanho(self):
+        """Número de chaves guardadas"""
+        with self._lock:
+            return sum(len(chaves) for chaves in self._robos.values())
+
+
+class JanelaReordenacao:
+    """Retém leituras por um atraso fixo e grava em lotes ordenados por robô e timestamp"""
+
+    def __init__(self, salvar, atraso_ms=2000, capacidade=10000, max_tentativas=5,
+                 intervalo_retry_ms=1000, max_intervalo_retry_ms=30000,
+                 arquivo_quarentena=None, apos_gravar=None, apos_descartar=None):
+        """
+        Inicializar janela e thread de envio
+
+        Args:
+            salvar: Função que grava uma lista de leituras (ex: salvar_leituras)
+                    e retorna True em caso de sucesso
+            atraso_ms: Tempo que cada leitura espera por amostras atrasadas
+            capacidade: Máximo de leituras retidas (acima disso, FilaCheiaError)
+            max_tentativas: Falhas isoladas de uma leitura (com o banco aceitando
+                            as demais) antes de ela ir para a quarentena
+            intervalo_retry_ms: Espera base após uma falha de gravação
+            max_intervalo_retry_ms: Espera máxima entre tentativas
+            arquivo_quarentena: Arquivo NDJSON que recebe as leituras descartadas
+                                (None = apenas registrar no log)
+            apos_gravar: Função chamada com (leituras, chaves) depois de cada
+                         gravação bem-sucedida (ex: registrar deduplicação,
+                         estatísticas e eventos)
+            apos_descartar: Função chamada com as chaves das leituras enviadas
+                            à quarentena (ex: liberar a reserva da deduplicação)
+        """
+        self.salvar = salvar
+        self.atraso = atraso_ms / 1000.0
+        self.capacidade = max(1, int(capacidade))
+        self.max_tentativas = max(1, int(max_tentativas))
+        self.intervalo_retry = intervalo_retry_ms / 1000.0
+        self.max_intervalo_retry = max_intervalo_retry_ms / 1000.0
+        self.arquivo_quarentena = arquivo_quarentena
+        self.apos_gravar = apos_gravar
+        self.apos_descartar = apos_descartar
+
+        # [instante de chegada, epoch da leitura, leitura, chave, falhas isoladas],
+        # em ordem de chegada
+        self._retidas = []
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        # Último timestamp gravado de cada robô, para contar amostras fora de ordem
+        self._ultimo_gravado = {}
+        # Backoff após falhas: nenhuma gravação antes deste instante
+        self._falhas_seguidas = 0
+        self._proxima_tentativa = 0.0
+
+        self.gravadas = 0
+        self.fora_de_ordem = 0
+        self.falhas = 0
+        self.descartadas = 0
+
+        self._thread = threading.Thread(target=self._executar, name='reordenacao', daemon=True)
+        self._thread.start()
+
+    def adicionar(self, leituras, chaves=None):
+        """
+        Reter leituras validadas até o fim da janela
+
+        Args:
+            leituras: Leituras validadas
+            chaves: Chave de deduplicação de cada leitura, na mesma ordem
+                    (repassada a apos_gravar)
+
+        Returns:
+            bool: True (a gravação acontece em segundo plano)
+
+        Raises:
+            FilaCheiaError: Se a janela atingiu a capacidade
+        """
+        agora = time.monotonic()
+        if chaves is None:
+            chaves = [None] * len(leituras)
+        itens = [[agora, timestamp_leitura_ns(dados) / 1_000_000_000, dados, chave, 0]
+                 for dados, chave in zip(leituras, chaves)]
+        with self._lock:
+            if len(self._retidas) + len(itens) > self.capacidade:
+                raise FilaCheiaError(
+                    f'Janela de reordenação cheia ({len(self._retidas)} leituras retidas)'
+                )
+            self._retidas.extend(itens)
+        return True
+
+    def pendentes(self):
+        """Número de leituras retidas aguardando gravação"""
+        with self._lock:
+            return len(self._retidas)
+
+    def _salvar_itens(self, itens):
+        """Gravar os itens, tratando exceções como falha"""
+        try:
+            return bool(self.salvar([item[2] for item in itens]))
+        except Exception as e:
+            print(f"Erro ao gravar leituras reordenadas: {e}")
+            return False
+
+    def _gravar_isolando(self, itens, ciclo):
+        """
+        Gravar itens; se falhar, dividir ao meio para que uma leitura recusada
+        não impeça a gravação das demais
+
+        Returns:
+            list: Itens não gravados
+        """
+        if ciclo['falhas'] >= ciclo['max_falhas']:
+            return itens
+        if self._salvar_itens(itens):
+            ciclo['gravou'] = True
+            self._confirmar(itens)
+            return []
+        ciclo['falhas'] += 1
+        if len(itens) == 1:
+            ciclo['isoladas'].append(itens[0])
+            return itens
+        meio = len(itens) // 2
+        return self._gravar_isolando(itens[:meio], ciclo) + self._gravar_isolando(itens[meio:], ciclo)
+
+    def _confirmar(self, itens):
+        """Atualizar contadores e notificar apos_gravar"""
+        for _, epoch, dados, _, _ in itens:
+            robo = dados.get('robo_id', ROBO_PADRAO)
+            ultimo = self._ultimo_gravado.get(robo)
+            if ultimo is not None and epoch < ultimo:
+                self.fora_de_ordem += 1
+            else:
+                self._ultimo_gravado[robo] = epoch
+        self.gravadas += len(itens)
+        if self.apos_gravar is not None:
+            try:
+                self.apos_gravar([item[2] for item in itens], [item[3] for item in itens])
+            except Exception as e:
+                print(f"Erro após gravar leituras reordenadas: {e}")
+
+    def _quarentenar(self, itens, motivo=None):
+        """Descartar leituras que não puderam ser gravadas, guardando-as em NDJSON"""
+        self.descartadas += len(itens)
+        print(f"Janela de reordenação: {len(itens)} leituras descartadas "
+              f"({motivo or f'{self.max_tentativas} falhas'})")
+        if self.apos_descartar is not None:
+            try:
+                self.apos_descartar([item[3] for item in itens])
+            except Exception as e:
+                print(f"Erro após descartar leituras reordenadas: {e}")
+        if self.arquivo_quarentena is None:
+            return
+        try:
+            with open(self.arquivo_quarentena, 'a', encoding='utf-8') as arquivo:
+                for item in itens:
+                    arquivo.write(json.dumps(leitura_publica(item[2])) + '\n')
+        except OSError as e:
+            print(f"Erro ao gravar quarentena da reordenação: {e}")
+
+    def _enviar(self, tudo=False):
+        """Gravar as leituras cuja janela terminou (ou todas, no encerramento)"""
+        agora = time.monotonic()
+        if not tudo and agora < self._proxima_tentativa:
+            return
+        limite = agora - self.atraso
+        with self._lock:
+            if tudo:
+                prontas, self._retidas = self._retidas, []
+            else:
+                # Em ordem de chegada: as prontas formam um prefixo da lista
+                corte = 0
+                while corte < len(self._retidas) and self._retidas[corte][0] <= limite:
+                    corte += 1
+                prontas, self._retidas = self._retidas[:corte], self._retidas[corte:]
+        if not prontas:
+            return
+
+        prontas.sort(key=lambda item: (item[2].get('robo_id', ROBO_PADRAO), item[1]))
+        # Limite de escritas com falha por ciclo: isolar uma leitura custa
+        # ~log2(N) falhas; com o banco fora do ar o ciclo termina logo
+        ciclo = {'falhas': 0, 'max_falhas': 2 * len(prontas).bit_length() + 2,
+                 'gravou': False, 'isoladas': []}
+        restantes = self._gravar_isolando(prontas, ciclo)
+        if not restantes:
+            self._falhas_seguidas = 0
+            return
+
+        self.falhas += 1
+        self._falhas_seguidas += 1
+        # Uma falha isolada só conta para a leitura se o banco aceitou outras
+        # no mesmo ciclo; sem nenhuma gravação é queda do banco, e a janela
+        # apenas retém (até a capacidade, depois 503)
+        descartar = []
+        if ciclo['gravou']:
+            for item in ciclo['isoladas']:
+                item[4] += 1
+                if item[4] >= self.max_tentativas:
+                    descartar.append(item)
+        if descartar:
+            self._quarentenar(descartar)
+            restantes = [item for item in restantes if item[4] < self.max_tentativas]
+
+        espera = min(self.intervalo_retry * (2 ** (self._falhas_seguidas - 1)),
+                     self.max_intervalo_retry)
+        self._proxima_tentativa = time.monotonic() + espera
+        # Devolver para a próxima tentativa, na ordem de chegada
+        with self._lock:
+            self._retidas[:0] = sorted(restantes, key=lambda item: item[0])
+
+    def _executar(self):
+        """Loop da thread: verificar a janela algumas vezes por atraso"""
+        while not self._parar.wait(max(self.atraso / 4, 0.05)):
+            self._enviar()
+
+    def fechar(self, timeout=30):
+        """Parar a thread e tentar gravar tudo o que estiver retido"""
+        if self._parar.is_set():
+            return
+        self._parar.set()
+        self._thread.join(timeout=timeout)
+        self._enviar(tudo=True)
+        if self._retidas:
+            self._quarentenar(self._retidas, 'não gravadas no encerramento')
+            self._retidas = []
@@ -0,0 +1,197 @@
+"""
+Estatísticas incrementais em memória
+Mantém agregados por minuto de cada campo em buffers circulares, permitindo
+responder /leituras/estatisticas sem consultar o InfluxDB
+"""
+
+import math
+import threading
+import time
+from array import array
+
+from influxdb_service import CAMPOS_ESTATISTICAS, formatar_estatisticas
+from validacao import timestamp_leitura_ns
+
+
+class EstatisticasRolantes:
+    """Agregados (contagem, soma, soma dos quadrados, mín, máx) em buckets de tempo"""
+
+    def __init__(self, horizonte_horas=24, resolucao_s=60, campos=None, tolerancia_futuro_s=60):
+        """
+        Inicializar buffers circulares
+
+        Args:
+            horizonte_horas: Janela máxima (horas) mantida em memória
+            resolucao_s: Duração de cada bucket em segundos
+            campos: Campos numéricos acompanhados (padrão: CAMPOS_ESTATISTICAS)
+            tolerancia_futuro_s: Diferença de relógio aceita para leituras com timestamp futuro
+        """
+        self.resolucao = int(resolucao_s)
+        self.horizonte_horas = horizonte_horas
+        self.total_buckets = int(horizonte_horas * 3600 // self.resolucao)
+        self.campos = list(campos or CAMPOS_ESTATISTICAS)
+        self.tolerancia_futuro_s = tolerancia_futuro_s
+        # Leituras ignoradas por estarem além da tolerância de relógio
+        self.ignoradas_futuro = 0
+
+        n = self.total_buckets
+        # Identificador (epoch / resolução) do bucket ocupando cada posição
+        self._bucket = array('q', [-1]) * n
+        self._contagem = {c: array('q', [0]) * n for c in self.campos}
+        self._soma = {c: array('d', [0.0]) * n for c in self.campos}
+        self._soma_q = {c: array('d', [0.0]) * n for c in self.campos}
+        self._minimo = {c: array('d', [math.inf]) * n for c in self.campos}
+        self._maximo = {c: array('d', [-math.inf]) * n for c in self.campos}
+
+        self._lock = threading.Lock()
+
+        # A partir de quando os buckets contêm todas as leituras
+        # (antes do aquecimento, apenas o que chegou desde o início do processo)
+        self.cobertura_desde = time.time()
+
+    def _posicao(self, bucket):
+        """
+        Obter a posição do bucket no buffer, reciclando a posição se necessário
+
+        Returns:
+            int: Posição no buffer, ou None se o bucket já foi descartado
+        """
+        posicao = bucket % self.total_buckets
+        atual = self._bucket[posicao]
+        if atual == bucket:
+            return posicao
+        if atual > bucket:
+            # Posição já ocupada por um bucket mais recente
+            return None
+
+        self._bucket[posicao] = bucket
+        for campo in self.campos:
+            self._contagem[campo][posicao] = 0
+            self._soma[campo][posicao] = 0.0
+            self._soma_q[campo][posicao] = 0.0
+            self._minimo[campo][posicao] = math.inf
+            self._maximo[campo][posicao] = -math.inf
+        return posicao
+
+    def registrar(self, dados):
+        """
+        Incorporar uma leitura aos agregados
+
+        Args:
+            dados: Leitura validada (com timestamp ISO)
+        """
+        agora = time.time()
+        epoch = timestamp_leitura_ns(dados) / 1_000_000_000
+        if epoch > agora + self.tolerancia_futuro_s:
+            # Um bucket futuro reciclaria a posição de um minuto ainda dentro do
+            # horizonte e faria as leituras atuais serem descartadas depois
+            with self._lock:
+                self.ignoradas_futuro += 1
+            return
+        # Relógio do robô ligeiramente adiantado: contar no bucket atual
+        bucket = int(min(epoch, agora) // self.resolucao)
+        with self._lock:
+            posicao = self._posicao(bucket)
+            if posicao is None:
+                return
+            for campo in self.campos:
+                valor = dados.get(campo)
+                if valor is None:
+                    continue
+                valor = float(valor)
+                self._contagem[campo][posicao] += 1
+                self._soma[campo][posicao] += valor
+                self._soma_q[campo][posicao] += valor * valor
+                if valor < self._minimo[campo][posicao]:
+                    self._minimo[campo][posicao] = valor
+                if valor > self._maximo[campo][posicao]:
+                    self._maximo[campo][posicao] = valor
+
+    def aquecer(self, service):
+        """
+        Preencher os buckets a partir do InfluxDB com uma única query
+
+        Args:
+            service: InfluxDBService usado para buscar os agregados por minuto
+
+        Returns:
+            bool: True se o aquecimento foi concluído
+        """
+        inicio = time.time()
+        try:
+            agregados = service.buscar_agregados_por_minuto(hours=self.horizonte_horas)
+        except Exception as e:
+            print(f"Erro ao aquecer estatísticas em memória: {e}")
+            return False
+
+        with self._lock:
+            for campo, epoch, estatistica, valor in agregados:
+                if campo not in self._contagem or valor is None:
+                    continue
+                posicao = self._posicao(int(epoch // self.resolucao))
+                if posicao is None:
+                    continue
+                # Séries de robôs diferentes caem no mesmo bucket: combinar
+                if estatistica == 'contagem':
+                    self._contagem[campo][posicao] += int(valor)
+                elif estatistica == 'soma':
+                    self._soma[campo][posicao] += valor
+                elif estatistica == 'soma_q':
+                    self._soma_q[campo][posicao] += valor
+                elif estatistica == 'minimo':
+                    self._minimo[campo][posicao] = min(self._minimo[campo][posicao], valor)
+                elif estatistica == 'maximo':
+                    self._maximo[campo][posicao] = max(self._maximo[campo][posicao], valor)
+            self.cobertura_desde = inicio - self.horizonte_horas * 3600
+        return True
+
+    def cobre(self, hours):
+        """Verificar se uma janela de N horas pode ser respondida da memória"""
+        if hours > self.horizonte_horas:
+            return False
+        return time.time() - hours * 3600 >= self.cobertura_desde - self.resolucao
+
+    def consultar(self, hours=24):
+        """
+        Calcular estatísticas das últimas N horas a partir dos buckets
+
+        Args:
+            hours: Janela em horas (no máximo o horizonte mantido)
+
+        Returns:
+            dict: Estatísticas no mesmo formato de InfluxDBService.buscar_estatisticas
+        """
+        atual = int(time.time() // self.resolucao)
+        primeiro = atual - int(hours * 3600 // self.resolucao)
+
+        stats = {}
+        with self._lock:
+            validas = [
+                posicao for posicao in range(self.total_buckets)
+                if primeiro <= self._bucket[posicao] <= atual
+            ]
+            for campo in self.campos:
+                contagem = 0
+                soma = soma_q = 0.0
+                minimo, maximo = math.inf, -math.inf
+                for posicao in validas:
+                    n = self._contagem[campo][posicao]
+                    if not n:
+                        continue
+                    contagem += n
+                    soma += self._soma[campo][posicao]
+                    soma_q += self._soma_q[campo][posicao]
+                    minimo = min(minimo, self._minimo[campo][posicao])
+                    maximo = max(maximo, self._maximo[campo][posicao])
+
+                valores = {}
+                if contagem:
+                    media = soma / contagem
+                    valores = {'media': media, 'minimo': minimo, 'maximo': maximo,
+                               'contagem': contagem}
+                    if contagem > 1:
+                        # Desvio padrão amostral, como o stddev() do Flux
+                        variancia = (soma_q - contagem * media * media) / (contagem - 1)
+                        valores['desvio_padrao'] = math.sqrt(max(variancia, 0.0))
+                stats[campo] = formatar_estatisticas(valores)
+        return stats
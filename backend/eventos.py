@@ -0,0 +1,170 @@
+"""
+Difusão das leituras aceitas para clientes conectados (Server-Sent Events)
+Cada assinante tem uma fila limitada; quem não consome a tempo é
+desconectado, sem atrasar a ingestão nem os demais assinantes
+"""
+
+import json
+import queue
+import threading
+from datetime import datetime, timezone
+
+from influxdb_service import ROBO_PADRAO
+from validacao import CHAVE_NS
+
+
+class LimiteAssinantesError(Exception):
+    """Erro lançado quando o número máximo de assinantes foi atingido"""
+
+
+class Assinante:
+    """Cliente inscrito, com filtros e fila de eventos própria"""
+
+    def __init__(self, robo=None, campos=None, capacidade=100):
+        """
+        Args:
+            robo: Receber apenas leituras deste robô (None = todos)
+            campos: Conjunto de campos enviados em cada evento (None = todos)
+            capacidade: Eventos pendentes antes de o assinante ser descartado
+        """
+        self.robo = robo
+        self.campos = frozenset(campos) if campos else None
+        self.fila = queue.Queue(maxsize=capacidade)
+        # Definido quando o assinante é desconectado por ser lento
+        self.descartado = False
+
+    def aceita(self, leitura):
+        """Verificar se a leitura passa pelo filtro de robô"""
+        return self.robo is None or leitura.get('robo_id', ROBO_PADRAO) == self.robo
+
+    def proximo(self, timeout):
+        """
+        Aguardar o próximo evento
+
+        Returns:
+            str: Evento SSE já formatado, ou None se o tempo esgotou
+        """
+        try:
+            return self.fila.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class DifusorEventos:
+    """Distribui cada leitura aceita para os assinantes cujos filtros ela atende"""
+
+    def __init__(self, capacidade_assinante=100, max_assinantes=100):
+        """
+        Inicializar difusor
+
+        Args:
+            capacidade_assinante: Tamanho da fila de cada assinante
+            max_assinantes: Máximo de clientes conectados ao mesmo tempo
+        """
+        self.capacidade_assinante = max(1, int(capacidade_assinante))
+        self.max_assinantes = max_assinantes
+        self._assinantes = set()
+        self._lock = threading.Lock()
+        self._sequencia = 0
+
+        self.publicados = 0
+        self.descartados = 0
+
+    def inscrever(self, robo=None, campos=None):
+        """
+        Registrar um novo assinante
+
+        Raises:
+            LimiteAssinantesError: Se max_assinantes já estiverem conectados
+        """
+        assinante = Assinante(robo, campos, self.capacidade_assinante)
+        with self._lock:
+            if len(self._assinantes) >= self.max_assinantes:
+                raise LimiteAssinantesError(
+                    f'Limite de {self.max_assinantes} assinantes atingido'
+                )
+            self._assinantes.add(assinante)
+        return assinante
+
+    def cancelar(self, assinante):
+        """Remover um assinante (ex: cliente desconectou)"""
+        with self._lock:
+            self._assinantes.discard(assinante)
+
+    def total_assinantes(self):
+        """Número de assinantes conectados"""
+        with self._lock:
+            return len(self._assinantes)
+
+    def publicar(self, leituras):
+        """
+        Enviar leituras aceitas aos assinantes (não bloqueia)
+
+        Args:
+            leituras: Lista de leituras validadas
+        """
+        with self._lock:
+            if not self._assinantes:
+                return
+            assinantes = list(self._assinantes)
+            # Reservar os identificadores dos eventos deste lote
+            inicio = self._sequencia + 1
+            self._sequencia += len(leituras)
+            self.publicados += len(leituras)
+
+        for sequencia, dados in enumerate(leituras, start=inicio):
+            leitura = _leitura_evento(dados)
+            # Serializar uma vez por combinação de campos, não por assinante
+            serializados = {}
+            for assinante in assinantes:
+                if assinante.descartado or not assinante.aceita(leitura):
+                    continue
+                evento = serializados.get(assinante.campos)
+                if evento is None:
+                    evento = formatar_evento('leitura', _filtrar_campos(leitura, assinante.campos),
+                                             sequencia)
+                    serializados[assinante.campos] = evento
+                try:
+                    assinante.fila.put_nowait(evento)
+                except queue.Full:
+                    self._descartar(assinante)
+
+    def _descartar(self, assinante):
+        """Desconectar um assinante que não acompanhou o ritmo das leituras"""
+        assinante.descartado = True
+        with self._lock:
+            self._assinantes.discard(assinante)
+            self.descartados += 1
+
+
+def _leitura_evento(dados):
+    """Leitura no formato de GET /leituras (timestamp ISO e robo_id)"""
+    leitura = dict(dados)
+    leitura.pop(CHAVE_NS, None)
+    leitura.setdefault('robo_id', ROBO_PADRAO)
+    if isinstance(leitura.get('timestamp'), int):
+        # Epoch em milissegundos (formatos binários)
+        leitura['timestamp'] = datetime.fromtimestamp(
+            leitura['timestamp'] / 1000, tz=timezone.utc
+        ).isoformat()
+    return leitura
+
+
+def _filtrar_campos(leitura, campos):
+    """Manter apenas os campos pedidos (timestamp e robo_id sempre vão)"""
+    if campos is None:
+        return leitura
+    return {
+        chave: valor for chave, valor in leitura.items()
+        if chave in campos or chave in ('timestamp', 'robo_id')
+    }
+
+
+def formatar_evento(tipo, dados, identificador=None):
+    """Formatar um evento no protocolo text/event-stream"""
+    linhas = []
+    if identificador is not None:
+        linhas.append(f'id: {identificador}')
+    linhas.append(f'event: {tipo}')
+    linhas.append(f'data: {json.dumps(dados)}')
+    return '\n'.join(linhas) + '\n\n'
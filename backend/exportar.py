@@ -0,0 +1,396 @@
+"""
+Exportação e importação de leituras históricas do InfluxDB
+
+O período é dividido em fatias de tempo consultadas em paralelo. Cada
+fatia é gravada no próprio arquivo conforme os registros chegam, então a
+memória usada é limitada a um bloco por fatia em andamento. A importação
+lê esses arquivos (ou qualquer arquivo no mesmo formato) e grava as
+leituras no bucket em lotes.
+
+Uso:
+    python exportar.py exportar --hours 720 --destino exportacao --formato parquet
+    python exportar.py exportar --inicio 2024-01-01 --fim 2024-02-01 --robo robo_01
+    python exportar.py importar exportacao --lote 5000
+"""
+
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from influxdb_service import (
+    CAMPOS_AGREGADOS, CAMPOS_PONTUACAO, filtro_robo, formatar_leitura, formatar_rfc3339
+)
+from validacao import robo_id_valido, validar_lote
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # dependência opcional
+    pyarrow = None
+
+
+FORMATOS = ('csv', 'ndjson', 'parquet')
+
+# Colunas exportadas, na ordem dos arquivos CSV e Parquet
+TIPOS_CAMPOS = {
+    'temperatura_c': float,
+    'umidade_pct': float,
+    'luminosidade': int,
+    'presenca': int,
+    'probabilidade_vida': float,
+    **dict(CAMPOS_PONTUACAO)
+}
+COLUNAS = ['timestamp', 'robo_id'] + CAMPOS_AGREGADOS + [campo for campo, _ in CAMPOS_PONTUACAO]
+
+# Registros acumulados antes de cada gravação no arquivo
+TAMANHO_BLOCO = 10000
+
+
+def query_exportar(bucket, inicio, fim, robo=None):
+    """
+    Query Flux das leituras de [inicio, fim), pivotadas
+
+    Sem group()/sort(): cada robô chega em ordem cronológica e o
+    InfluxDB não precisa ordenar a fatia inteira em memória.
+    """
+    return f'''
+    from(bucket: "{bucket}")
+        |> range(start: {formatar_rfc3339(inicio)}, stop: {formatar_rfc3339(fim)})
+        |> filter(fn: (r) => r["_measurement"] == "leitura_sensores"){filtro_robo(robo)}
+        |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
+    '''
+
+
+def fatiar(inicio, fim, horas_por_fatia):
+    """Dividir [inicio, fim) em fatias consecutivas de até horas_por_fatia"""
+    passo = timedelta(hours=horas_por_fatia)
+    fatias = []
+    while inicio < fim:
+        fatias.append((inicio, min(inicio + passo, fim)))
+        inicio += passo
+    return fatias
+
+
+def formatar_exportacao(record):
+    """Leitura no formato de GET /leituras, mais os campos de pontuação gravados"""
+    leitura = formatar_leitura(record)
+    for campo, _ in CAMPOS_PONTUACAO:
+        valor = record.values.get(campo)
+        if valor is not None:
+            leitura[campo] = valor
+    return leitura
+
+
+class _EscritorCSV:
+    """Arquivo CSV com cabeçalho (campos ausentes ficam vazios)"""
+
+    def __init__(self, caminho):
+        self._arquivo = open(caminho, 'w', newline='', encoding='utf-8')
+        self._csv = csv.DictWriter(self._arquivo, COLUNAS)
+        self._csv.writeheader()
+
+    def escrever(self, leituras):
+        self._csv.writerows(leituras)
+
+    def fechar(self):
+        self._arquivo.close()
+
+
+class _EscritorNDJSON:
+    """Uma leitura JSON por linha (mesmo formato de POST /leituras/lote)"""
+
+    def __init__(self, caminho):
+        self._arquivo = open(caminho, 'w', encoding='utf-8')
+
+    def escrever(self, leituras):
+        self._arquivo.write(''.join(json.dumps(leitura) + '\n' for leitura in leituras))
+
+    def fechar(self):
+        self._arquivo.close()
+
+
+def _esquema_parquet():
+    """Esquema Parquet das colunas exportadas (timestamp em UTC)"""
+    tipos = {float: pyarrow.float64(), int: pyarrow.int64()}
+    return pyarrow.schema(
+        [('timestamp', pyarrow.timestamp('us', tz='UTC')), ('robo_id', pyarrow.string())]
+        + [(campo, tipos[TIPOS_CAMPOS[campo]]) for campo in COLUNAS[2:]]
+    )
+
+
+class _EscritorParquet:
+    """Arquivo Parquet com um row group por bloco"""
+
+    def __init__(self, caminho):
+        self._esquema = _esquema_parquet()
+        self._escritor = pyarrow.parquet.ParquetWriter(caminho, self._esquema)
+
+    def escrever(self, leituras):
+        colunas = {coluna: [leitura.get(coluna) for leitura in leituras] for coluna in COLUNAS}
+        colunas['timestamp'] = [datetime.fromisoformat(momento) for momento in colunas['timestamp']]
+        self._escritor.write_table(pyarrow.table(colunas, schema=self._esquema))
+
+    def fechar(self):
+        self._escritor.close()
+
+
+ESCRITORES = {'csv': _EscritorCSV, 'ndjson': _EscritorNDJSON, 'parquet': _EscritorParquet}
+
+
+def exportar_fatia(service, inicio, fim, destino, formato, robo=None, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Exportar uma fatia de tempo para o próprio arquivo
+
+    Returns:
+        tuple: (caminho do arquivo ou None se a fatia estava vazia, leituras exportadas)
+    """
+    nome = inicio.strftime('%Y%m%dT%H%M%SZ')
+    caminho = os.path.join(destino, f'leituras_{nome}.{formato}')
+    query = query_exportar(service.bucket, inicio, fim, robo)
+
+    escritor = None
+    bloco = []
+    total = 0
+    try:
+        for record in service.query_api.query_stream(org=service.org, query=query):
+            bloco.append(formatar_exportacao(record))
+            if len(bloco) >= tamanho_bloco:
+                if escritor is None:
+                    escritor = ESCRITORES[formato](caminho)
+                escritor.escrever(bloco)
+                total += len(bloco)
+                bloco = []
+        if bloco:
+            if escritor is None:
+                escritor = ESCRITORES[formato](caminho)
+            escritor.escrever(bloco)
+            total += len(bloco)
+    except Exception:
+        # Não deixar um arquivo parcial que pareça completo
+        if escritor is not None:
+            escritor.fechar()
+            os.remove(caminho)
+        raise
+    if escritor is None:
+        return None, 0
+    escritor.fechar()
+    return caminho, total
+
+
+def exportar(service, inicio, fim, destino, formato='ndjson', horas_por_fatia=24,
+             paralelo=4, robo=None):
+    """
+    Exportar as leituras de [inicio, fim) consultando fatias em paralelo
+
+    Args:
+        service: InfluxDBService conectado ao bucket de origem
+        inicio: datetime (UTC) de início do período
+        fim: datetime (UTC) de fim do período
+        destino: Diretório dos arquivos (um por fatia não vazia)
+        formato: 'csv', 'ndjson' ou 'parquet'
+        horas_por_fatia: Duração de cada fatia consultada
+        paralelo: Número de fatias consultadas ao mesmo tempo
+        robo: Exportar apenas este robô (None = todos)
+
+    Returns:
+        int: Número de leituras exportadas
+
+    Raises:
+        ValueError: Se o formato não for suportado
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato não suportado: {formato}')
+    if formato == 'parquet' and pyarrow is None:
+        raise ValueError('Formato parquet requer o pacote pyarrow')
+    os.makedirs(destino, exist_ok=True)
+
+    fatias = fatiar(inicio, fim, horas_por_fatia)
+    total = 0
+    with ThreadPoolExecutor(max_workers=paralelo, thread_name_prefix='exportar') as executor:
+        resultados = executor.map(
+            lambda fatia: exportar_fatia(service, fatia[0], fatia[1], destino, formato, robo),
+            fatias
+        )
+        for (inicio_fatia, fim_fatia), (caminho, quantidade) in zip(fatias, resultados):
+            total += quantidade
+            if caminho is not None:
+                print(f"📦 {formatar_rfc3339(inicio_fatia)} .. {formatar_rfc3339(fim_fatia)}: "
+                      f"{quantidade} leituras -> {caminho}")
+    return total
+
+
+def _converter(leitura):
+    """Restaurar os tipos de uma linha lida de CSV ou Parquet (campos vazios são removidos)"""
+    convertida = {}
+    for campo, valor in leitura.items():
+        if valor is None or valor == '':
+            continue
+        if campo in TIPOS_CAMPOS:
+            valor = TIPOS_CAMPOS[campo](float(valor) if TIPOS_CAMPOS[campo] is int else valor)
+        elif isinstance(valor, datetime):
+            valor = valor.isoformat()
+        convertida[campo] = valor
+    return convertida
+
+
+def ler_blocos(caminho, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Ler um arquivo exportado em blocos de leituras
+
+    Yields:
+        list: Até tamanho_bloco leituras (dicionários no formato de POST /leituras)
+    """
+    formato = os.path.splitext(caminho)[1].lstrip('.').lower()
+    if formato == 'parquet':
+        if pyarrow is None:
+            raise ValueError('Formato parquet requer o pacote pyarrow')
+        arquivo = pyarrow.parquet.ParquetFile(caminho)
+        for lote in arquivo.iter_batches(batch_size=tamanho_bloco):
+            yield [_converter(linha) for linha in lote.to_pylist()]
+        return
+    if formato not in ('csv', 'ndjson', 'jsonl'):
+        raise ValueError(f'Formato não suportado: {caminho}')
+
+    with open(caminho, newline='', encoding='utf-8') as arquivo:
+        if formato == 'csv':
+            linhas = (_converter(linha) for linha in csv.DictReader(arquivo))
+        else:
+            linhas = (json.loads(linha) for linha in arquivo if linha.strip())
+        bloco = []
+        for leitura in linhas:
+            bloco.append(leitura)
+            if len(bloco) >= tamanho_bloco:
+                yield bloco
+                bloco = []
+        if bloco:
+            yield bloco
+
+
+def importar_arquivo(service, caminho, tamanho_lote=5000):
+    """
+    Validar e gravar as leituras de um arquivo em lotes
+
+    Returns:
+        dict: Contagem de leituras gravadas, rejeitadas e com falha de escrita
+    """
+    resultado = {'gravadas': 0, 'rejeitadas': 0, 'falhas': 0}
+    for bloco in ler_blocos(caminho, tamanho_lote):
+        validas, erros = validar_lote(bloco, [])
+        resultado['rejeitadas'] += len(erros)
+        if not validas:
+            continue
+        if service.salvar_leituras(validas):
+            resultado['gravadas'] += len(validas)
+        else:
+            resultado['falhas'] += len(validas)
+    return resultado
+
+
+def listar_arquivos(caminhos):
+    """Expandir diretórios nos arquivos exportados que eles contêm, em ordem"""
+    arquivos = []
+    for caminho in caminhos:
+        if os.path.isdir(caminho):
+            arquivos.extend(
+                os.path.join(caminho, nome) for nome in sorted(os.listdir(caminho))
+                if nome.rsplit('.', 1)[-1].lower() in FORMATOS + ('jsonl',)
+            )
+        else:
+            arquivos.append(caminho)
+    return arquivos
+
+
+def importar(service, caminhos, tamanho_lote=5000, paralelo=4):
+    """
+    Importar arquivos exportados (ou diretórios com eles) para o bucket
+
+    Args:
+        service: InfluxDBService conectado ao bucket de destino
+        caminhos: Lista de arquivos e/ou diretórios
+        tamanho_lote: Leituras por escrita no InfluxDB
+        paralelo: Número de arquivos importados ao mesmo tempo
+
+    Returns:
+        dict: Totais de leituras gravadas, rejeitadas e com falha de escrita
+    """
+    arquivos = listar_arquivos(caminhos)
+    totais = {'gravadas': 0, 'rejeitadas': 0, 'falhas': 0}
+    with ThreadPoolExecutor(max_workers=paralelo, thread_name_prefix='importar') as executor:
+        resultados = executor.map(lambda caminho: importar_arquivo(service, caminho, tamanho_lote),
+                                  arquivos)
+        for caminho, resultado in zip(arquivos, resultados):
+            print(f"📥 {caminho}: {resultado['gravadas']} gravadas, "
+                  f"{resultado['rejeitadas']} rejeitadas, {resultado['falhas']} com falha")
+            for chave in totais:
+                totais[chave] += resultado[chave]
+    return totais
+
+
+def _data(valor):
+    """Converter argumento ISO 8601 em datetime UTC (sem fuso = UTC)"""
+    momento = datetime.fromisoformat(valor.replace('Z', '+00:00'))
+    if momento.tzinfo is None:
+        momento = momento.replace(tzinfo=timezone.utc)
+    return momento.astimezone(timezone.utc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Exportação e importação de leituras históricas')
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    exportacao = subparsers.add_parser('exportar', help='Exportar leituras do bucket para arquivos')
+    exportacao.add_argument('--destino', default='exportacao', help='Diretório dos arquivos')
+    exportacao.add_argument('--formato', choices=FORMATOS, default='ndjson')
+    exportacao.add_argument('--hours', type=int, default=24,
+                            help='Período exportado, até agora (ignorado com --inicio)')
+    exportacao.add_argument('--inicio', type=_data, help='Início do período (ISO 8601)')
+    exportacao.add_argument('--fim', type=_data, help='Fim do período (ISO 8601, padrão: agora)')
+    exportacao.add_argument('--horas-por-fatia', type=int, default=24,
+                            help='Duração de cada fatia consultada')
+    exportacao.add_argument('--paralelo', type=int, default=4, help='Fatias consultadas ao mesmo tempo')
+    exportacao.add_argument('--robo', help='Exportar apenas este robô')
+
+    importacao = subparsers.add_parser('importar', help='Gravar arquivos exportados no bucket')
+    importacao.add_argument('caminhos', nargs='+', help='Arquivos ou diretórios')
+    importacao.add_argument('--lote', type=int, default=5000, help='Leituras por escrita')
+    importacao.add_argument('--paralelo', type=int, default=4, help='Arquivos importados ao mesmo tempo')
+    args = parser.parse_args()
+
+    if getattr(args, 'robo', None) is not None and not robo_id_valido(args.robo):
+        parser.error('--robo inválido')
+    if getattr(args, 'formato', None) == 'parquet' and pyarrow is None:
+        parser.error('formato parquet requer o pacote pyarrow')
+
+    from dotenv import load_dotenv
+    from influxdb_service import InfluxDBService
+
+    load_dotenv()
+    service = InfluxDBService(
+        url=os.getenv('INFLUXDB_URL'),
+        token=os.getenv('INFLUXDB_TOKEN'),
+        org=os.getenv('INFLUXDB_ORG'),
+        bucket=os.getenv('INFLUXDB_BUCKET')
+    )
+    inicio_execucao = time.perf_counter()
+    try:
+        if args.comando == 'exportar':
+            fim = args.fim or datetime.now(timezone.utc)
+            inicio = args.inicio or fim - timedelta(hours=args.hours)
+            total = exportar(service, inicio, fim, args.destino, args.formato,
+                             args.horas_por_fatia, args.paralelo, args.robo)
+            print(f"✅ {total} leituras exportadas em {time.perf_counter() - inicio_execucao:.1f}s")
+        else:
+            totais = importar(service, args.caminhos, args.lote, args.paralelo)
+            print(f"✅ {totais['gravadas']} leituras importadas em "
+                  f"{time.perf_counter() - inicio_execucao:.1f}s "
+                  f"({totais['rejeitadas']} rejeitadas, {totais['falhas']} com falha)")
+    finally:
+        service.fechar()
+
+
+if __name__ == '__main__':
+    main()
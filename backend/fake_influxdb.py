@@ -0,0 +1,112 @@
+"""
+InfluxDB falso para testes de carga offline
+Aceita escritas (line protocol) e queries na API v2 sem armazenar nada,
+com latência artificial opcional para simular o InfluxDB Cloud
+
+Uso:
+    python fake_influxdb.py --porta 8086 --latencia-ms 50
+"""
+
+import argparse
+import gzip
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class ServidorInfluxFalso:
+    """Servidor HTTP que imita os endpoints do InfluxDB usados pelo backend"""
+
+    def __init__(self, host='127.0.0.1', porta=0, latencia_ms=0):
+        """
+        Criar servidor (porta 0 escolhe uma porta livre)
+
+        Args:
+            host: Endereço de escuta
+            porta: Porta de escuta
+            latencia_ms: Atraso aplicado a cada requisição
+        """
+        self.latencia = latencia_ms / 1000.0
+        self.escritas = 0
+        self.linhas = 0
+        self.queries = 0
+        self._lock = threading.Lock()
+
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _responder(self, status, corpo=b'', tipo='application/json'):
+                self.send_response(status)
+                self.send_header('Content-Type', tipo)
+                self.send_header('Content-Length', str(len(corpo)))
+                self.end_headers()
+                if corpo:
+                    self.wfile.write(corpo)
+
+            def do_POST(self):
+                corpo = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if self.headers.get('Content-Encoding') == 'gzip':
+                    corpo = gzip.decompress(corpo)
+                if servidor.latencia:
+                    time.sleep(servidor.latencia)
+                if self.path.startswith('/api/v2/write'):
+                    with servidor._lock:
+                        servidor.escritas += 1
+                        servidor.linhas += corpo.count(b'\n') + 1
+                    self._responder(204)
+                elif self.path.startswith('/api/v2/query'):
+                    with servidor._lock:
+                        servidor.queries += 1
+                    # Resultado vazio em CSV anotado
+                    self._responder(200, tipo='text/csv; charset=utf-8')
+                else:
+                    self._responder(404, b'{"message": "not found"}')
+
+            def do_GET(self):
+                if self.path.startswith(('/ping', '/health')):
+                    self._responder(200, b'{"status": "pass"}')
+                else:
+                    self._responder(404, b'{"message": "not found"}')
+
+        self._http = ThreadingHTTPServer((host, porta), Handler)
+        self._http.daemon_threads = True
+        self.host, self.porta = self._http.server_address[:2]
+        self._thread = None
+
+    @property
+    def url(self):
+        """URL base para configurar INFLUXDB_URL"""
+        return f'http://{self.host}:{self.porta}'
+
+    def iniciar(self):
+        """Iniciar o servidor em uma thread em segundo plano"""
+        self._thread = threading.Thread(target=self._http.serve_forever,
+                                        name='influx-falso', daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        """Parar o servidor"""
+        self._http.shutdown()
+        self._http.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='InfluxDB falso para testes offline')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8086)
+    parser.add_argument('--latencia-ms', type=int, default=0)
+    args = parser.parse_args()
+
+    servidor = ServidorInfluxFalso(args.host, args.porta, args.latencia_ms)
+    print(f"🧪 InfluxDB falso em {servidor.url} (latência: {args.latencia_ms} ms)")
+    try:
+        servidor._http.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n📊 Escritas: {servidor.escritas} | Linhas: {servidor.linhas} | "
+              f"Queries: {servidor.queries}")
@@ -0,0 +1,225 @@
+"""
+Fila de escrita em lote para o InfluxDB
+Acumula points em memória e envia em lotes, por tamanho ou por tempo
+"""
+
+import queue
+import random
+import threading
+import time
+
+
+# Colocado na fila por fechar() para acordar a thread que aguarda o intervalo
+_ACORDAR = object()
+
+
+# Status com que o banco recusa o conteúdo do lote (ex: linha malformada,
+# timestamp fora do intervalo): repetir o mesmo lote não adianta
+STATUS_PERMANENTES = (400, 413, 422)
+
+
+class FilaCheiaError(Exception):
+    """Erro lançado quando a fila de escrita atingiu a capacidade máxima"""
+
+
+def erro_permanente(erro):
+    """
+    Verificar se uma falha de escrita foi causada pelo conteúdo do lote
+
+    Erros 5xx, timeouts e falhas de conexão são transitórios. 401/403 também
+    são repetidos: são de configuração e não justificam descartar leituras.
+    """
+    return getattr(erro, 'status', None) in STATUS_PERMANENTES
+
+
+def escrever_isolando(escrever, registros):
+    """
+    Gravar registros; se o banco recusar o lote, dividi-lo ao meio até isolar
+    os registros recusados (os demais são gravados normalmente)
+
+    Uma linha inválida em um lote de N custa cerca de 2·log2(N) escritas.
+
+    Args:
+        escrever: Função que grava uma lista de registros
+        registros: Lista de registros
+
+    Returns:
+        list: (registro, erro) de cada registro recusado pelo banco
+
+    Raises:
+        Exception: Erros transitórios (o lote inteiro deve ser repetido)
+    """
+    try:
+        escrever(registros)
+        return []
+    except Exception as e:
+        if not erro_permanente(e):
+            raise
+        if len(registros) == 1:
+            return [(registros[0], e)]
+    meio = len(registros) // 2
+    return escrever_isolando(escrever, registros[:meio]) + escrever_isolando(escrever, registros[meio:])
+
+
+class FilaEscrita:
+    """Fila limitada com thread de envio em lotes e retentativas com jitter"""
+
+    def __init__(self, escrever, tamanho_lote=500, intervalo_ms=1000, capacidade=10000,
+                 timeout_enfileirar_ms=100, max_tentativas=5, intervalo_retry_ms=1000,
+                 jitter_ms=500):
+        """
+        Inicializar fila e thread de envio
+
+        Args:
+            escrever: Função que recebe uma lista de registros e grava no banco
+                      (deve lançar exceção em caso de falha)
+            tamanho_lote: Número de registros que dispara um envio imediato
+            intervalo_ms: Tempo máximo que um registro espera antes de ser enviado
+            capacidade: Número máximo de registros aguardando envio
+            timeout_enfileirar_ms: Tempo que o produtor espera quando a fila está cheia
+            max_tentativas: Tentativas de envio de um lote (falhas transitórias)
+                            antes de descartá-lo
+            intervalo_retry_ms: Intervalo base entre tentativas (cresce exponencialmente)
+            jitter_ms: Atraso aleatório máximo somado a cada espera de retentativa
+        """
+        self.escrever = escrever
+        self.tamanho_lote = max(1, int(tamanho_lote))
+        self.intervalo = intervalo_ms / 1000.0
+        self.timeout_enfileirar = timeout_enfileirar_ms / 1000.0
+        self.max_tentativas = max(1, int(max_tentativas))
+        self.intervalo_retry = intervalo_retry_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+
+        self._fila = queue.Queue(maxsize=max(1, int(capacidade)))
+        self._parar = threading.Event()
+
+        # Contadores de operação
+        self.enviados = 0
+        self.descartados = 0
+        self.falhas = 0
+        # Registros recusados pelo banco (4xx), descartados sem repetir
+        self.rejeitados = 0
+
+        self._thread = threading.Thread(target=self._executar, name='fila-escrita', daemon=True)
+        self._thread.start()
+
+    def enfileirar(self, registro):
+        """
+        Adicionar registro à fila de envio
+
+        Args:
+            registro: Point (ou linha de protocolo) a ser gravado
+
+        Raises:
+            FilaCheiaError: Se a fila continuar cheia após o tempo de espera
+        """
+        if self._parar.is_set():
+            raise FilaCheiaError('Fila de escrita encerrada')
+        try:
+            self._fila.put(registro, timeout=self.timeout_enfileirar)
+        except queue.Full:
+            raise FilaCheiaError(
+                f'Fila de escrita cheia ({self._fila.maxsize} registros pendentes)'
+            )
+        return True
+
+    def profundidade(self):
+        """Número de registros aguardando envio"""
+        return self._fila.qsize()
+
+    def capacidade(self):
+        """Número máximo de registros aceitos na fila"""
+        return self._fila.maxsize
+
+    def _coletar_lote(self):
+        """Aguardar até formar um lote completo ou até o intervalo expirar"""
+        lote = []
+        prazo = None
+        while len(lote) < self.tamanho_lote:
+            if prazo is None:
+                espera = self.intervalo
+            else:
+                espera = prazo - time.monotonic()
+                if espera <= 0:
+                    break
+            try:
+                registro = self._fila.get(timeout=espera)
+            except queue.Empty:
+                if prazo is not None or self._parar.is_set():
+                    break
+                continue
+            if registro is _ACORDAR:
+                break
+            lote.append(registro)
+            if prazo is None:
+                prazo = time.monotonic() + self.intervalo
+        return lote
+
+    def _enviar(self, lote):
+        """
+        Enviar lote com retentativas e backoff exponencial com jitter
+
+        Só falhas transitórias são repetidas. Se o banco recusar o conteúdo
+        (4xx), o lote é dividido e apenas os registros recusados são descartados.
+        """
+        for tentativa in range(self.max_tentativas):
+            try:
+                recusados = escrever_isolando(self.escrever, lote)
+                if recusados:
+                    self.rejeitados += len(recusados)
+                    print(f"Lote com {len(recusados)} de {len(lote)} registros recusados pelo "
+                          f"banco (descartados): {recusados[0][1]}")
+                self.enviados += len(lote) - len(recusados)
+                return True
+            except Exception as e:
+                self.falhas += 1
+                print(f"Erro ao enviar lote ({len(lote)} registros, "
+                      f"tentativa {tentativa + 1}/{self.max_tentativas}): {e}")
+                if tentativa + 1 < self.max_tentativas:
+                    espera = self.intervalo_retry * (2 ** tentativa) + random.uniform(0, self.jitter)
+                    # Durante o encerramento, limitar a espera ao intervalo base
+                    if self._parar.is_set():
+                        espera = min(espera, self.intervalo_retry)
+                    time.sleep(espera)
+
+        self.descartados += len(lote)
+        print(f"Lote descartado após {self.max_tentativas} tentativas: {len(lote)} registros")
+        return False
+
+    def _executar(self):
+        """Loop da thread de envio"""
+        while not self._parar.is_set():
+            lote = self._coletar_lote()
+            if lote:
+                self._enviar(lote)
+
+        # Encerramento: esvaziar o que restou na fila
+        while True:
+            lote = []
+            try:
+                while len(lote) < self.tamanho_lote:
+                    registro = self._fila.get_nowait()
+                    if registro is not _ACORDAR:
+                        lote.append(registro)
+            except queue.Empty:
+                pass
+            if not lote:
+                break
+            self._enviar(lote)
+
+    def fechar(self, timeout=30):
+        """
+        Encerrar a fila enviando todos os registros pendentes
+
+        Args:
+            timeout: Tempo máximo (segundos) para aguardar o envio final
+        """
+        if self._parar.is_set():
+            return
+        self._parar.set()
+        try:
+            self._fila.put_nowait(_ACORDAR)
+        except queue.Full:
+            # Fila cheia: a thread está enviando e verá _parar em seguida
+            pass
+        self._thread.join(timeout=timeout)
@@ -0,0 +1,174 @@
+"""
+Formatos binários de ingestão, escolhidos pelo Content-Type
+
+- MessagePack (application/msgpack): mesmo formato do JSON, com o
+  timestamp opcional em epoch (milissegundos, inteiro)
+- Quadro compacto (application/vnd.robo.quadro): várias amostras de
+  tamanho fixo em um único corpo, para o firmware do ESP32
+
+Layout do quadro (little-endian):
+    cabeçalho  '<2sBBHq'  magia b'RB', versão, flags, quantidade, base_ms
+    [robo_id]  '<B' + bytes UTF-8, se flags & FLAG_ROBO_ID
+    amostras   '<IffHBf'  idade_ms, temperatura_c, umidade_pct,
+                          luminosidade, presenca, probabilidade_vida
+
+O timestamp de cada amostra é base_ms - idade_ms. Com base_ms = 0 (robô
+sem relógio sincronizado), a base é o horário de recebimento.
+"""
+
+import struct
+import time
+
+try:
+    import msgpack
+except ImportError:  # dependência opcional
+    msgpack = None
+
+
+TIPOS_MSGPACK = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+TIPO_QUADRO = 'application/vnd.robo.quadro'
+
+MAGIA_QUADRO = b'RB'
+VERSAO_QUADRO = 1
+FLAG_ROBO_ID = 0x01
+
+CABECALHO_QUADRO = struct.Struct('<2sBBHq')
+AMOSTRA_QUADRO = struct.Struct('<IffHBf')
+
+# Os floats do quadro são de 32 bits: arredondar para não gravar ruído
+CASAS_DECIMAIS = 3
+
+
+class FormatoNaoSuportadoError(Exception):
+    """Content-Type binário reconhecido, mas sem suporte neste servidor"""
+
+
+def formato_binario(mimetype):
+    """Verificar se o Content-Type corresponde a um formato binário"""
+    return mimetype in TIPOS_MSGPACK or mimetype == TIPO_QUADRO
+
+
+def ler_binario(corpo, mimetype):
+    """
+    Decodificar o corpo de uma requisição em formato binário
+
+    Args:
+        corpo: Corpo da requisição (bytes)
+        mimetype: Content-Type sem parâmetros
+
+    Returns:
+        list: Leituras decodificadas (dicionários no formato do JSON)
+
+    Raises:
+        ValueError: Se o corpo não puder ser decodificado
+        FormatoNaoSuportadoError: Se o pacote msgpack não estiver instalado
+    """
+    if mimetype == TIPO_QUADRO:
+        return ler_quadro(corpo)
+    return ler_msgpack(corpo)
+
+
+def ler_msgpack(corpo):
+    """
+    Decodificar uma leitura (mapa) ou várias (array de mapas) em MessagePack
+
+    Returns:
+        list: Leituras decodificadas (itens que não são mapas são mantidos
+              para que a validação os reporte por índice)
+    """
+    if msgpack is None:
+        raise FormatoNaoSuportadoError('Suporte a MessagePack requer o pacote msgpack')
+    try:
+        conteudo = msgpack.unpackb(corpo, raw=False, strict_map_key=True)
+    except Exception as e:
+        raise ValueError(f'MessagePack inválido: {e or type(e).__name__}')
+
+    leituras = conteudo if isinstance(conteudo, list) else [conteudo]
+    for dados in leituras:
+        # Extensão de timestamp do MessagePack -> epoch em milissegundos
+        if isinstance(dados, dict) and isinstance(dados.get('timestamp'), msgpack.Timestamp):
+            dados['timestamp'] = dados['timestamp'].to_unix_nano() // 1_000_000
+    return leituras
+
+
+def ler_quadro(corpo):
+    """
+    Decodificar um quadro compacto com uma ou mais amostras
+
+    Returns:
+        list: Leituras com timestamp em epoch (milissegundos)
+    """
+    if len(corpo) < CABECALHO_QUADRO.size:
+        raise ValueError('Quadro menor que o cabeçalho')
+    magia, versao, flags, quantidade, base_ms = CABECALHO_QUADRO.unpack_from(corpo)
+    if magia != MAGIA_QUADRO:
+        raise ValueError('Quadro sem a assinatura RB')
+    if versao != VERSAO_QUADRO:
+        raise ValueError(f'Versão de quadro não suportada: {versao}')
+
+    posicao = CABECALHO_QUADRO.size
+    robo_id = None
+    if flags & FLAG_ROBO_ID:
+        if len(corpo) <= posicao:
+            raise ValueError('Quadro truncado no robo_id')
+        tamanho = corpo[posicao]
+        robo_id = bytes(corpo[posicao + 1:posicao + 1 + tamanho]).decode('utf-8', 'replace')
+        posicao += 1 + tamanho
+
+    if len(corpo) - posicao != quantidade * AMOSTRA_QUADRO.size:
+        raise ValueError(
+            f'Quadro com {len(corpo) - posicao} bytes de amostras, '
+            f'esperado {quantidade} x {AMOSTRA_QUADRO.size}'
+        )
+    if base_ms == 0:
+        base_ms = time.time_ns() // 1_000_000
+
+    leituras = []
+    for idade_ms, temperatura, umidade, luz, presenca, probabilidade in \
+            AMOSTRA_QUADRO.iter_unpack(memoryview(corpo)[posicao:]):
+        dados = {
+            'timestamp': base_ms - idade_ms,
+            'temperatura_c': round(temperatura, CASAS_DECIMAIS),
+            'umidade_pct': round(umidade, CASAS_DECIMAIS),
+            'luminosidade': luz,
+            'presenca': presenca,
+            'probabilidade_vida': round(probabilidade, CASAS_DECIMAIS)
+        }
+        if robo_id is not None:
+            dados['robo_id'] = robo_id
+        leituras.append(dados)
+    return leituras
+
+
+def montar_quadro(leituras, base_ms=0, robo_id=None):
+    """
+    Montar um quadro compacto (usado pelo simulador e nos testes de carga)
+
+    Args:
+        leituras: Lista de leituras; 'idade_ms' (opcional) é a idade da
+                  amostra em relação a base_ms
+        base_ms: Epoch em milissegundos (0 = horário de recebimento)
+        robo_id: Identificador do robô incluído no quadro (opcional)
+
+    Returns:
+        bytes: Quadro pronto para envio
+    """
+    flags = 0
+    partes = []
+    if robo_id is not None:
+        flags |= FLAG_ROBO_ID
+        robo = robo_id.encode('utf-8')
+        partes.append(bytes([len(robo)]) + robo)
+    partes.extend(
+        AMOSTRA_QUADRO.pack(
+            int(dados.get('idade_ms', 0)),
+            dados['temperatura_c'],
+            dados['umidade_pct'],
+            int(dados['luminosidade']),
+            int(dados['presenca']),
+            dados['probabilidade_vida']
+        )
+        for dados in leituras
+    )
+    cabecalho = CABECALHO_QUADRO.pack(MAGIA_QUADRO, VERSAO_QUADRO, flags, len(leituras), base_ms)
+    return cabecalho + b''.join(partes)
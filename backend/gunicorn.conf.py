@@ -0,0 +1,70 @@
+"""
+Configuração do Gunicorn para a API Flask (app.py)
+
+Uso:
+    gunicorn -c gunicorn.conf.py app:app
+
+Cada worker importa o app.py depois do fork (preload_app desligado) e cria
+o próprio InfluxDBClient, pool de conexões e threads de escrita, sem
+compartilhar sockets entre processos. No encerramento, worker_exit para as
+threads e envia as escritas pendentes antes de o worker sair.
+
+Por isso, todo estado em memória também é de cada worker. Com mais de um
+worker (PROCESSOS_API, repassado ao app.py), os componentes que só enxergam
+as leituras do próprio processo ficam desligados por padrão; veja o README.
+"""
+
+import os
+import sys
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+workers = int(os.getenv('GUNICORN_WORKERS', 4))
+
+# Threads por worker: consultas lentas não bloqueiam o processo. Cada stream
+# SSE aberto ocupa uma thread enquanto durar
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+
+# Número de processos que atendem a API, lido pelo app.py
+os.environ.setdefault('PROCESSOS_API', str(workers))
+
+# Streams SSE limitados a metade das threads, para sobrar thread para a ingestão
+os.environ.setdefault('EVENTOS_MAX_ASSINANTES', str(max(1, threads // 2)))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT_S', 60))
+# Tempo para esvaziar a fila/spool de escrita antes do SIGKILL
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT_S', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE_S', 5))
+
+# O app.py abre conexões e inicia threads na importação: carregar só depois do fork
+preload_app = False
+
+# Uma conexão por thread, mais as queries paralelas do serviço. Com um pool menor,
+# conexões excedentes são abertas e descartadas a cada requisição
+os.environ.setdefault('INFLUXDB_POOL_CONEXOES', str(threads + 4))
+
+
+def _modulo_app():
+    """Módulo do app.py já importado neste processo (None se ainda não foi)"""
+    modulo = sys.modules.get('app')
+    return modulo if hasattr(modulo, 'encerrar') else None
+
+
+def post_fork(server, worker):
+    """Avisar se o app foi carregado no master (ex: --preload), pois o cliente seria herdado"""
+    if _modulo_app() is not None:
+        server.log.warning('app.py carregado antes do fork: o worker %s herdou o cliente '
+                           'InfluxDB e as threads do master; não use --preload', worker.pid)
+
+
+def post_worker_init(worker):
+    """Registrar a inicialização do cliente deste worker"""
+    worker.log.info('Worker %s: cliente InfluxDB próprio inicializado', worker.pid)
+
+
+def worker_exit(server, worker):
+    """Parar as threads e enviar as escritas pendentes antes de o worker sair"""
+    modulo = _modulo_app()
+    if modulo is not None:
+        modulo.encerrar()
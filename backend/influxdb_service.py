@@ -3,15 +3,388 @@ Serviço para integração com InfluxDB Cloud
 Responsável por salvar e consultar dados dos sensores
 """
 
-from influxdb_client import InfluxDBClient, Point, WritePrecision
+from influxdb_client import InfluxDBClient, Point
 from influxdb_client.client.write_api import SYNCHRONOUS
-from datetime import datetime, timedelta
+from urllib3.connection import HTTPConnection
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta, timezone
+from fila_escrita import FilaEscrita, FilaCheiaError
+from spool import SpoolEscrita
+from armazenamento import ServicoArmazenamento
+from metricas import ERROS_BANCO, ETAPAS, medir_operacao
+from validacao import timestamp_leitura_ns
 
 
-class InfluxDBService:
+# Robô atribuído (tag "robo") às leituras enviadas sem robo_id
+ROBO_PADRAO = "explorador_espacial"
+
+# Campos numéricos considerados nas estatísticas
+CAMPOS_ESTATISTICAS = ['temperatura_c', 'umidade_pct', 'luminosidade', 'probabilidade_vida']
+
+# Campos agregados no modo de resolução reduzida (GET /leituras?pontos=N)
+CAMPOS_AGREGADOS = ['temperatura_c', 'umidade_pct', 'luminosidade', 'presenca', 'probabilidade_vida']
+
+# Campos opcionais gravados pela pontuação no servidor (pontuacao.py) e seu tipo
+CAMPOS_PONTUACAO = [
+    ('probabilidade_calculada', float),
+    ('anomalia_temperatura_c', int),
+    ('anomalia_umidade_pct', int),
+    ('anomalia_luminosidade', int)
+]
+
+# Percentis opcionais (nome na resposta, quantil)
+PERCENTIS = [('p50', 0.5), ('p95', 0.95), ('p99', 0.99)]
+
+
+def formatar_estatisticas(valores, percentis=False):
+    """
+    Arredondar as estatísticas de um campo no formato da API
+    
+    Args:
+        valores: Dicionário estatística -> valor bruto
+        percentis: Se True, inclui p50, p95 e p99
+        
+    Returns:
+        dict: Estatísticas arredondadas (0 quando ausentes)
+    """
+    def arredondar(nome):
+        valor = valores.get(nome)
+        return round(valor, 2) if valor else 0
+    
+    stats = {
+        'media': arredondar('media'),
+        'minimo': arredondar('minimo'),
+        'maximo': arredondar('maximo'),
+        'contagem': int(valores.get('contagem') or 0),
+        'desvio_padrao': arredondar('desvio_padrao')
+    }
+    if percentis:
+        for nome, _ in PERCENTIS:
+            stats[nome] = arredondar(nome)
+    return stats
+
+
+def formatar_rfc3339(momento):
+    """
+    Formatar datetime como literal de tempo RFC3339 (UTC) aceito pelo Flux
+    
+    Args:
+        momento: datetime (sem fuso horário é tratado como UTC)
+        
+    Returns:
+        str: Ex: 2025-09-02T14:35:00.000000Z
+    """
+    if momento.tzinfo is None:
+        momento = momento.replace(tzinfo=timezone.utc)
+    return momento.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+# Estatísticas calculadas no Flux: (nome na resposta, função aplicada)
+ESTATISTICAS_BASICAS = [
+    ('media', 'mean()'),
+    ('minimo', 'min()'),
+    ('maximo', 'max()'),
+    ('contagem', 'count() |> toFloat()'),
+    ('desvio_padrao', 'stddev()')
+]
+ESTATISTICAS_PERCENTIS = [
+    (nome, f'quantile(q: {q}, method: "estimate_tdigest")')
+    for nome, q in PERCENTIS
+]
+
+
+def filtro_robo(robo):
+    """
+    Montar o filtro Flux pela tag do robô (vazio para todos os robôs)
+    
+    O identificador deve ter sido validado com validacao.robo_id_valido.
+    """
+    if robo is None:
+        return ''
+    return f'\n        |> filter(fn: (r) => r["robo"] == "{robo}")'
+
+
+def query_leituras(bucket, limit, hours, antes=None, robo=None):
+    """
+    Montar a query Flux das últimas leituras (pivotadas, mais recentes primeiro)
+    
+    Args:
+        bucket: Nome do bucket
+        limit: Número máximo de leituras
+        hours: Janela em horas
+        antes: Cursor (datetime) usado como fim da janela
+        robo: Filtrar por robô (None = todos)
+        
+    Returns:
+        str: Query Flux
+    """
+    stop = ''
+    if antes is not None:
+        stop = f', stop: {formatar_rfc3339(antes)}'
+    
+    # As séries de cada robô são unidas antes de ordenar e limitar
+    return f'''
+    from(bucket: "{bucket}")
+        |> range(start: -{hours}h{stop})
+        |> filter(fn: (r) => r["_measurement"] == "leitura_sensores"){filtro_robo(robo)}
+        |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
+        |> group()
+        |> sort(columns: ["_time"], desc: true)
+        |> limit(n: {limit})
+    '''
+
+
+def query_ultimas_por_robo(bucket, hours):
+    """
+    Montar a query Flux da última leitura de cada robô (uma linha por robô)
+    
+    last() é aplicado por campo: um campo que não veio no último ponto (ex:
+    os da pontuação, desligada depois) traz o valor de um instante anterior
+    e o pivot gera mais de uma linha para o robô. Fica só a mais recente.
+    
+    Args:
+        bucket: Nome do bucket
+        hours: Janela em horas
+        
+    Returns:
+        str: Query Flux
+    """
+    return f'''
+    from(bucket: "{bucket}")
+        |> range(start: -{hours}h)
+        |> filter(fn: (r) => r["_measurement"] == "leitura_sensores")
+        |> last()
+        |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
+        |> sort(columns: ["_time"])
+        |> last(column: "_time")
+        |> group()
+    '''
+
+
+def query_leituras_agregadas(bucket, hours, intervalo_s, extremos=False, robo=None):
+    """
+    Montar a query Flux das leituras agregadas em janelas de tempo
+    
+    Os robôs são combinados em uma única série por campo, e cada janela
+    é identificada pelo seu instante inicial.
+    
+    Args:
+        bucket: Nome do bucket
+        hours: Janela em horas
+        intervalo_s: Duração de cada janela em segundos
+        extremos: Se True, inclui também mínimo e máximo de cada janela
+        robo: Filtrar por robô (None = todos)
+        
+    Returns:
+        str: Query Flux
+    """
+    funcoes = [('media', 'mean')] + ([('min', 'min'), ('max', 'max')] if extremos else [])
+    tabelas = ',\n        '.join(
+        f'dados |> aggregateWindow(every: {intervalo_s}s, fn: {funcao}, createEmpty: false, '
+        f'timeSrc: "_start") |> set(key: "estatistica", value: "{nome}")'
+        for nome, funcao in funcoes
+    )
+    conjunto = ', '.join(f'"{campo}"' for campo in CAMPOS_AGREGADOS)
+    
+    return f'''
+    dados = from(bucket: "{bucket}")
+        |> range(start: -{hours}h)
+        |> filter(fn: (r) => r["_measurement"] == "leitura_sensores"){filtro_robo(robo)}
+        |> filter(fn: (r) => contains(value: r["_field"], set: [{conjunto}]))
+        |> toFloat()
+        |> group(columns: ["_field"])
+    
+    union(tables: [
+        {tabelas}
+    ])
+        |> pivot(rowKey: ["_time"], columnKey: ["_field", "estatistica"], valueColumn: "_value")
+        |> group()
+        |> sort(columns: ["_time"])
+    '''
+
+
+def formatar_leitura_agregada(valores, momento, extremos=False):
+    """
+    Montar uma janela agregada no formato da API
+    
+    Args:
+        valores: Dicionário '<campo>_<estatística>' -> valor
+        momento: datetime de início da janela
+        extremos: Se True, inclui '<campo>_min' e '<campo>_max'
+        
+    Returns:
+        dict: Leitura com a média de cada campo (e extremos, se pedidos)
+    """
+    leitura = {'timestamp': momento.isoformat()}
+    for campo in CAMPOS_AGREGADOS:
+        leitura[campo] = valores.get(f'{campo}_media')
+        if extremos:
+            leitura[f'{campo}_min'] = valores.get(f'{campo}_min')
+            leitura[f'{campo}_max'] = valores.get(f'{campo}_max')
+    return leitura
+
+
+def query_estatisticas(bucket, hours, estatisticas, robo=None, por_robo=False):
+    """
+    Montar uma query Flux que calcula várias estatísticas de todos os campos
+    
+    Cada estatística gera uma tabela por _field (e por robô, se pedido),
+    e todas são unidas em uma única resposta.
+    
+    Args:
+        bucket: Nome do bucket
+        hours: Janela em horas
+        estatisticas: Lista de (nome, função Flux)
+        robo: Filtrar por robô (None = todos)
+        por_robo: Se True, calcula as estatísticas separadamente para cada robô
+        
+    Returns:
+        str: Query Flux
+    """
+    tabelas = ',\n        '.join(
+        f'dados |> {funcao} |> set(key: "estatistica", value: "{nome}")'
+        for nome, funcao in estatisticas
+    )
+    conjunto = ', '.join(f'"{campo}"' for campo in CAMPOS_ESTATISTICAS)
+    colunas = '"robo", "_field"' if por_robo else '"_field"'
+    
+    return f'''
+    dados = from(bucket: "{bucket}")
+        |> range(start: -{hours}h)
+        |> filter(fn: (r) => r["_measurement"] == "leitura_sensores"){filtro_robo(robo)}
+        |> filter(fn: (r) => contains(value: r["_field"], set: [{conjunto}]))
+        |> toFloat()
+        |> group(columns: [{colunas}])
+    
+    union(tables: [
+        {tabelas}
+    ])
+        |> keep(columns: [{colunas}, "estatistica", "_value"])
+    '''
+
+
+def agrupar_estatisticas(records, valores=None):
+    """
+    Agrupar registros de query_estatisticas por campo
+    
+    Args:
+        records: Iterável de FluxRecord
+        valores: Dicionário a ser completado (opcional)
+        
+    Returns:
+        dict: campo -> {estatística: valor bruto}
+    """
+    if valores is None:
+        valores = {campo: {} for campo in CAMPOS_ESTATISTICAS}
+    for record in records:
+        campo = record.values.get('_field')
+        if campo in valores:
+            valores[campo][record.values.get('estatistica')] = record.get_value()
+    return valores
+
+
+def linha_leitura(dados):
+    """
+    Converter uma leitura validada diretamente em line protocol
+    
+    Equivale a Point(...).to_line_protocol(), sem montar o Point.
+    O robo_id já passou por validacao.robo_id_valido (não tem caracteres
+    que precisem de escape) e o timestamp vai em nanossegundos, já
+    convertido por validar_leitura.
+    
+    Args:
+        dados: Dicionário com os dados de uma leitura validada
+        
+    Returns:
+        str: Linha pronta para ser gravada (precisão NS)
+    """
+    linha = (
+        f"leitura_sensores,robo={dados.get('robo_id', ROBO_PADRAO)} "
+        f"temperatura_c={float(dados['temperatura_c'])!r},"
+        f"umidade_pct={float(dados['umidade_pct'])!r},"
+        f"luminosidade={int(dados['luminosidade'])}i,"
+        f"presenca={int(dados['presenca'])}i,"
+        f"probabilidade_vida={float(dados['probabilidade_vida'])!r}"
+    )
+    for campo, tipo in CAMPOS_PONTUACAO:
+        if campo in dados:
+            if tipo is float:
+                linha += f',{campo}={float(dados[campo])!r}'
+            else:
+                linha += f',{campo}={int(dados[campo])}i'
+    if 'timestamp' in dados:
+        linha += f" {timestamp_leitura_ns(dados)}"
+    return linha
+
+
+def formatar_leitura(record):
+    """Converter um registro pivotado do Flux em dicionário de leitura"""
+    return {
+        'timestamp': record.get_time().isoformat(),
+        'robo_id': record.values.get('robo', ROBO_PADRAO),
+        'temperatura_c': record.values.get('temperatura_c', 0),
+        'umidade_pct': record.values.get('umidade_pct', 0),
+        'luminosidade': record.values.get('luminosidade', 0),
+        'presenca': record.values.get('presenca', 0),
+        'probabilidade_vida': record.values.get('probabilidade_vida', 0)
+    }
+
+
+def opcoes_keepalive(ocioso_s):
+    """
+    Opções de socket com TCP keep-alive (sondas após ocioso_s segundos sem tráfego)
+    
+    Detecta conexões do pool derrubadas por NAT ou balanceadores
+    antes que uma requisição seja enviada por elas.
+    """
+    opcoes = list(HTTPConnection.default_socket_options)
+    opcoes.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    if hasattr(socket, 'TCP_KEEPIDLE'):
+        opcoes.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, ocioso_s))
+        opcoes.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(1, ocioso_s // 3)))
+        opcoes.append((socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3))
+    return opcoes
+
+
+def abrir_cliente(url, token, org, timeout_ms=10000, timeout_conexao_ms=None, gzip=False,
+                  conexoes=None, keepalive_s=None):
+    """
+    Criar o InfluxDBClient com o transporte HTTP ajustado
+    
+    Args:
+        url: URL do InfluxDB
+        token: Token de autenticação
+        org: Nome da organização
+        timeout_ms: Tempo máximo de cada requisição (ou de cada leitura, se
+                    timeout_conexao_ms for informado)
+        timeout_conexao_ms: Tempo máximo para abrir uma conexão
+        gzip: Comprimir as escritas e pedir respostas de query comprimidas
+        conexoes: Conexões reutilizáveis no pool (None = padrão da biblioteca, 5 por CPU)
+        keepalive_s: Habilitar TCP keep-alive após N segundos ociosos (None = desligado)
+        
+    Returns:
+        InfluxDBClient: Cliente pronto, sem conexões abertas ainda
+    """
+    timeout = timeout_ms if timeout_conexao_ms is None else (timeout_conexao_ms, timeout_ms)
+    opcoes = {}
+    if conexoes:
+        opcoes['connection_pool_maxsize'] = conexoes
+    client = InfluxDBClient(url=url, token=token, org=org, timeout=timeout, enable_gzip=gzip,
+                            **opcoes)
+    if keepalive_s:
+        # A biblioteca não expõe socket_options: ajustar o PoolManager antes da primeira conexão
+        client.api_client.rest_client.pool_manager.connection_pool_kw['socket_options'] = \
+            opcoes_keepalive(keepalive_s)
+    return client
+
+
+class InfluxDBService(ServicoArmazenamento):
     """Classe para gerenciar operações com InfluxDB Cloud"""
     
-    def __init__(self, url, token, org, bucket):
+    def __init__(self, url, token, org, bucket, modo_escrita='sincrono', opcoes_lote=None,
+                 diretorio_spool='spool', opcoes_spool=None, opcoes_cliente=None):
         """
         Inicializar conexão com InfluxDB
         
@@ -20,17 +393,52 @@ class InfluxDBService:
             token: Token de autenticação
             org: Nome da organização
             bucket: Nome do bucket para armazenar dados
+            modo_escrita: 'sincrono' (uma escrita por leitura), 'lote' (fila em memória)
+                          ou 'spool' (arquivo local no disco, reenviado em segundo plano)
+            opcoes_lote: Parâmetros repassados para FilaEscrita no modo 'lote'
+            diretorio_spool: Diretório dos arquivos do spool no modo 'spool'
+            opcoes_spool: Parâmetros repassados para SpoolEscrita no modo 'spool'
+            opcoes_cliente: Ajustes do transporte HTTP repassados para abrir_cliente
         """
         self.url = url
         self.token = token
         self.org = org
         self.bucket = bucket
         
-        # Criar cliente InfluxDB
-        self.client = InfluxDBClient(url=url, token=token, org=org)
+        # Criar cliente InfluxDB (pool de conexões próprio deste processo)
+        self.client = abrir_cliente(url, token, org, **(opcoes_cliente or {}))
         self.write_api = self.client.write_api(write_options=SYNCHRONOUS)
         self.query_api = self.client.query_api()
+        
+        # No modo lote, os points são enfileirados e enviados por uma thread
+        self.fila = None
+        if modo_escrita == 'lote':
+            self.fila = FilaEscrita(self._escrever_lote, **(opcoes_lote or {}))
+        
+        # No modo spool, cada leitura é gravada no disco antes de responder
+        self.spool = None
+        if modo_escrita == 'spool':
+            self.spool = SpoolEscrita(diretorio_spool, self._escrever_lote,
+                                      **(opcoes_spool or {}))
+        
+        # Rollups pré-agregados (rollups.CompactadorRollups), habilitados pela aplicação
+        self.rollups = None
+        
+        # Threads para executar queries independentes em paralelo
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='influx-query')
+        
+        # fechar() pode ser chamado pelo atexit e pelo hook worker_exit do Gunicorn
+        self._lock_fechar = threading.Lock()
+        self._fechado = False
     
+    @medir_operacao('escrever_lote')
+    def _escrever_lote(self, registros):
+        """Gravar uma lista de linhas (line protocol) no InfluxDB em uma única requisição"""
+        # Um único corpo já codificado: o cliente não percorre os registros
+        self.write_api.write(bucket=self.bucket, org=self.org,
+                             record='\n'.join(registros).encode('utf-8'))
+    
+    @medir_operacao('salvar_leitura')
     def salvar_leitura(self, dados):
         """
         Salvar leitura dos sensores no InfluxDB
@@ -39,53 +447,86 @@ class InfluxDBService:
             dados: Dicionário com os dados da leitura
             
         Returns:
-            bool: True se salvou com sucesso, False caso contrário
+            bool: True se salvou (ou enfileirou) com sucesso, False caso contrário
+            
+        Raises:
+            FilaCheiaError: Nos modos lote e spool, se não houver espaço
         """
         try:
-            # Criar point para o InfluxDB
-            point = Point("leitura_sensores") \
-                .tag("robo", "explorador_espacial") \
-                .field("temperatura_c", float(dados['temperatura_c'])) \
-                .field("umidade_pct", float(dados['umidade_pct'])) \
-                .field("luminosidade", int(dados['luminosidade'])) \
-                .field("presenca", int(dados['presenca'])) \
-                .field("probabilidade_vida", float(dados['probabilidade_vida']))
-            
-            # Se houver timestamp, usar ele
-            if 'timestamp' in dados:
-                timestamp = datetime.fromisoformat(dados['timestamp'].replace('Z', '+00:00'))
-                point = point.time(timestamp, WritePrecision.NS)
+            with ETAPAS.medir(rota='leitura', etapa='line_protocol'):
+                linha = linha_leitura(dados)
+            
+            # No modo spool, o timestamp explícito torna o reenvio idempotente
+            if self.spool is not None:
+                return self.spool.adicionar([linha])
+            
+            # No modo lote, apenas enfileirar e retornar
+            if self.fila is not None:
+                return self.fila.enfileirar(linha)
             
             # Escrever no InfluxDB
-            self.write_api.write(bucket=self.bucket, org=self.org, record=point)
+            self.write_api.write(bucket=self.bucket, org=self.org, record=linha.encode('utf-8'))
             
             return True
             
+        except FilaCheiaError:
+            raise
         except Exception as e:
+            ERROS_BANCO.incrementar(metodo='salvar_leitura')
             print(f"Erro ao salvar leitura: {e}")
             return False
     
-    def buscar_leituras(self, limit=100, hours=24):
+    @medir_operacao('salvar_leituras')
+    def salvar_leituras(self, lista_dados):
+        """
+        Salvar várias leituras no InfluxDB em uma única requisição
+        
+        Mesmo no modo lote a gravação é feita diretamente, pois a lista
+        já forma um lote completo. No modo spool, o lote é gravado no disco.
+        
+        Args:
+            lista_dados: Lista de dicionários com os dados das leituras
+            
+        Returns:
+            bool: True se salvou com sucesso, False caso contrário
+            
+        Raises:
+            FilaCheiaError: No modo spool, se o limite do disco foi atingido
+        """
+        try:
+            with ETAPAS.medir(rota='lote', etapa='line_protocol'):
+                linhas = [linha_leitura(dados) for dados in lista_dados]
+            if not linhas:
+                return True
+            if self.spool is not None:
+                return self.spool.adicionar(linhas)
+            self._escrever_lote(linhas)
+            return True
+            
+        except FilaCheiaError:
+            raise
+        except Exception as e:
+            ERROS_BANCO.incrementar(metodo='salvar_leituras')
+            print(f"Erro ao salvar lote de leituras: {e}")
+            return False
+    
+    @medir_operacao('buscar_leituras')
+    def buscar_leituras(self, limit=100, hours=24, silenciar_erros=True, robo=None):
         """
         Buscar últimas leituras do InfluxDB
         
         Args:
             limit: Número máximo de leituras a retornar
             hours: Buscar leituras das últimas N horas
+            silenciar_erros: Se False, propaga a exceção em vez de retornar []
+            robo: Filtrar por robô (None = todos)
             
         Returns:
             list: Lista de dicionários com as leituras
         """
         try:
             # Construir query Flux
-            query = f'''
-            from(bucket: "{self.bucket}")
-                |> range(start: -{hours}h)
-                |> filter(fn: (r) => r["_measurement"] == "leitura_sensores")
-                |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
-                |> sort(columns: ["_time"], desc: true)
-                |> limit(n: {limit})
-            '''
+            query = query_leituras(self.bucket, limit, hours, robo=robo)
             
             # Executar query
             result = self.query_api.query(org=self.org, query=query)
@@ -94,107 +535,223 @@ class InfluxDBService:
             leituras = []
             for table in result:
                 for record in table.records:
-                    leitura = {
-                        'timestamp': record.get_time().isoformat(),
-                        'temperatura_c': record.values.get('temperatura_c', 0),
-                        'umidade_pct': record.values.get('umidade_pct', 0),
-                        'luminosidade': record.values.get('luminosidade', 0),
-                        'presenca': record.values.get('presenca', 0),
-                        'probabilidade_vida': record.values.get('probabilidade_vida', 0)
-                    }
-                    leituras.append(leitura)
+                    leituras.append(formatar_leitura(record))
             
             return leituras
             
         except Exception as e:
+            if not silenciar_erros:
+                raise
+            ERROS_BANCO.incrementar(metodo='buscar_leituras')
             print(f"Erro ao buscar leituras: {e}")
             return []
     
-    def buscar_estatisticas(self, hours=24):
+    def buscar_leituras_stream(self, limit=100, hours=24, antes=None, robo=None):
         """
-        Buscar estatísticas das leituras (média, mín, máx)
+        Buscar leituras de forma incremental, sem materializar o resultado
+        
+        Os registros são lidos da resposta HTTP do InfluxDB conforme são
+        consumidos, mantendo o uso de memória constante.
+        
+        Args:
+            limit: Número máximo de leituras a retornar
+            hours: Buscar leituras das últimas N horas
+            antes: Cursor (datetime) - retorna apenas leituras anteriores a ele
+            robo: Filtrar por robô (None = todos)
+            
+        Yields:
+            dict: Leituras da mais recente para a mais antiga
+        """
+        query = query_leituras(self.bucket, limit, hours, antes, robo)
+        
+        for record in self.query_api.query_stream(org=self.org, query=query):
+            yield formatar_leitura(record)
+    
+    @medir_operacao('buscar_leituras_agregadas')
+    def buscar_leituras_agregadas(self, hours=24, intervalo_s=60, extremos=False, robo=None):
+        """
+        Buscar leituras agregadas em janelas de tempo (média e, opcionalmente, mín/máx)
+        
+        O número de linhas retornadas depende apenas de hours / intervalo_s,
+        não do volume de leituras brutas no período.
+        
+        Args:
+            hours: Buscar leituras das últimas N horas
+            intervalo_s: Duração de cada janela em segundos
+            extremos: Se True, inclui mínimo e máximo de cada campo
+            robo: Filtrar por robô (None = todos)
+            
+        Returns:
+            list: Janelas em ordem cronológica
+        """
+        try:
+            # Janelas múltiplas da resolução de um rollup são lidas dele
+            # (os rollups combinam todos os robôs)
+            rollup = None
+            if self.rollups is not None and robo is None:
+                rollup = self.rollups.resolucao_para(hours, intervalo_s)
+            if rollup is not None:
+                return self.rollups.buscar_leituras_agregadas(hours, intervalo_s, rollup[1], extremos)
+            
+            query = query_leituras_agregadas(self.bucket, hours, intervalo_s, extremos, robo)
+            result = self.query_api.query(org=self.org, query=query)
+            
+            return [
+                formatar_leitura_agregada(record.values, record.get_time(), extremos)
+                for table in result for record in table.records
+            ]
+            
+        except Exception as e:
+            ERROS_BANCO.incrementar(metodo='buscar_leituras_agregadas')
+            print(f"Erro ao buscar leituras agregadas: {e}")
+            return []
+    
+    @medir_operacao('buscar_estatisticas')
+    def buscar_estatisticas(self, hours=24, percentis=False, robo=None):
+        """
+        Buscar estatísticas das leituras (média, mín, máx, contagem, desvio padrão)
+        
+        Todas as estatísticas de todos os campos são calculadas em uma
+        única query Flux, agrupada por _field.
         
         Args:
             hours: Calcular estatísticas das últimas N horas
+            percentis: Se True, inclui também p50, p95 e p99
+            robo: Filtrar por robô (None = todos)
             
         Returns:
             dict: Dicionário com as estatísticas
         """
         try:
-            # Query para estatísticas de cada campo
-            query = f'''
-            from(bucket: "{self.bucket}")
-                |> range(start: -{hours}h)
-                |> filter(fn: (r) => r["_measurement"] == "leitura_sensores")
-                |> group(columns: ["_field"])
-            '''
-            
-            # Queries individuais para cada estatística
-            stats = {}
-            campos = ['temperatura_c', 'umidade_pct', 'luminosidade', 'probabilidade_vida']
-            
-            for campo in campos:
-                # Query para média
-                query_media = f'''
-                from(bucket: "{self.bucket}")
-                    |> range(start: -{hours}h)
-                    |> filter(fn: (r) => r["_measurement"] == "leitura_sensores")
-                    |> filter(fn: (r) => r["_field"] == "{campo}")
-                    |> mean()
-                '''
-                
-                # Query para mínimo
-                query_min = f'''
-                from(bucket: "{self.bucket}")
-                    |> range(start: -{hours}h)
-                    |> filter(fn: (r) => r["_measurement"] == "leitura_sensores")
-                    |> filter(fn: (r) => r["_field"] == "{campo}")
-                    |> min()
-                '''
-                
-                # Query para máximo
-                query_max = f'''
-                from(bucket: "{self.bucket}")
-                    |> range(start: -{hours}h)
-                    |> filter(fn: (r) => r["_measurement"] == "leitura_sensores")
-                    |> filter(fn: (r) => r["_field"] == "{campo}")
-                    |> max()
-                '''
-                
-                # Executar queries
-                result_media = self.query_api.query(org=self.org, query=query_media)
-                result_min = self.query_api.query(org=self.org, query=query_min)
-                result_max = self.query_api.query(org=self.org, query=query_max)
-                
-                # Processar resultados
-                media = None
-                minimo = None
-                maximo = None
-                
-                for table in result_media:
-                    for record in table.records:
-                        media = record.get_value()
-                
-                for table in result_min:
-                    for record in table.records:
-                        minimo = record.get_value()
-                
-                for table in result_max:
-                    for record in table.records:
-                        maximo = record.get_value()
-                
-                stats[campo] = {
-                    'media': round(media, 2) if media else 0,
-                    'minimo': round(minimo, 2) if minimo else 0,
-                    'maximo': round(maximo, 2) if maximo else 0
-                }
+            # Janelas longas usam o rollup mais grosso que atende o período
+            # (percentis exigem os dados brutos)
+            rollup = None
+            if self.rollups is not None and not percentis and robo is None:
+                rollup = self.rollups.resolucao_para(hours)
+            if rollup is not None:
+                return self.rollups.buscar_estatisticas(hours, rollup[1])
+            
+            estatisticas = ESTATISTICAS_BASICAS + (ESTATISTICAS_PERCENTIS if percentis else [])
+            query = query_estatisticas(self.bucket, hours, estatisticas, robo)
+            
+            result = self.query_api.query(org=self.org, query=query)
+            
+            # Processar resultados
+            valores = agrupar_estatisticas(
+                record for table in result for record in table.records
+            )
             
-            return stats
+            return {
+                campo: formatar_estatisticas(valores[campo], percentis)
+                for campo in CAMPOS_ESTATISTICAS
+            }
             
         except Exception as e:
+            ERROS_BANCO.incrementar(metodo='buscar_estatisticas')
             print(f"Erro ao buscar estatísticas: {e}")
             return {}
     
+    @medir_operacao('buscar_frota')
+    def buscar_frota(self, hours=24):
+        """
+        Buscar a última leitura e as estatísticas de cada robô
+        
+        São apenas duas queries (agrupadas por robô, independente do tamanho
+        da frota), executadas em paralelo.
+        
+        Args:
+            hours: Considerar as leituras das últimas N horas
+            
+        Returns:
+            list: Um dicionário por robô, ordenado por robo_id
+        """
+        try:
+            consulta_ultimas = self._executor.submit(
+                self.query_api.query, org=self.org, query=query_ultimas_por_robo(self.bucket, hours)
+            )
+            consulta_estatisticas = self._executor.submit(
+                self.query_api.query, org=self.org,
+                query=query_estatisticas(self.bucket, hours, ESTATISTICAS_BASICAS, por_robo=True)
+            )
+            
+            robos = {}
+            for table in consulta_ultimas.result():
+                for record in table.records:
+                    leitura = formatar_leitura(record)
+                    robos[leitura['robo_id']] = {'robo_id': leitura['robo_id'], 'ultima_leitura': leitura}
+            
+            valores = {}
+            for table in consulta_estatisticas.result():
+                for record in table.records:
+                    robo = record.values.get('robo', ROBO_PADRAO)
+                    valores.setdefault(robo, {campo: {} for campo in CAMPOS_ESTATISTICAS})
+                    agrupar_estatisticas([record], valores[robo])
+            
+            for robo, por_campo in valores.items():
+                robos.setdefault(robo, {'robo_id': robo, 'ultima_leitura': None})
+                robos[robo]['estatisticas'] = {
+                    campo: formatar_estatisticas(por_campo[campo]) for campo in CAMPOS_ESTATISTICAS
+                }
+            
+            return [robos[robo] for robo in sorted(robos)]
+            
+        except Exception as e:
+            ERROS_BANCO.incrementar(metodo='buscar_frota')
+            print(f"Erro ao buscar frota: {e}")
+            return []
+    
+    @medir_operacao('buscar_agregados_por_minuto')
+    def buscar_agregados_por_minuto(self, hours=24):
+        """
+        Buscar agregados por minuto (contagem, soma, soma dos quadrados,
+        mínimo e máximo) de cada campo, em uma única query
+        
+        Usado para aquecer o cálculo de estatísticas em memória.
+        
+        Args:
+            hours: Buscar agregados das últimas N horas
+            
+        Returns:
+            list: Tuplas (campo, início do minuto em epoch segundos, estatística, valor)
+        """
+        if self.rollups is not None and self.rollups.resolucao_para(hours, 60) is not None:
+            return self.rollups.buscar_agregados_por_minuto(hours)
+        
+        conjunto = ', '.join(f'"{campo}"' for campo in CAMPOS_ESTATISTICAS)
+        query = f'''
+        dados = from(bucket: "{self.bucket}")
+            |> range(start: -{hours}h)
+            |> filter(fn: (r) => r["_measurement"] == "leitura_sensores")
+            |> filter(fn: (r) => contains(value: r["_field"], set: [{conjunto}]))
+            |> toFloat()
+        
+        union(tables: [
+            dados |> aggregateWindow(every: 1m, fn: count, createEmpty: false, timeSrc: "_start") |> toFloat() |> set(key: "estatistica", value: "contagem"),
+            dados |> aggregateWindow(every: 1m, fn: sum, createEmpty: false, timeSrc: "_start") |> set(key: "estatistica", value: "soma"),
+            dados |> map(fn: (r) => ({{r with _value: r._value * r._value}})) |> aggregateWindow(every: 1m, fn: sum, createEmpty: false, timeSrc: "_start") |> set(key: "estatistica", value: "soma_q"),
+            dados |> aggregateWindow(every: 1m, fn: min, createEmpty: false, timeSrc: "_start") |> set(key: "estatistica", value: "minimo"),
+            dados |> aggregateWindow(every: 1m, fn: max, createEmpty: false, timeSrc: "_start") |> set(key: "estatistica", value: "maximo")
+        ])
+            |> keep(columns: ["_time", "_field", "estatistica", "_value"])
+        '''
+        
+        result = self.query_api.query(org=self.org, query=query)
+        
+        agregados = []
+        for table in result:
+            for record in table.records:
+                # timeSrc "_start": _time é o início da janela. Só a primeira janela,
+                # cortada pelo início do range, precisa ser alinhada ao minuto
+                inicio = int(record.get_time().timestamp()) // 60 * 60
+                agregados.append((
+                    record.values.get('_field'),
+                    inicio,
+                    record.values.get('estatistica'),
+                    record.get_value()
+                ))
+        return agregados
+    
+    @medir_operacao('verificar_conexao')
     def verificar_conexao(self):
         """
         Verificar se a conexão com InfluxDB está funcionando
@@ -208,9 +765,41 @@ class InfluxDBService:
             result = self.query_api.query(org=self.org, query=query)
             return True
         except Exception as e:
+            ERROS_BANCO.incrementar(metodo='verificar_conexao')
             print(f"Erro ao verificar conexão: {e}")
             return False
     
+    @medir_operacao('sondar_escrita')
+    def sondar_escrita(self):
+        """
+        Gravar um ponto de teste (measurement monitor_conexao) diretamente no InfluxDB
+        
+        Ignora a fila e o spool, para medir a latência real de escrita.
+        As consultas de leituras filtram leitura_sensores e não veem este ponto.
+        
+        Returns:
+            bool: True se gravou com sucesso, False caso contrário
+        """
+        try:
+            self.write_api.write(bucket=self.bucket, org=self.org,
+                                 record=Point("monitor_conexao").field("sonda", 1))
+            return True
+        except Exception as e:
+            ERROS_BANCO.incrementar(metodo='sondar_escrita')
+            print(f"Erro ao sondar escrita: {e}")
+            return False
+    
     def fechar(self):
-        """Fechar conexão com InfluxDB"""
+        """Fechar conexão com InfluxDB, enviando antes as escritas pendentes (idempotente)"""
+        with self._lock_fechar:
+            if self._fechado:
+                return
+            self._fechado = True
+        if self.rollups is not None:
+            self.rollups.fechar()
+        self._executor.shutdown(wait=True)
+        if self.fila is not None:
+            self.fila.fechar()
+        if self.spool is not None:
+            self.spool.fechar()
         self.client.close()
@@ -0,0 +1,165 @@
+"""
+Serviço assíncrono para integração com InfluxDB Cloud
+Mesmas operações do InfluxDBService, usando o cliente asyncio do InfluxDB
+"""
+
+import asyncio
+
+from influxdb_client.client.influxdb_client_async import InfluxDBClientAsync
+
+from influxdb_service import (
+    CAMPOS_ESTATISTICAS, ESTATISTICAS_BASICAS, ESTATISTICAS_PERCENTIS,
+    agrupar_estatisticas, formatar_estatisticas, formatar_leitura, linha_leitura,
+    query_estatisticas, query_leituras
+)
+
+
+class InfluxDBServiceAsync:
+    """Classe para gerenciar operações assíncronas com InfluxDB Cloud"""
+
+    def __init__(self, url, token, org, bucket):
+        """
+        Inicializar conexão assíncrona com InfluxDB
+
+        Deve ser criado dentro do event loop (ex: no startup do servidor ASGI).
+
+        Args:
+            url: URL do InfluxDB Cloud
+            token: Token de autenticação
+            org: Nome da organização
+            bucket: Nome do bucket para armazenar dados
+        """
+        self.url = url
+        self.token = token
+        self.org = org
+        self.bucket = bucket
+
+        self.client = InfluxDBClientAsync(url=url, token=token, org=org)
+        self.write_api = self.client.write_api()
+        self.query_api = self.client.query_api()
+
+    async def salvar_leitura(self, dados):
+        """
+        Salvar leitura dos sensores no InfluxDB
+
+        Args:
+            dados: Dicionário com os dados da leitura
+
+        Returns:
+            bool: True se salvou com sucesso, False caso contrário
+        """
+        return await self.salvar_leituras([dados])
+
+    async def salvar_leituras(self, lista_dados):
+        """
+        Salvar várias leituras no InfluxDB em uma única requisição
+
+        Args:
+            lista_dados: Lista de dicionários com os dados das leituras
+
+        Returns:
+            bool: True se salvou com sucesso, False caso contrário
+        """
+        try:
+            linhas = [linha_leitura(dados) for dados in lista_dados]
+            if linhas:
+                return await self.write_api.write(bucket=self.bucket, org=self.org,
+                                                  record='\n'.join(linhas).encode('utf-8'))
+            return True
+
+        except Exception as e:
+            print(f"Erro ao salvar leituras: {e}")
+            return False
+
+    async def buscar_leituras(self, limit=100, hours=24, robo=None):
+        """
+        Buscar últimas leituras do InfluxDB
+
+        Args:
+            limit: Número máximo de leituras a retornar
+            hours: Buscar leituras das últimas N horas
+            robo: Filtrar por robô (None = todos)
+
+        Returns:
+            list: Lista de dicionários com as leituras
+        """
+        try:
+            result = await self.query_api.query(
+                query_leituras(self.bucket, limit, hours, robo=robo), org=self.org
+            )
+            return [formatar_leitura(record) for table in result for record in table.records]
+
+        except Exception as e:
+            print(f"Erro ao buscar leituras: {e}")
+            return []
+
+    async def buscar_leituras_stream(self, limit=100, hours=24, antes=None, robo=None):
+        """
+        Buscar leituras de forma incremental, sem materializar o resultado
+
+        Yields:
+            dict: Leituras da mais recente para a mais antiga
+        """
+        records = await self.query_api.query_stream(
+            query_leituras(self.bucket, limit, hours, antes, robo), org=self.org
+        )
+        async for record in records:
+            yield formatar_leitura(record)
+
+    async def _consultar_estatisticas(self, hours, estatisticas):
+        """Executar uma query de estatísticas e retornar os registros"""
+        result = await self.query_api.query(
+            query_estatisticas(self.bucket, hours, estatisticas), org=self.org
+        )
+        return [record for table in result for record in table.records]
+
+    async def buscar_estatisticas(self, hours=24, percentis=False):
+        """
+        Buscar estatísticas das leituras
+
+        As estatísticas básicas e os percentis (mais caros) são calculados
+        em queries separadas executadas concorrentemente.
+
+        Args:
+            hours: Calcular estatísticas das últimas N horas
+            percentis: Se True, inclui também p50, p95 e p99
+
+        Returns:
+            dict: Dicionário com as estatísticas
+        """
+        try:
+            consultas = [self._consultar_estatisticas(hours, ESTATISTICAS_BASICAS)]
+            if percentis:
+                consultas.append(self._consultar_estatisticas(hours, ESTATISTICAS_PERCENTIS))
+
+            valores = None
+            for records in await asyncio.gather(*consultas):
+                valores = agrupar_estatisticas(records, valores)
+
+            return {
+                campo: formatar_estatisticas(valores[campo], percentis)
+                for campo in CAMPOS_ESTATISTICAS
+            }
+
+        except Exception as e:
+            print(f"Erro ao buscar estatísticas: {e}")
+            return {}
+
+    async def verificar_conexao(self):
+        """
+        Verificar se a conexão com InfluxDB está funcionando
+
+        Returns:
+            bool: True se conectado, False caso contrário
+        """
+        try:
+            query = f'buckets() |> filter(fn: (r) => r.name == "{self.bucket}")'
+            await self.query_api.query(query, org=self.org)
+            return True
+        except Exception as e:
+            print(f"Erro ao verificar conexão: {e}")
+            return False
+
+    async def fechar(self):
+        """Fechar conexão com InfluxDB"""
+        await self.client.close()
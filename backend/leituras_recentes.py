@@ -0,0 +1,266 @@
+"""
+Buffer em memória das leituras mais recentes de cada robô
+Responde GET /leituras sem consultar o InfluxDB quando a janela pedida
+está inteiramente coberta pelo buffer
+"""
+
+import heapq
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timezone
+from itertools import islice
+
+from influxdb_service import ROBO_PADRAO
+from validacao import timestamp_leitura_ns
+
+
+# Campos armazenados e o tipo devolvido na resposta
+CAMPOS_LEITURA = [
+    ('temperatura_c', float),
+    ('umidade_pct', float),
+    ('luminosidade', int),
+    ('presenca', int),
+    ('probabilidade_vida', float)
+]
+
+
+class _AnelLeituras:
+    """Buffer circular de capacidade fixa com as leituras de um robô"""
+
+    def __init__(self, capacidade, completo_desde_ns, robo=ROBO_PADRAO):
+        self.robo = robo
+        self.capacidade = capacidade
+        self.tamanho = 0
+        self.proxima = 0
+        self.timestamps = array('q', [0]) * capacidade
+        self.valores = {campo: array('d', [0.0]) * capacidade for campo, _ in CAMPOS_LEITURA}
+        # Todas as leituras com timestamp maior que este valor estão no buffer
+        self.completo_desde_ns = completo_desde_ns
+        # Ordem de inserção da última leitura mais antiga que a anterior: enquanto
+        # ela estiver no buffer, a ordem de chegada não é a ordem cronológica
+        self.inseridas = 0
+        self.ultima_fora_de_ordem = -1
+        self.ultimo_ns = None
+        self.maximo_ns = None
+
+    def adicionar(self, timestamp_ns, dados):
+        """Adicionar leitura, descartando a mais antiga se o buffer estiver cheio"""
+        posicao = self.proxima
+        if self.tamanho == self.capacidade:
+            descartada = self.timestamps[posicao]
+            if descartada > self.completo_desde_ns:
+                self.completo_desde_ns = descartada
+        else:
+            self.tamanho += 1
+        if self.ultimo_ns is not None and timestamp_ns < self.ultimo_ns:
+            self.ultima_fora_de_ordem = self.inseridas
+        self.ultimo_ns = timestamp_ns
+        if self.maximo_ns is None or timestamp_ns > self.maximo_ns:
+            self.maximo_ns = timestamp_ns
+        self.inseridas += 1
+        self.timestamps[posicao] = timestamp_ns
+        for campo, _ in CAMPOS_LEITURA:
+            self.valores[campo][posicao] = float(dados.get(campo, 0))
+        self.proxima = (posicao + 1) % self.capacidade
+
+    def posicoes_desde(self, inicio_ns):
+        """Listar (timestamp, posição) das leituras a partir de inicio_ns"""
+        timestamps = self.timestamps
+        return [
+            (timestamps[posicao], posicao)
+            for posicao in range(self.tamanho)
+            if timestamps[posicao] >= inicio_ns
+        ]
+
+    def mais_recentes(self, inicio_ns, limit):
+        """
+        Listar (timestamp, posição) das até limit leituras mais recentes a
+        partir de inicio_ns, da mais recente para a mais antiga
+
+        Com as leituras em ordem, percorre só o fim do buffer.
+        """
+        if self.ultima_fora_de_ordem > self.inseridas - self.tamanho:
+            return sorted(self.posicoes_desde(inicio_ns), reverse=True)[:limit]
+        resultado = []
+        posicao = self.proxima
+        for _ in range(min(self.tamanho, limit)):
+            posicao = (posicao - 1) % self.capacidade
+            timestamp = self.timestamps[posicao]
+            if timestamp < inicio_ns:
+                break
+            resultado.append((timestamp, posicao))
+        return resultado
+
+    def leitura(self, posicao):
+        """Montar a leitura no formato de InfluxDBService.buscar_leituras"""
+        momento = datetime.fromtimestamp(self.timestamps[posicao] / 1e9, tz=timezone.utc)
+        leitura = {'timestamp': momento.isoformat(), 'robo_id': self.robo}
+        for campo, tipo in CAMPOS_LEITURA:
+            leitura[campo] = tipo(self.valores[campo][posicao])
+        return leitura
+
+
+class BufferLeituras:
+    """Últimas N leituras de cada robô, alimentadas pelo caminho de ingestão"""
+
+    def __init__(self, capacidade=1000, max_robos=1000):
+        """
+        Inicializar buffer
+
+        Args:
+            capacidade: Número de leituras mantidas por robô
+            max_robos: Número máximo de robôs com buffer; acima dele, o buffer
+                       do robô que está há mais tempo sem enviar é descartado
+        """
+        self.capacidade = max(1, int(capacidade))
+        self.max_robos = max(1, int(max_robos))
+        # Ordem de uso: o robô que enviou há mais tempo fica no início
+        self._aneis = OrderedDict()
+        self._lock = threading.Lock()
+        # Antes do aquecimento, só há garantia das leituras recebidas pelo processo
+        self._completo_desde_ns = time.time_ns()
+        # Leitura mais recente dos buffers descartados: consultas que dependem
+        # de robôs sem buffer só são respondidas depois dela
+        self._descartados_ate_ns = None
+
+        self.acertos = 0
+        self.falhas = 0
+        self.robos_descartados = 0
+
+    def _anel(self, robo):
+        """Obter (ou criar) o buffer de um robô (lock já adquirido)"""
+        anel = self._aneis.get(robo)
+        if anel is not None:
+            self._aneis.move_to_end(robo)
+            return anel
+        completo_desde_ns = self._completo_desde_ns
+        if self._descartados_ate_ns is not None:
+            # O robô pode ter tido um buffer descartado
+            completo_desde_ns = max(completo_desde_ns, self._descartados_ate_ns)
+        anel = _AnelLeituras(self.capacidade, completo_desde_ns, robo)
+        self._aneis[robo] = anel
+        self._despejar(self._aneis)
+        return anel
+
+    def _despejar(self, aneis):
+        """Descartar os buffers menos usados acima de max_robos (lock já adquirido)"""
+        while len(aneis) > self.max_robos:
+            _, anel = aneis.popitem(last=False)
+            self.robos_descartados += 1
+            if anel.maximo_ns is not None and (
+                    self._descartados_ate_ns is None or anel.maximo_ns > self._descartados_ate_ns):
+                self._descartados_ate_ns = anel.maximo_ns
+
+    def registrar(self, dados, robo=ROBO_PADRAO):
+        """
+        Adicionar leitura validada (com timestamp ISO) ao buffer do robô
+
+        Args:
+            dados: Dicionário com os dados da leitura
+            robo: Identificador do robô
+        """
+        timestamp_ns = timestamp_leitura_ns(dados)
+        with self._lock:
+            self._anel(robo).adicionar(timestamp_ns, dados)
+
+    def aquecer(self, service, hours=24):
+        """
+        Preencher o buffer com as leituras mais recentes do InfluxDB
+
+        Args:
+            service: InfluxDBService usado na consulta
+            hours: Janela consultada no aquecimento
+
+        Returns:
+            bool: True se o aquecimento foi concluído
+        """
+        inicio_ns = time.time_ns() - int(hours * 3600 * 1e9)
+        try:
+            leituras = service.buscar_leituras(limit=self.capacidade, hours=hours,
+                                               silenciar_erros=False)
+        except Exception as e:
+            print(f"Erro ao aquecer buffer de leituras: {e}")
+            return False
+
+        completo_desde_ns = inicio_ns
+        if len(leituras) >= self.capacidade:
+            # A consulta foi truncada: só há garantia a partir da mais antiga
+            completo_desde_ns = timestamp_leitura_ns(leituras[-1])
+
+        with self._lock:
+            aneis = OrderedDict()
+            # buscar_leituras retorna da mais recente para a mais antiga
+            for leitura in reversed(leituras):
+                robo = leitura.get('robo_id', ROBO_PADRAO)
+                anel = aneis.get(robo)
+                if anel is None:
+                    anel = aneis[robo] = _AnelLeituras(self.capacidade, completo_desde_ns, robo)
+                anel.adicionar(timestamp_leitura_ns(leitura), leitura)
+            # Leituras recebidas durante o aquecimento
+            for robo, atual in self._aneis.items():
+                anel = aneis.get(robo)
+                if anel is None:
+                    anel = aneis[robo] = _AnelLeituras(self.capacidade, completo_desde_ns, robo)
+                for _, posicao in sorted(atual.posicoes_desde(0)):
+                    anel.adicionar(atual.timestamps[posicao],
+                                   {c: atual.valores[c][posicao] for c, _ in CAMPOS_LEITURA})
+            # Manter os robôs com as leituras mais recentes
+            for robo in sorted(aneis, key=lambda robo: aneis[robo].maximo_ns or 0):
+                aneis.move_to_end(robo)
+            self._despejar(aneis)
+            self._aneis = aneis
+            self._completo_desde_ns = completo_desde_ns
+        return True
+
+    def consultar(self, limit=100, hours=24, robo=None):
+        """
+        Buscar as últimas leituras, se a janela estiver coberta pelo buffer
+
+        Args:
+            limit: Número máximo de leituras a retornar
+            hours: Buscar leituras das últimas N horas
+            robo: Considerar apenas o buffer deste robô (None = todos)
+
+        Returns:
+            list: Leituras da mais recente para a mais antiga, ou None se o
+                  buffer não contém todas as leituras necessárias
+        """
+        inicio_ns = time.time_ns() - int(hours * 3600 * 1e9)
+        with self._lock:
+            if robo is None:
+                aneis = list(self._aneis.values())
+            else:
+                aneis = [self._aneis[robo]] if robo in self._aneis else []
+            # Intercalar o fim do buffer de cada robô, sem percorrer os buffers inteiros
+            por_robo = [
+                [(timestamp, posicao, anel)
+                 for timestamp, posicao in anel.mais_recentes(inicio_ns, limit)]
+                for anel in aneis
+            ]
+            candidatas = list(islice(
+                heapq.merge(*por_robo, key=lambda c: c[0], reverse=True), limit
+            ))
+
+            # Limite da garantia: a leitura mais antiga necessária na resposta
+            if len(candidatas) >= limit:
+                candidatas = candidatas[:limit]
+                corte_ns = candidatas[-1][0] if candidatas else inicio_ns
+            else:
+                corte_ns = inicio_ns
+
+            completo_desde_ns = max(
+                [self._completo_desde_ns] +
+                [anel.completo_desde_ns for anel in aneis]
+            )
+            if (self._descartados_ate_ns is not None
+                    and (robo is None or robo not in self._aneis)):
+                # Robôs descartados não estão no buffer: só há garantia depois deles
+                completo_desde_ns = max(completo_desde_ns, self._descartados_ate_ns)
+            if completo_desde_ns >= corte_ns:
+                self.falhas += 1
+                return None
+
+            self.acertos += 1
+            return [anel.leitura(posicao) for _, posicao, anel in candidatas]
@@ -0,0 +1,424 @@
+"""
+Armazenamento local das leituras, sem InfluxDB
+Colunas em memória (arrays ordenados por timestamp) com persistência
+opcional em SQLite, para desenvolvimento offline e testes de desempenho.
+O volume é limitado por capacidade e retenção: as leituras mais antigas saem primeiro
+"""
+
+import math
+import sqlite3
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+
+from armazenamento import ServicoArmazenamento
+from influxdb_service import (
+    CAMPOS_AGREGADOS, CAMPOS_ESTATISTICAS, PERCENTIS, ROBO_PADRAO,
+    formatar_estatisticas, formatar_leitura_agregada
+)
+from leituras_recentes import CAMPOS_LEITURA
+from metricas import ERROS_BANCO, medir_operacao
+from validacao import timestamp_leitura_ns
+
+
+def _quantil(ordenados, q):
+    """Quantil com interpolação linear (lista já ordenada)"""
+    posicao = (len(ordenados) - 1) * q
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicao - inferior)
+
+
+class MemoriaService(ServicoArmazenamento):
+    """Leituras em colunas na memória do processo, opcionalmente salvas em SQLite"""
+
+    def __init__(self, arquivo_sqlite=None, capacidade=1_000_000, retencao_horas=None):
+        """
+        Inicializar armazenamento
+
+        Args:
+            arquivo_sqlite: Caminho do banco SQLite (None = apenas memória)
+            capacidade: Máximo de leituras guardadas (as mais antigas são descartadas)
+            retencao_horas: Descartar leituras mais antigas que N horas (None = sem limite)
+        """
+        self.capacidade = max(1, int(capacidade))
+        self.retencao_ns = int(retencao_horas * 3600 * 1e9) if retencao_horas else None
+        self._proxima_retencao = 0.0
+        self.descartadas = 0
+
+        self._lock = threading.Lock()
+        self._timestamps = array('q')
+        self._colunas = {campo: array('d') for campo, _ in CAMPOS_LEITURA}
+        self._robos = []
+
+        self._sqlite = None
+        if arquivo_sqlite:
+            self._sqlite = sqlite3.connect(arquivo_sqlite, check_same_thread=False)
+            self._sqlite.execute('PRAGMA journal_mode=WAL')
+            self._sqlite.execute('PRAGMA synchronous=NORMAL')
+            colunas = ', '.join(f'{campo} REAL' for campo, _ in CAMPOS_LEITURA)
+            self._sqlite.execute(
+                f'CREATE TABLE IF NOT EXISTS leituras (timestamp_ns INTEGER, robo TEXT, {colunas})'
+            )
+            self._carregar_sqlite()
+
+    def _carregar_sqlite(self):
+        """Carregar para a memória as leituras persistidas mais recentes"""
+        campos = ', '.join(campo for campo, _ in CAMPOS_LEITURA)
+        cursor = self._sqlite.execute(
+            f'SELECT * FROM (SELECT timestamp_ns, robo, {campos} FROM leituras '
+            f'ORDER BY timestamp_ns DESC LIMIT ?) ORDER BY timestamp_ns',
+            (self.capacidade,)
+        )
+        for linha in cursor:
+            self._timestamps.append(linha[0])
+            self._robos.append(linha[1])
+            for (campo, _), valor in zip(CAMPOS_LEITURA, linha[2:]):
+                self._colunas[campo].append(valor)
+        self._aparar()
+
+    def _aparar(self):
+        """Descartar as leituras acima da capacidade ou da retenção (lock já adquirido)"""
+        corte = 0
+        excesso = len(self._timestamps) - self.capacidade
+        if excesso > 0:
+            # Remover do início de um array custa O(N): liberar 10% a mais de uma vez
+            corte = min(excesso + self.capacidade // 10, len(self._timestamps))
+        if self.retencao_ns is not None and time.monotonic() >= self._proxima_retencao:
+            self._proxima_retencao = time.monotonic() + 60
+            corte = max(corte, bisect_left(self._timestamps, time.time_ns() - self.retencao_ns))
+        if not corte:
+            return
+
+        del self._timestamps[:corte]
+        del self._robos[:corte]
+        for coluna in self._colunas.values():
+            del coluna[:corte]
+        self.descartadas += corte
+        if self._sqlite is not None:
+            if self._timestamps:
+                self._sqlite.execute('DELETE FROM leituras WHERE timestamp_ns < ?',
+                                     (self._timestamps[0],))
+            else:
+                self._sqlite.execute('DELETE FROM leituras')
+            self._sqlite.commit()
+
+    def _inserir(self, timestamp_ns, robo, dados):
+        """Inserir leitura mantendo as colunas ordenadas (lock já adquirido)"""
+        if not self._timestamps or timestamp_ns >= self._timestamps[-1]:
+            self._timestamps.append(timestamp_ns)
+            self._robos.append(robo)
+            for campo, _ in CAMPOS_LEITURA:
+                self._colunas[campo].append(float(dados.get(campo, 0)))
+            return
+        # Leitura atrasada: inserir na posição correta
+        posicao = bisect_right(self._timestamps, timestamp_ns)
+        self._timestamps.insert(posicao, timestamp_ns)
+        self._robos.insert(posicao, robo)
+        for campo, _ in CAMPOS_LEITURA:
+            self._colunas[campo].insert(posicao, float(dados.get(campo, 0)))
+
+    def salvar_leitura(self, dados):
+        """
+        Salvar leitura dos sensores
+
+        Args:
+            dados: Dicionário com os dados da leitura
+
+        Returns:
+            bool: True se salvou com sucesso, False caso contrário
+        """
+        return self.salvar_leituras([dados])
+
+    @medir_operacao('salvar_leituras')
+    def salvar_leituras(self, lista_dados):
+        """
+        Salvar várias leituras (uma transação no SQLite, se habilitado)
+
+        Args:
+            lista_dados: Lista de dicionários com os dados das leituras
+
+        Returns:
+            bool: True se salvou com sucesso, False caso contrário
+        """
+        try:
+            linhas = []
+            for dados in lista_dados:
+                if 'timestamp' in dados:
+                    timestamp_ns = timestamp_leitura_ns(dados)
+                else:
+                    timestamp_ns = time.time_ns()
+                linhas.append((timestamp_ns, dados.get('robo_id', ROBO_PADRAO), dados))
+
+            with self._lock:
+                for timestamp_ns, robo, dados in linhas:
+                    self._inserir(timestamp_ns, robo, dados)
+                if self._sqlite is not None:
+                    marcadores = ', '.join('?' * (len(CAMPOS_LEITURA) + 2))
+                    self._sqlite.executemany(
+                        f'INSERT INTO leituras VALUES ({marcadores})',
+                        [
+                            (timestamp_ns, robo, *(float(dados.get(campo, 0)) for campo, _ in CAMPOS_LEITURA))
+                            for timestamp_ns, robo, dados in linhas
+                        ]
+                    )
+                    self._sqlite.commit()
+                self._aparar()
+            return True
+
+        except Exception as e:
+            ERROS_BANCO.incrementar(metodo='salvar_leituras')
+            print(f"Erro ao salvar leituras: {e}")
+            return False
+
+    def _inicio(self, hours):
+        """Posição da primeira leitura dentro da janela de N horas (lock já adquirido)"""
+        return bisect_left(self._timestamps, time.time_ns() - int(hours * 3600 * 1e9))
+
+    def _leitura(self, posicao):
+        """Montar a leitura no formato de InfluxDBService.buscar_leituras"""
+        momento = datetime.fromtimestamp(self._timestamps[posicao] / 1e9, tz=timezone.utc)
+        leitura = {'timestamp': momento.isoformat(), 'robo_id': self._robos[posicao]}
+        for campo, tipo in CAMPOS_LEITURA:
+            leitura[campo] = tipo(self._colunas[campo][posicao])
+        return leitura
+
+    def _posicoes(self, hours, robo=None):
+        """Posições da janela de N horas, opcionalmente de um só robô (lock já adquirido)"""
+        inicio = self._inicio(hours)
+        if robo is None:
+            return range(inicio, len(self._timestamps))
+        robos = self._robos
+        return [posicao for posicao in range(inicio, len(robos)) if robos[posicao] == robo]
+
+    def _colunas_janela(self, hours, campos, robo=None):
+        """Timestamps e colunas da janela de N horas (lock já adquirido)"""
+        if robo is None:
+            inicio = self._inicio(hours)
+            return (self._timestamps[inicio:],
+                    {campo: self._colunas[campo][inicio:] for campo in campos})
+        posicoes = self._posicoes(hours, robo)
+        return ([self._timestamps[p] for p in posicoes],
+                {campo: [self._colunas[campo][p] for p in posicoes] for campo in campos})
+
+    def _fatiar(self, limit, hours, antes=None, robo=None):
+        """Leituras da janela, da mais recente para a mais antiga"""
+        with self._lock:
+            inicio = self._inicio(hours)
+            fim = len(self._timestamps)
+            if antes is not None:
+                if antes.tzinfo is None:
+                    antes = antes.replace(tzinfo=timezone.utc)
+                limite_ns = int(round(antes.timestamp() * 1_000_000)) * 1000
+                fim = bisect_left(self._timestamps, limite_ns, inicio)
+            if robo is None:
+                return [self._leitura(posicao)
+                        for posicao in range(fim - 1, max(inicio, fim - limit) - 1, -1)]
+            resultado = []
+            for posicao in range(fim - 1, inicio - 1, -1):
+                if len(resultado) >= limit:
+                    break
+                if self._robos[posicao] == robo:
+                    resultado.append(self._leitura(posicao))
+            return resultado
+
+    @medir_operacao('buscar_leituras')
+    def buscar_leituras(self, limit=100, hours=24, silenciar_erros=True, robo=None):
+        """
+        Buscar últimas leituras
+
+        Args:
+            limit: Número máximo de leituras a retornar
+            hours: Buscar leituras das últimas N horas
+            silenciar_erros: Mantido por compatibilidade com InfluxDBService
+            robo: Filtrar por robô (None = todos)
+
+        Returns:
+            list: Lista de dicionários com as leituras
+        """
+        return self._fatiar(limit, hours, robo=robo)
+
+    def buscar_leituras_stream(self, limit=100, hours=24, antes=None, robo=None):
+        """
+        Buscar leituras de forma incremental
+
+        Args:
+            limit: Número máximo de leituras a retornar
+            hours: Buscar leituras das últimas N horas
+            antes: Cursor (datetime) - retorna apenas leituras anteriores a ele
+            robo: Filtrar por robô (None = todos)
+
+        Yields:
+            dict: Leituras da mais recente para a mais antiga
+        """
+        yield from self._fatiar(limit, hours, antes, robo)
+
+    @medir_operacao('buscar_leituras_agregadas')
+    def buscar_leituras_agregadas(self, hours=24, intervalo_s=60, extremos=False, robo=None):
+        """
+        Agregar as leituras em janelas de tempo (média e, opcionalmente, mín/máx)
+
+        Args:
+            hours: Buscar leituras das últimas N horas
+            intervalo_s: Duração de cada janela em segundos
+            extremos: Se True, inclui mínimo e máximo de cada campo
+            robo: Filtrar por robô (None = todos)
+
+        Returns:
+            list: Janelas em ordem cronológica
+        """
+        intervalo_ns = int(intervalo_s) * 1_000_000_000
+        with self._lock:
+            timestamps, colunas = self._colunas_janela(hours, CAMPOS_AGREGADOS, robo)
+        janelas = [t // intervalo_ns for t in timestamps]
+
+        # Posições em que cada janela começa (as colunas estão ordenadas)
+        cortes = [i for i in range(len(janelas)) if i == 0 or janelas[i] != janelas[i - 1]]
+        cortes.append(len(janelas))
+
+        resultado = []
+        for inicio_janela, fim_janela in zip(cortes, cortes[1:]):
+            valores = {}
+            for campo, coluna in colunas.items():
+                trecho = coluna[inicio_janela:fim_janela]
+                valores[f'{campo}_media'] = math.fsum(trecho) / len(trecho)
+                if extremos:
+                    valores[f'{campo}_min'] = min(trecho)
+                    valores[f'{campo}_max'] = max(trecho)
+            momento = datetime.fromtimestamp(janelas[inicio_janela] * intervalo_s, tz=timezone.utc)
+            resultado.append(formatar_leitura_agregada(valores, momento, extremos))
+        return resultado
+
+    @medir_operacao('buscar_estatisticas')
+    def buscar_estatisticas(self, hours=24, percentis=False, robo=None):
+        """
+        Calcular estatísticas das leituras (média, mín, máx, contagem, desvio padrão)
+
+        Args:
+            hours: Calcular estatísticas das últimas N horas
+            percentis: Se True, inclui também p50, p95 e p99 (exatos)
+            robo: Filtrar por robô (None = todos)
+
+        Returns:
+            dict: Dicionário com as estatísticas
+        """
+        with self._lock:
+            _, colunas = self._colunas_janela(hours, CAMPOS_ESTATISTICAS, robo)
+        return self._estatisticas(colunas, percentis)
+
+    @staticmethod
+    def _estatisticas(colunas, percentis=False):
+        """Estatísticas de cada coluna no formato de InfluxDBService.buscar_estatisticas"""
+        stats = {}
+        for campo, valores in colunas.items():
+            n = len(valores)
+            brutos = {'contagem': n}
+            if n:
+                media = math.fsum(valores) / n
+                brutos.update(media=media, minimo=min(valores), maximo=max(valores))
+                if n > 1:
+                    brutos['desvio_padrao'] = math.sqrt(
+                        math.fsum((v - media) ** 2 for v in valores) / (n - 1)
+                    )
+                if percentis:
+                    ordenados = sorted(valores)
+                    for nome, q in PERCENTIS:
+                        brutos[nome] = _quantil(ordenados, q)
+            stats[campo] = formatar_estatisticas(brutos, percentis)
+        return stats
+
+    @medir_operacao('buscar_frota')
+    def buscar_frota(self, hours=24):
+        """
+        Buscar a última leitura e as estatísticas de cada robô
+
+        Args:
+            hours: Considerar as leituras das últimas N horas
+
+        Returns:
+            list: Um dicionário por robô, ordenado por robo_id
+        """
+        with self._lock:
+            por_robo = {}
+            for posicao in self._posicoes(hours):
+                por_robo.setdefault(self._robos[posicao], []).append(posicao)
+            frota = []
+            for robo in sorted(por_robo):
+                posicoes = por_robo[robo]
+                frota.append({
+                    'robo_id': robo,
+                    'ultima_leitura': self._leitura(posicoes[-1]),
+                    'estatisticas': {
+                        campo: [self._colunas[campo][p] for p in posicoes]
+                        for campo in CAMPOS_ESTATISTICAS
+                    }
+                })
+
+        for robo in frota:
+            robo['estatisticas'] = self._estatisticas(robo['estatisticas'])
+        return frota
+
+    @medir_operacao('buscar_agregados_por_minuto')
+    def buscar_agregados_por_minuto(self, hours=24):
+        """
+        Agregados por minuto (contagem, soma, soma dos quadrados, mínimo e máximo)
+
+        Args:
+            hours: Buscar agregados das últimas N horas
+
+        Returns:
+            list: Tuplas (campo, início do minuto em epoch segundos, estatística, valor)
+        """
+        with self._lock:
+            inicio = self._inicio(hours)
+            minutos = [t // 60_000_000_000 * 60 for t in self._timestamps[inicio:]]
+            colunas = {campo: self._colunas[campo][inicio:] for campo in CAMPOS_ESTATISTICAS}
+
+        agregados = []
+        for campo, valores in colunas.items():
+            por_minuto = {}
+            for minuto, valor in zip(minutos, valores):
+                atual = por_minuto.get(minuto)
+                if atual is None:
+                    por_minuto[minuto] = [1, valor, valor * valor, valor, valor]
+                else:
+                    atual[0] += 1
+                    atual[1] += valor
+                    atual[2] += valor * valor
+                    atual[3] = min(atual[3], valor)
+                    atual[4] = max(atual[4], valor)
+            for minuto, (contagem, soma, soma_q, minimo, maximo) in por_minuto.items():
+                agregados.extend([
+                    (campo, minuto, 'contagem', float(contagem)),
+                    (campo, minuto, 'soma', soma),
+                    (campo, minuto, 'soma_q', soma_q),
+                    (campo, minuto, 'minimo', minimo),
+                    (campo, minuto, 'maximo', maximo)
+                ])
+        return agregados
+
+    def verificar_conexao(self):
+        """
+        Verificar se o armazenamento está acessível
+
+        Returns:
+            bool: True se conectado, False caso contrário
+        """
+        if self._sqlite is None:
+            return True
+        try:
+            with self._lock:
+                self._sqlite.execute('SELECT 1')
+            return True
+        except Exception as e:
+            print(f"Erro ao verificar conexão: {e}")
+            return False
+
+    def fechar(self):
+        """Fechar o banco SQLite, se houver"""
+        if self._sqlite is not None:
+            with self._lock:
+                self._sqlite.close()
+                self._sqlite = None
@@ -0,0 +1,263 @@
+"""
+Métricas da API no formato de exposição do Prometheus
+Contadores, histogramas e medidores simples, sem dependências externas
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+from fila_escrita import FilaCheiaError
+
+
+# Limites (segundos) dos buckets dos histogramas de latência
+BUCKETS_LATENCIA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _formatar_rotulos(nomes, valores, extra=''):
+    """Montar o bloco {nome="valor",...} de uma série"""
+    pares = [
+        '{}="{}"'.format(nome, str(valor).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for nome, valor in zip(nomes, valores)
+    ]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _formatar_valor(valor):
+    """Formatar número no padrão do Prometheus"""
+    if valor == float('inf'):
+        return '+Inf'
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return repr(valor)
+
+
+class Contador:
+    """Valor que só cresce (ex: leituras aceitas), com rótulos opcionais"""
+
+    tipo = 'counter'
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, valor=1, **rotulos):
+        """Somar valor à série identificada pelos rótulos"""
+        chave = tuple(rotulos[nome] for nome in self.rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def valor(self, **rotulos):
+        """Valor atual de uma série"""
+        return self._valores.get(tuple(rotulos[nome] for nome in self.rotulos), 0)
+
+    def exportar(self):
+        """Linhas da série no formato texto do Prometheus"""
+        with self._lock:
+            valores = list(self._valores.items())
+        return [
+            f'{self.nome}{_formatar_rotulos(self.rotulos, chave)} {_formatar_valor(valor)}'
+            for chave, valor in valores
+        ]
+
+
+class _Cronometro:
+    """Gerenciador de contexto que registra a duração do bloco em um histograma"""
+
+    __slots__ = ('histograma', 'chave', 'inicio')
+
+    def __init__(self, histograma, chave):
+        self.histograma = histograma
+        self.chave = chave
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *excecao):
+        self.histograma._observar(self.chave, time.perf_counter() - self.inicio)
+        return False
+
+
+class Histograma:
+    """Distribuição de valores (ex: latências) em buckets cumulativos"""
+
+    tipo = 'histogram'
+
+    def __init__(self, nome, ajuda, rotulos=(), buckets=BUCKETS_LATENCIA):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.buckets = tuple(sorted(buckets))
+        # chave -> [contagem por bucket (não cumulativa) + excedentes, soma, total]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _observar(self, chave, valor):
+        """Registrar valor em uma série já identificada"""
+        posicao = bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[chave] = serie
+            serie[0][posicao] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def observar(self, valor, **rotulos):
+        """Registrar um valor na série identificada pelos rótulos"""
+        self._observar(tuple(rotulos[nome] for nome in self.rotulos), valor)
+
+    def medir(self, **rotulos):
+        """
+        Medir a duração de um bloco
+
+        Exemplo:
+            with ETAPAS.medir(rota='leitura', etapa='validacao'):
+                ...
+        """
+        return _Cronometro(self, tuple(rotulos[nome] for nome in self.rotulos))
+
+    def exportar(self):
+        """Linhas da série no formato texto do Prometheus"""
+        with self._lock:
+            series = [(chave, list(contagens), soma, total)
+                      for chave, (contagens, soma, total) in self._series.items()]
+        linhas = []
+        for chave, contagens, soma, total in series:
+            acumulado = 0
+            for limite, contagem in zip(self.buckets + (float('inf'),), contagens):
+                acumulado += contagem
+                rotulos = _formatar_rotulos(self.rotulos, chave, f'le="{_formatar_valor(limite)}"')
+                linhas.append(f'{self.nome}_bucket{rotulos} {acumulado}')
+            rotulos = _formatar_rotulos(self.rotulos, chave)
+            linhas.append(f'{self.nome}_sum{rotulos} {_formatar_valor(soma)}')
+            linhas.append(f'{self.nome}_count{rotulos} {total}')
+        return linhas
+
+
+class Medidor:
+    """Valor lido no momento da coleta (ex: profundidade da fila)"""
+
+    def __init__(self, nome, ajuda, funcao, tipo='gauge'):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.funcao = funcao
+        self.tipo = tipo
+
+    def exportar(self):
+        """Linhas da série no formato texto do Prometheus"""
+        try:
+            valor = self.funcao()
+        except Exception as e:
+            print(f"Erro ao coletar métrica {self.nome}: {e}")
+            return []
+        return [f'{self.nome} {_formatar_valor(valor)}']
+
+
+class RegistroMetricas:
+    """Conjunto de métricas exportadas em GET /metrics"""
+
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, metrica):
+        # Registrar de novo com o mesmo nome substitui a métrica anterior
+        with self._lock:
+            self._metricas[metrica.nome] = metrica
+        return metrica
+
+    def contador(self, nome, ajuda, rotulos=()):
+        """Criar e registrar um Contador"""
+        return self._registrar(Contador(nome, ajuda, rotulos))
+
+    def histograma(self, nome, ajuda, rotulos=(), buckets=BUCKETS_LATENCIA):
+        """Criar e registrar um Histograma"""
+        return self._registrar(Histograma(nome, ajuda, rotulos, buckets))
+
+    def medidor(self, nome, ajuda, funcao, tipo='gauge'):
+        """Criar e registrar um Medidor calculado por funcao()"""
+        return self._registrar(Medidor(nome, ajuda, funcao, tipo))
+
+    def exportar(self):
+        """
+        Gerar o texto de exposição do Prometheus (versão 0.0.4)
+
+        Returns:
+            str: Todas as métricas registradas
+        """
+        with self._lock:
+            metricas = list(self._metricas.values())
+        linhas = []
+        for metrica in metricas:
+            linhas.append(f'# HELP {metrica.nome} {metrica.ajuda}')
+            linhas.append(f'# TYPE {metrica.nome} {metrica.tipo}')
+            linhas.extend(metrica.exportar())
+        return '\n'.join(linhas) + '\n'
+
+
+# Registro padrão do processo
+REGISTRO = RegistroMetricas()
+
+# Tempo de cada etapa do processamento das requisições de escrita
+ETAPAS = REGISTRO.histograma(
+    'robo_etapa_segundos', 'Duração de cada etapa do processamento de leituras',
+    ('rota', 'etapa')
+)
+
+# Leituras por resultado: aceita, rejeitada (validação) ou falha (banco)
+LEITURAS = REGISTRO.contador(
+    'robo_leituras_total', 'Leituras recebidas por resultado', ('rota', 'resultado')
+)
+
+# Operações no armazenamento
+OPERACOES_BANCO = REGISTRO.histograma(
+    'robo_banco_segundos', 'Duração das operações no armazenamento por método', ('metodo',)
+)
+ERROS_BANCO = REGISTRO.contador(
+    'robo_banco_erros_total', 'Erros nas operações no armazenamento por método', ('metodo',)
+)
+# Backpressure (fila, spool ou janela cheios): a API responde 503, mas o banco não falhou
+RECUSAS_BANCO = REGISTRO.contador(
+    'robo_banco_recusas_total', 'Escritas recusadas por fila de escrita cheia por método', ('metodo',)
+)
+
+
+def medir_operacao(metodo):
+    """
+    Decorador que mede a duração de uma operação no armazenamento e conta
+    as exceções propagadas
+
+    Erros tratados dentro do método devem ser contados com ERROS_BANCO.
+    FilaCheiaError é contada à parte, em RECUSAS_BANCO.
+
+    Args:
+        metodo: Nome usado no rótulo 'metodo'
+    """
+    def decorador(funcao):
+        chave = (metodo,)
+
+        @wraps(funcao)
+        def envolvida(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return funcao(*args, **kwargs)
+            except FilaCheiaError:
+                RECUSAS_BANCO.incrementar(metodo=metodo)
+                raise
+            except Exception:
+                ERROS_BANCO.incrementar(metodo=metodo)
+                raise
+            finally:
+                OPERACOES_BANCO._observar(chave, time.perf_counter() - inicio)
+        return envolvida
+    return decorador
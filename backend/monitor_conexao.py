@@ -0,0 +1,158 @@
+"""
+Monitor da conexão com o banco em segundo plano
+Mede periodicamente a latência de query e de escrita e o acúmulo das
+filas de escrita; GET /health responde com o último estado medido, sem
+consultar o banco a cada verificação do balanceador
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+
+
+ESTADO_OK = 'OK'
+ESTADO_DEGRADADO = 'DEGRADADO'
+ESTADO_ERRO = 'ERRO'
+
+# Valor numérico de cada estado (medidor do /metrics)
+CODIGOS_ESTADO = {ESTADO_OK: 0, ESTADO_DEGRADADO: 1, ESTADO_ERRO: 2}
+
+
+class MonitorConexao:
+    """Thread que verifica o banco em intervalos fixos e guarda o último resultado"""
+
+    def __init__(self, service, intervalo_s=10, latencia_degradada_ms=1000,
+                 backlog_degradado=0.5, sonda_escrita=True):
+        """
+        Inicializar monitor e executar a primeira verificação
+
+        Args:
+            service: Serviço de armazenamento (verificar_conexao e, se existir,
+                     sondar_escrita, fila e spool)
+            intervalo_s: Intervalo entre verificações
+            latencia_degradada_ms: Latência de query ou escrita acima da qual
+                                   o estado passa a DEGRADADO
+            backlog_degradado: Fração ocupada da fila/spool de escrita acima da
+                               qual o estado passa a DEGRADADO
+            sonda_escrita: Se True, mede também a latência de uma escrita
+        """
+        self.service = service
+        self.intervalo_s = intervalo_s
+        self.latencia_degradada_ms = latencia_degradada_ms
+        self.backlog_degradado = backlog_degradado
+        self.sonda_escrita = sonda_escrita and hasattr(service, 'sondar_escrita')
+
+        self.verificacoes = 0
+        self.falhas_consecutivas = 0
+
+        self._lock = threading.Lock()
+        self._estado = None
+        self._instante = 0.0
+        self._verificar()
+
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._executar, name='monitor-conexao', daemon=True)
+        self._thread.start()
+
+    def _medir(self, funcao):
+        """Executar uma sonda e retornar (sucesso, latência em ms)"""
+        inicio = time.perf_counter()
+        try:
+            sucesso = bool(funcao())
+        except Exception as e:
+            print(f"Erro no monitor de conexão: {e}")
+            sucesso = False
+        return sucesso, round((time.perf_counter() - inicio) * 1000, 1)
+
+    def backlog(self):
+        """
+        Ocupação das filas de escrita do serviço
+
+        Returns:
+            dict: Pendências de cada fila e a maior fração ocupada (0 a 1)
+        """
+        resultado = {'fracao': 0.0}
+        fila = getattr(self.service, 'fila', None)
+        if fila is not None:
+            resultado['fila_leituras'] = fila.profundidade()
+            resultado['fracao'] = max(resultado['fracao'], fila.profundidade() / fila.capacidade())
+        spool = getattr(self.service, 'spool', None)
+        if spool is not None:
+            resultado['spool_bytes'] = spool.pendentes_bytes()
+            if spool.max_bytes:
+                resultado['fracao'] = max(resultado['fracao'],
+                                          spool.pendentes_bytes() / spool.max_bytes)
+        resultado['fracao'] = round(resultado['fracao'], 3)
+        return resultado
+
+    def _verificar(self):
+        """Executar as sondas e substituir o estado guardado"""
+        conectado, latencia_query = self._medir(self.service.verificar_conexao)
+        latencia_escrita = None
+        if conectado and self.sonda_escrita:
+            conectado, latencia_escrita = self._medir(self.service.sondar_escrita)
+        backlog = self.backlog()
+
+        motivos = []
+        if not conectado:
+            estado = ESTADO_ERRO
+            motivos.append('banco de dados inacessível')
+        else:
+            if latencia_query > self.latencia_degradada_ms:
+                motivos.append(f'latência de query {latencia_query} ms')
+            if latencia_escrita is not None and latencia_escrita > self.latencia_degradada_ms:
+                motivos.append(f'latência de escrita {latencia_escrita} ms')
+            if backlog['fracao'] > self.backlog_degradado:
+                motivos.append(f'fila de escrita {backlog["fracao"]:.0%} ocupada')
+            estado = ESTADO_DEGRADADO if motivos else ESTADO_OK
+
+        self.verificacoes += 1
+        self.falhas_consecutivas = 0 if conectado else self.falhas_consecutivas + 1
+        with self._lock:
+            self._estado = {
+                'status': estado,
+                'banco_dados': 'conectado' if conectado else 'desconectado',
+                'latencia_query_ms': latencia_query,
+                'latencia_escrita_ms': latencia_escrita,
+                'backlog': backlog,
+                'motivos': motivos,
+                'verificado_em': datetime.now(timezone.utc).isoformat()
+            }
+            self._instante = time.monotonic()
+
+    def _executar(self):
+        """Loop da thread de verificação"""
+        while not self._parar.wait(self.intervalo_s):
+            try:
+                self._verificar()
+            except Exception as e:
+                print(f"Erro no monitor de conexão: {e}")
+
+    def estado(self):
+        """
+        Último estado medido, sem acessar o banco
+
+        Se a última verificação for mais antiga que três intervalos (ex: a
+        sonda travou), o estado é ERRO, pois o resultado guardado não é
+        mais confiável.
+
+        Returns:
+            dict: status, banco_dados, latências, backlog, motivos e idade_s
+        """
+        with self._lock:
+            estado = dict(self._estado)
+            idade = time.monotonic() - self._instante
+        estado['idade_s'] = round(idade, 1)
+        if idade > 3 * self.intervalo_s:
+            estado['status'] = ESTADO_ERRO
+            estado['motivos'] = estado['motivos'] + ['monitor sem verificação recente']
+        return estado
+
+    def codigo_estado(self):
+        """Estado atual como número (0 = OK, 1 = DEGRADADO, 2 = ERRO)"""
+        return CODIGOS_ESTADO[self.estado()['status']]
+
+    def fechar(self, timeout=5):
+        """Parar a thread de verificação"""
+        self._parar.set()
+        self._thread.join(timeout=timeout)
@@ -0,0 +1,98 @@
+"""
+Profiler por amostragem para investigar o consumo de CPU em produção
+Lê periodicamente a pilha de todas as threads (sys._current_frames) e
+conta as pilhas no formato "folded", aceito por ferramentas de flame graph
+"""
+
+import os
+import sys
+import threading
+
+
+class AmostradorPerfil:
+    """Amostrador de pilhas que pode ser ligado e desligado em tempo de execução"""
+
+    def __init__(self, intervalo_ms=10, max_pilhas=10000):
+        """
+        Inicializar amostrador (parado)
+
+        Args:
+            intervalo_ms: Intervalo entre amostras
+            max_pilhas: Número máximo de pilhas distintas guardadas
+        """
+        self.intervalo = intervalo_ms / 1000.0
+        self.max_pilhas = max_pilhas
+        self.amostras = 0
+        self._pilhas = {}
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+
+    @property
+    def ativo(self):
+        """Se o amostrador está coletando"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def iniciar(self, intervalo_ms=None):
+        """
+        Iniciar a coleta (as contagens anteriores são mantidas)
+
+        Returns:
+            bool: False se já estava ativo
+        """
+        if self.ativo:
+            return False
+        if intervalo_ms:
+            self.intervalo = intervalo_ms / 1000.0
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._executar, name='perfil', daemon=True)
+        self._thread.start()
+        return True
+
+    def parar(self):
+        """Parar a coleta"""
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def limpar(self):
+        """Descartar as amostras coletadas"""
+        with self._lock:
+            self._pilhas = {}
+            self.amostras = 0
+
+    def _executar(self):
+        """Loop da thread de amostragem"""
+        propria = threading.get_ident()
+        while not self._parar.wait(self.intervalo):
+            nomes = {thread.ident: thread.name for thread in threading.enumerate()}
+            pilhas = []
+            for ident, frame in sys._current_frames().items():
+                if ident == propria:
+                    continue
+                quadros = []
+                while frame is not None:
+                    codigo = frame.f_code
+                    quadros.append(f'{os.path.basename(codigo.co_filename)}:{codigo.co_name}')
+                    frame = frame.f_back
+                quadros.append(nomes.get(ident, str(ident)))
+                pilhas.append(';'.join(reversed(quadros)))
+
+            with self._lock:
+                self.amostras += 1
+                for pilha in pilhas:
+                    if pilha not in self._pilhas and len(self._pilhas) >= self.max_pilhas:
+                        pilha = '[outras]'
+                    self._pilhas[pilha] = self._pilhas.get(pilha, 0) + 1
+
+    def exportar(self):
+        """
+        Pilhas coletadas no formato folded ("thread;arquivo:função;... contagem")
+
+        Returns:
+            str: Uma pilha por linha, da mais frequente para a menos frequente
+        """
+        with self._lock:
+            pilhas = sorted(self._pilhas.items(), key=lambda item: item[1], reverse=True)
+        return ''.join(f'{pilha} {contagem}\n' for pilha, contagem in pilhas)
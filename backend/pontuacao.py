@@ -0,0 +1,333 @@
+"""
+Pontuação das leituras no servidor, vetorizada com NumPy
+Recalcula a probabilidade de vida com as regras do firmware e marca
+anomalias por z-score móvel de cada campo, por robô
+
+Os resultados são gravados como campos extras da leitura
+(influxdb_service.CAMPOS_PONTUACAO). Também pode ser executado como
+script para reprocessar o histórico ou medir a vazão:
+    python pontuacao.py --reprocessar --hours 720
+    python pontuacao.py --benchmark 5000000
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+try:
+    import numpy as np
+except ImportError:  # dependência opcional
+    np = None
+
+sys.path.append(os.path.dirname(__file__))
+
+from influxdb_service import CAMPOS_PONTUACAO, ROBO_PADRAO, formatar_rfc3339
+
+
+# Regras de calcularProbabilidade() em esp32/robo_espacial_completo.ino:
+# (campo, mínimo, máximo ou None, pontos somados quando o valor está na faixa)
+REGRAS_PROBABILIDADE = [
+    ('temperatura_c', 15, 30, 25),
+    ('umidade_pct', 40, 70, 25),
+    ('luminosidade', 2000, None, 20),
+    ('presenca', 1, None, 30)
+]
+
+CAMPO_PROBABILIDADE = 'probabilidade_calculada'
+
+# Campos contínuos com detecção de anomalia (presença é binária)
+CAMPOS_ANOMALIA = ['temperatura_c', 'umidade_pct', 'luminosidade']
+
+CAMPOS_ENTRADA = sorted({regra[0] for regra in REGRAS_PROBABILIDADE} | set(CAMPOS_ANOMALIA))
+
+
+def probabilidade_vida(colunas):
+    """
+    Calcular a probabilidade de vida de todas as leituras de uma vez
+
+    Args:
+        colunas: campo -> array NumPy com os valores
+
+    Returns:
+        ndarray: Probabilidade (0-100) de cada leitura
+    """
+    total = None
+    for campo, minimo, maximo, pontos in REGRAS_PROBABILIDADE:
+        valores = colunas[campo]
+        na_faixa = valores >= minimo
+        if maximo is not None:
+            na_faixa &= valores <= maximo
+        parcela = na_faixa * float(pontos)
+        total = parcela if total is None else total + parcela
+    return np.clip(total, 0.0, 100.0)
+
+
+def zscore_movel(valores, inicios, janela):
+    """
+    z-score de cada valor em relação aos `janela` valores anteriores do mesmo grupo
+
+    Usa somas acumuladas (O(n) para qualquer janela). Os valores de cada
+    grupo são deslocados pelo primeiro valor do grupo para reduzir o erro
+    numérico da soma dos quadrados.
+
+    Args:
+        valores: Valores ordenados por grupo e, dentro do grupo, por tempo
+        inicios: Para cada posição, o índice da primeira linha do seu grupo
+        janela: Número de valores anteriores considerados
+
+    Returns:
+        ndarray: z-score, NaN onde o grupo ainda não tem `janela` valores anteriores
+    """
+    n = len(valores)
+    z = np.full(n, np.nan)
+    if n <= janela:
+        return z
+
+    deslocados = valores - valores[inicios]
+    soma = np.concatenate(([0.0], np.cumsum(deslocados)))
+    soma_q = np.concatenate(([0.0], np.cumsum(deslocados * deslocados)))
+
+    # Janela [i - janela, i) para todo i >= janela, com fatias deslocadas
+    # (sem indexação por array); janelas que cruzam grupos são descartadas abaixo
+    soma_janela = soma[janela:n] - soma[:n - janela]
+    soma_q_janela = soma_q[janela:n] - soma_q[:n - janela]
+    media = soma_janela / janela
+    variancia = np.maximum((soma_q_janela - soma_janela * media) / (janela - 1), 0.0)
+    desvio = np.sqrt(variancia)
+
+    # Histórico constante: sem como medir o desvio, não marca anomalia
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z[janela:] = np.where(desvio > 0, (deslocados[janela:] - media) / desvio, 0.0)
+    z[np.arange(n) - inicios < janela] = np.nan
+    return z
+
+
+class PontuadorLeituras:
+    """Pontuação com o histórico recente de cada robô mantido entre lotes"""
+
+    def __init__(self, janela=60, limiar=3.0):
+        """
+        Inicializar pontuador
+
+        Args:
+            janela: Leituras anteriores usadas no z-score móvel (mínimo 2)
+            limiar: |z| acima do qual a leitura é marcada como anômala
+        """
+        if np is None:
+            raise RuntimeError('Pontuação requer o pacote numpy')
+        self.janela = max(2, int(janela))
+        self.limiar = limiar
+        # robo -> campo -> últimos `janela` valores
+        self._historico = {}
+        self._lock = threading.Lock()
+
+    def pontuar_colunas(self, colunas, robos):
+        """
+        Pontuar leituras em formato colunar (em ordem cronológica por robô)
+
+        Args:
+            colunas: campo -> array NumPy (CAMPOS_ENTRADA)
+            robos: Sequência com o robô de cada leitura
+
+        Returns:
+            dict: Campo de CAMPOS_PONTUACAO -> array na ordem de entrada
+        """
+        n = len(robos)
+        resultado = {CAMPO_PROBABILIDADE: probabilidade_vida(colunas)}
+        if n == 0:
+            for campo in CAMPOS_ANOMALIA:
+                resultado[f'anomalia_{campo}'] = np.zeros(0, dtype=np.int8)
+            return resultado
+
+        # Agrupar por robô mantendo a ordem dentro de cada grupo
+        # (códigos inteiros: ordenar strings com np.unique é dezenas de vezes mais lento)
+        nomes = list(dict.fromkeys(robos))
+        codigos = {nome: indice for indice, nome in enumerate(nomes)}
+        grupo = np.fromiter(map(codigos.__getitem__, robos), dtype=np.int32, count=n)
+        # Com até 2^15 robôs, int16 permite ordenação radix (linear) no NumPy
+        ordem = np.argsort(grupo.astype(np.int16) if len(nomes) < 2 ** 15 else grupo, kind='stable')
+        contagens = np.bincount(grupo, minlength=len(nomes))
+
+        # Serialização por lote: o histórico de um robô não pode mudar no meio
+        with self._lock:
+            historicos = [self._historico.get(nome, {}) for nome in nomes]
+
+            # Em cada grupo, o histórico vem antes das leituras novas
+            tamanhos_historico = np.array(
+                [len(h.get(CAMPOS_ANOMALIA[0], ())) for h in historicos], dtype=np.int64
+            )
+            tamanhos = tamanhos_historico + contagens
+            inicios_grupo = np.concatenate(([0], np.cumsum(tamanhos)[:-1]))
+            inicios = np.repeat(inicios_grupo, tamanhos)
+            novas = np.ones(int(tamanhos.sum()), dtype=bool)
+            for inicio, tamanho in zip(inicios_grupo, tamanhos_historico):
+                novas[inicio:inicio + tamanho] = False
+
+            limites = np.concatenate(([0], np.cumsum(contagens)))
+            for campo in CAMPOS_ANOMALIA:
+                ordenados = np.asarray(colunas[campo], dtype=np.float64)[ordem]
+                partes = []
+                for k, historico in enumerate(historicos):
+                    partes.append(historico.get(campo, np.zeros(0)))
+                    partes.append(ordenados[limites[k]:limites[k + 1]])
+                combinados = np.concatenate(partes)
+
+                z = zscore_movel(combinados, inicios, self.janela)[novas]
+                marcados = np.zeros(n, dtype=np.int8)
+                # NaN (sem histórico suficiente) compara como False
+                marcados[ordem] = np.abs(z) > self.limiar
+                resultado[f'anomalia_{campo}'] = marcados
+
+                fins = inicios_grupo + tamanhos
+                for k, nome in enumerate(nomes):
+                    self._historico.setdefault(nome, {})[campo] = \
+                        combinados[max(inicios_grupo[k], fins[k] - self.janela):fins[k]].copy()
+        return resultado
+
+    def pontuar(self, leituras):
+        """
+        Pontuar leituras validadas, adicionando CAMPOS_PONTUACAO a cada uma
+
+        Args:
+            leituras: Lista de dicionários (alterados in-place)
+        """
+        if not leituras:
+            return
+        colunas = {
+            campo: np.fromiter((dados[campo] for dados in leituras), dtype=np.float64,
+                               count=len(leituras))
+            for campo in CAMPOS_ENTRADA
+        }
+        robos = [dados.get('robo_id', ROBO_PADRAO) for dados in leituras]
+        resultado = self.pontuar_colunas(colunas, robos)
+        convertidos = [
+            (campo, resultado[campo].astype(float if tipo is float else int).tolist())
+            for campo, tipo in CAMPOS_PONTUACAO
+        ]
+        for indice, dados in enumerate(leituras):
+            for campo, valores in convertidos:
+                dados[campo] = valores[indice]
+
+
+def query_reprocessar(bucket, inicio, fim):
+    """Query Flux das leituras de [inicio, fim), em ordem cronológica"""
+    conjunto = ', '.join(f'"{campo}"' for campo in CAMPOS_ENTRADA)
+    return f'''
+    from(bucket: "{bucket}")
+        |> range(start: {formatar_rfc3339(inicio)}, stop: {formatar_rfc3339(fim)})
+        |> filter(fn: (r) => r["_measurement"] == "leitura_sensores")
+        |> filter(fn: (r) => contains(value: r["_field"], set: [{conjunto}]))
+        |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
+        |> group()
+        |> sort(columns: ["_time"])
+    '''
+
+
+def reprocessar(service, hours, horas_por_lote=24, janela=60, limiar=3.0):
+    """
+    Recalcular os campos de pontuação das leituras já gravadas
+
+    Cada fatia de tempo é lida, pontuada e regravada com os mesmos
+    timestamps e tags (o InfluxDB mescla os campos no mesmo ponto).
+
+    Returns:
+        int: Número de leituras reprocessadas
+    """
+    pontuador = PontuadorLeituras(janela, limiar)
+    fim_total = datetime.now(timezone.utc)
+    inicio = fim_total - timedelta(hours=hours)
+    total = 0
+    while inicio < fim_total:
+        fim = min(inicio + timedelta(hours=horas_por_lote), fim_total)
+        tempos, robos = [], []
+        valores = {campo: [] for campo in CAMPOS_ENTRADA}
+        for record in service.query_api.query_stream(
+                org=service.org, query=query_reprocessar(service.bucket, inicio, fim)):
+            tempos.append(record.get_time())
+            robos.append(record.values.get('robo', ROBO_PADRAO))
+            for campo in CAMPOS_ENTRADA:
+                valores[campo].append(record.values.get(campo) or 0)
+
+        if tempos:
+            colunas = {campo: np.asarray(lista, dtype=np.float64) for campo, lista in valores.items()}
+            resultado = pontuador.pontuar_colunas(colunas, robos)
+            linhas = []
+            for indice, momento in enumerate(tempos):
+                campos = ','.join(
+                    f'{campo}={resultado[campo][indice]}' if tipo is float
+                    else f'{campo}={int(resultado[campo][indice])}i'
+                    for campo, tipo in CAMPOS_PONTUACAO
+                )
+                timestamp_ns = int(momento.timestamp()) * 1_000_000_000 + momento.microsecond * 1000
+                linhas.append(f'leitura_sensores,robo={robos[indice]} {campos} {timestamp_ns}')
+            for posicao in range(0, len(linhas), 5000):
+                service.write_api.write(bucket=service.bucket, org=service.org,
+                                        record=linhas[posicao:posicao + 5000])
+            total += len(linhas)
+            print(f"🔁 {formatar_rfc3339(inicio)} .. {formatar_rfc3339(fim)}: {len(linhas)} leituras")
+        inicio = fim
+    return total
+
+
+def benchmark(quantidade, robos=100, janela=60):
+    """Medir a vazão da pontuação com dados sintéticos"""
+    gerador = np.random.default_rng(42)
+    colunas = {
+        'temperatura_c': gerador.normal(25, 3, quantidade),
+        'umidade_pct': gerador.normal(55, 8, quantidade),
+        'luminosidade': gerador.integers(0, 4096, quantidade).astype(np.float64),
+        'presenca': gerador.integers(0, 2, quantidade).astype(np.float64)
+    }
+    ids = np.array([f'robo_{i:03d}' for i in range(robos)], dtype=object)[
+        gerador.integers(0, robos, quantidade)
+    ]
+    pontuador = PontuadorLeituras(janela)
+    inicio = time.perf_counter()
+    resultado = pontuador.pontuar_colunas(colunas, ids)
+    duracao = time.perf_counter() - inicio
+    anomalias = int(sum(resultado[f'anomalia_{campo}'].sum() for campo in CAMPOS_ANOMALIA))
+    print(f"📊 {quantidade} leituras de {robos} robôs em {duracao:.3f}s "
+          f"({quantidade / duracao:,.0f} leituras/s, {anomalias} anomalias)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pontuação vetorizada das leituras')
+    parser.add_argument('--reprocessar', action='store_true',
+                        help='Recalcular a pontuação das leituras gravadas no InfluxDB')
+    parser.add_argument('--hours', type=int, default=24, help='Período reprocessado')
+    parser.add_argument('--horas-por-lote', type=int, default=24, help='Tamanho de cada fatia lida')
+    parser.add_argument('--janela', type=int, default=int(os.getenv('PONTUACAO_JANELA', 60)))
+    parser.add_argument('--limiar', type=float, default=float(os.getenv('PONTUACAO_LIMIAR', 3.0)))
+    parser.add_argument('--benchmark', type=int, metavar='N',
+                        help='Pontuar N leituras sintéticas e medir a vazão')
+    args = parser.parse_args()
+
+    if np is None:
+        parser.error('requer o pacote numpy')
+    if args.benchmark:
+        benchmark(args.benchmark, janela=args.janela)
+    elif args.reprocessar:
+        from dotenv import load_dotenv
+        from influxdb_service import InfluxDBService
+
+        load_dotenv()
+        service = InfluxDBService(
+            url=os.getenv('INFLUXDB_URL'),
+            token=os.getenv('INFLUXDB_TOKEN'),
+            org=os.getenv('INFLUXDB_ORG'),
+            bucket=os.getenv('INFLUXDB_BUCKET')
+        )
+        try:
+            total = reprocessar(service, args.hours, args.horas_por_lote, args.janela, args.limiar)
+            print(f"✅ {total} leituras reprocessadas")
+        finally:
+            service.fechar()
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,534 @@
+"""
+Rollups contínuos das leituras no InfluxDB
+Uma thread compacta as leituras brutas em measurements pré-agregados por
+minuto e por hora, usados nas consultas de períodos longos
+
+Leituras gravadas com mais de ROLLUPS_ATRASO_S de atraso (lotes offline,
+importações) ficam fora dos rollups até o período ser reconstruído:
+    python rollups.py reconstruir --inicio 2024-01-01 --fim 2024-02-01
+    python rollups.py reconstruir --hours 48
+"""
+
+import argparse
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava, todo processo compacta
+    fcntl = None
+
+from influxdb_service import (
+    CAMPOS_AGREGADOS, CAMPOS_ESTATISTICAS, formatar_estatisticas,
+    formatar_leitura_agregada, formatar_rfc3339
+)
+
+
+# Rollups do mais fino para o mais grosso: (resolução em segundos, measurement)
+ROLLUPS = [
+    (60, 'leitura_sensores_1m'),
+    (3600, 'leitura_sensores_1h')
+]
+
+# Estatísticas gravadas por campo ('<campo>_<estatística>'); somáveis entre janelas
+ESTATISTICAS_SOMAVEIS = ['contagem', 'soma', 'soma_q']
+
+# Uma resolução atende uma janela se representar no máximo esta fração dela
+FRACAO_MAXIMA_RESOLUCAO = 0.01
+
+# Período compactado a cada passo do preenchimento retroativo
+PASSO_PREENCHIMENTO_S = 24 * 3600
+
+# Fim das queries de compactação: to() devolve as linhas gravadas, que são
+# descartadas no servidor em vez de baixadas
+SEM_RESULTADO = '|> filter(fn: (r) => false)'
+
+
+def separar_campo(nome):
+    """
+    Separar um field de rollup em (campo, estatística)
+
+    Ex: 'temperatura_c_soma_q' -> ('temperatura_c', 'soma_q')
+    """
+    for estatistica in ('soma_q', 'contagem', 'soma', 'minimo', 'maximo'):
+        sufixo = '_' + estatistica
+        if nome.endswith(sufixo):
+            return nome[:-len(sufixo)], estatistica
+    return nome, None
+
+
+def _literal_tempo(epoch):
+    """Literal de tempo Flux para um epoch em segundos"""
+    return formatar_rfc3339(datetime.fromtimestamp(epoch, tz=timezone.utc))
+
+
+def query_compactar_brutas(bucket, org, inicio, fim):
+    """
+    Montar a query Flux que grava o rollup de 1 minuto a partir das leituras brutas
+
+    Args:
+        bucket: Nome do bucket (origem e destino)
+        org: Nome da organização
+        inicio: Início do período (epoch segundos, alinhado ao minuto)
+        fim: Fim do período (epoch segundos)
+
+    Returns:
+        str: Query Flux
+    """
+    conjunto = ', '.join(f'"{campo}"' for campo in CAMPOS_AGREGADOS)
+    janela = 'every: 1m, createEmpty: false, timeSrc: "_start"'
+
+    return f'''
+    dados = from(bucket: "{bucket}")
+        |> range(start: {_literal_tempo(inicio)}, stop: {_literal_tempo(fim)})
+        |> filter(fn: (r) => r["_measurement"] == "leitura_sensores")
+        |> filter(fn: (r) => contains(value: r["_field"], set: [{conjunto}]))
+        |> toFloat()
+        |> group(columns: ["_field"])
+
+    union(tables: [
+        dados |> aggregateWindow({janela}, fn: count) |> toFloat() |> set(key: "estatistica", value: "contagem"),
+        dados |> aggregateWindow({janela}, fn: sum) |> set(key: "estatistica", value: "soma"),
+        dados |> map(fn: (r) => ({{r with _value: r._value * r._value}})) |> aggregateWindow({janela}, fn: sum) |> set(key: "estatistica", value: "soma_q"),
+        dados |> aggregateWindow({janela}, fn: min) |> set(key: "estatistica", value: "minimo"),
+        dados |> aggregateWindow({janela}, fn: max) |> set(key: "estatistica", value: "maximo")
+    ])
+        |> group()
+        |> map(fn: (r) => ({{r with _measurement: "{ROLLUPS[0][1]}", _field: r._field + "_" + r.estatistica}}))
+        |> keep(columns: ["_time", "_measurement", "_field", "_value"])
+        |> to(bucket: "{bucket}", org: "{org}")
+        {SEM_RESULTADO}
+    '''
+
+
+def query_compactar_rollup(bucket, org, inicio, fim, origem, destino, resolucao_s):
+    """
+    Montar a query Flux que grava um rollup mais grosso a partir de outro rollup
+
+    Contagens e somas são somadas; mínimos e máximos são combinados.
+
+    Args:
+        bucket: Nome do bucket (origem e destino)
+        org: Nome da organização
+        inicio: Início do período (epoch segundos, alinhado à resolução)
+        fim: Fim do período (epoch segundos)
+        origem: Measurement do rollup mais fino
+        destino: Measurement do rollup gravado
+        resolucao_s: Resolução do rollup gravado
+
+    Returns:
+        str: Query Flux
+    """
+    somaveis = '|'.join(ESTATISTICAS_SOMAVEIS)
+    janela = f'every: {resolucao_s}s, createEmpty: false, timeSrc: "_start"'
+
+    return f'''
+    dados = from(bucket: "{bucket}")
+        |> range(start: {_literal_tempo(inicio)}, stop: {_literal_tempo(fim)})
+        |> filter(fn: (r) => r["_measurement"] == "{origem}")
+        |> group(columns: ["_field"])
+
+    union(tables: [
+        dados |> filter(fn: (r) => r["_field"] =~ /_({somaveis})$/) |> aggregateWindow({janela}, fn: sum),
+        dados |> filter(fn: (r) => r["_field"] =~ /_minimo$/) |> aggregateWindow({janela}, fn: min),
+        dados |> filter(fn: (r) => r["_field"] =~ /_maximo$/) |> aggregateWindow({janela}, fn: max)
+    ])
+        |> set(key: "_measurement", value: "{destino}")
+        |> keep(columns: ["_time", "_measurement", "_field", "_value"])
+        |> to(bucket: "{bucket}", org: "{org}")
+        {SEM_RESULTADO}
+    '''
+
+
+def compactar(service, inicio, fim):
+    """
+    Compactar [inicio, fim) em todos os rollups, do mais fino ao mais grosso
+
+    Regravar um período apenas substitui os mesmos pontos.
+
+    Args:
+        service: InfluxDBService usado nas queries
+        inicio: Início do período (epoch segundos)
+        fim: Fim do período (epoch segundos)
+    """
+    bucket, org = service.bucket, service.org
+
+    inicio_bruto = inicio - inicio % ROLLUPS[0][0]
+    service.query_api.query(org=org, query=query_compactar_brutas(bucket, org, inicio_bruto, fim))
+    for (_, origem), (resolucao, destino) in zip(ROLLUPS, ROLLUPS[1:]):
+        inicio_rollup = inicio - inicio % resolucao
+        service.query_api.query(org=org, query=query_compactar_rollup(
+            bucket, org, inicio_rollup, fim, origem, destino, resolucao
+        ))
+
+
+def reconstruir(service, inicio, fim):
+    """
+    Recompactar um período inteiro, um dia por vez (ex: após importar leituras antigas)
+
+    Args:
+        service: InfluxDBService usado nas queries
+        inicio: Início do período (epoch segundos)
+        fim: Fim do período (epoch segundos)
+
+    Returns:
+        int: Número de passos compactados
+    """
+    # Alinhado à hora: cada passo recalcula horas completas do rollup de 1 hora
+    passo_inicio = inicio - inicio % ROLLUPS[-1][0]
+    passos = 0
+    while passo_inicio < fim:
+        passo_fim = min(passo_inicio + PASSO_PREENCHIMENTO_S, fim)
+        compactar(service, passo_inicio, passo_fim)
+        passo_inicio = passo_fim
+        passos += 1
+    return passos
+
+
+class CompactadorRollups:
+    """Mantém os rollups atualizados e escolhe qual deles atende cada consulta"""
+
+    def __init__(self, service, intervalo_s=60, atraso_s=300, preenchimento_horas=720,
+                 arquivo_estado=None):
+        """
+        Inicializar compactador e thread de atualização
+
+        Com arquivo_estado, só o processo que trava o arquivo (flock) compacta
+        e publica nele o período coberto; os demais processos (workers do
+        Gunicorn) apenas leem o estado para escolher os rollups. Se o processo
+        que compacta sair, outro assume a trava e continua de onde ele parou.
+
+        Args:
+            service: InfluxDBService usado nas queries
+            intervalo_s: Intervalo entre compactações do período recente
+            atraso_s: Tolerância para leituras que chegam atrasadas (recompactadas)
+            preenchimento_horas: Quanto do histórico compactar retroativamente ao iniciar
+            arquivo_estado: Arquivo JSON compartilhado entre os processos
+                            (None = este processo sempre compacta)
+        """
+        self.service = service
+        self.intervalo_s = intervalo_s
+        self.atraso_s = atraso_s
+        self.preenchimento_horas = preenchimento_horas
+        self.arquivo_estado = arquivo_estado
+        self._trava = None
+        self.compacta = False
+
+        # Período coberto pelos rollups: [cobertura_desde, atualizado_ate]
+        self.cobertura_desde = None
+        self.atualizado_ate = None
+        # Próximo trecho do histórico a preencher (anda para trás)
+        self._preencher_ate = None
+
+        self.compactacoes = 0
+        self.falhas = 0
+
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._executar, name='rollups', daemon=True)
+        self._thread.start()
+
+    def _compactar(self, inicio, fim):
+        """Compactar [inicio, fim) em todos os rollups"""
+        compactar(self.service, inicio, fim)
+        self.compactacoes += 1
+
+    def _ocupar_trava(self):
+        """Tentar ser o processo que compacta (True se já é)"""
+        if self.compacta:
+            return True
+        if self.arquivo_estado is None or fcntl is None:
+            self.compacta = True
+            return True
+        trava = open(self.arquivo_estado + '.trava', 'a')
+        try:
+            fcntl.flock(trava.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            trava.close()
+            return False
+        self._trava = trava
+        self.compacta = True
+        # Continuar o trabalho do processo anterior, se ele parou há pouco
+        self.cobertura_desde = self.atualizado_ate = self._preencher_ate = None
+        self._ler_estado(assumir=True)
+        return True
+
+    def _ler_estado(self, assumir=False):
+        """Carregar o período coberto publicado pelo processo que compacta"""
+        try:
+            with open(self.arquivo_estado) as arquivo:
+                estado = json.load(arquivo)
+            cobertura_desde = float(estado['cobertura_desde'])
+            atualizado_ate = float(estado['atualizado_ate'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+        if assumir:
+            # Estado antigo: recomeçar pelo último dia em vez de compactar o intervalo parado
+            if time.time() - atualizado_ate > 3 * self.intervalo_s:
+                return
+            self._preencher_ate = cobertura_desde
+        self.atualizado_ate = atualizado_ate
+        self.cobertura_desde = cobertura_desde
+
+    def _salvar_estado(self):
+        """Publicar o período coberto (arquivo temporário + rename)"""
+        if self.arquivo_estado is None:
+            return
+        temporario = self.arquivo_estado + '.tmp'
+        with open(temporario, 'w') as arquivo:
+            json.dump({'cobertura_desde': self.cobertura_desde,
+                       'atualizado_ate': self.atualizado_ate}, arquivo)
+        os.replace(temporario, self.arquivo_estado)
+
+    def _executar(self):
+        """Loop da thread: compactar (no processo com a trava) ou seguir o estado publicado"""
+        while True:
+            if self._ocupar_trava():
+                # Continuar o preenchimento sem esperar o intervalo
+                if self._atualizar() and not self._parar.is_set():
+                    continue
+            else:
+                self._ler_estado()
+
+            if self._parar.wait(self.intervalo_s):
+                return
+
+    def _atualizar(self):
+        """
+        Atualizar o período recente e dar um passo do preenchimento retroativo
+
+        Returns:
+            bool: True se ainda há histórico a preencher
+        """
+        agora = time.time()
+        try:
+            if self.atualizado_ate is None:
+                # Primeira compactação: o último dia, alinhado à hora
+                inicio = agora - PASSO_PREENCHIMENTO_S
+                inicio -= inicio % ROLLUPS[-1][0]
+                self._compactar(inicio, agora)
+                self.cobertura_desde = self._preencher_ate = inicio
+            else:
+                # Recompactar desde a última execução, com folga para atrasos
+                self._compactar(self.atualizado_ate - self.atraso_s, agora)
+            self.atualizado_ate = agora
+
+            # Um passo do preenchimento retroativo por ciclo
+            limite = agora - self.preenchimento_horas * 3600
+            if self._preencher_ate > limite:
+                inicio = max(self._preencher_ate - PASSO_PREENCHIMENTO_S, limite)
+                inicio -= inicio % ROLLUPS[-1][0]
+                self._compactar(inicio, self._preencher_ate)
+                self.cobertura_desde = self._preencher_ate = inicio
+            self._salvar_estado()
+            return self._preencher_ate > limite
+
+        except Exception as e:
+            self.falhas += 1
+            print(f"Erro ao compactar rollups: {e}")
+            return False
+
+    def resolucao_para(self, hours, intervalo_s=None):
+        """
+        Escolher o rollup mais grosso que atende a consulta
+
+        Args:
+            hours: Janela da consulta em horas
+            intervalo_s: Se informado, a resolução precisa dividir este intervalo
+
+        Returns:
+            tuple: (resolução, measurement), ou None para usar as leituras brutas
+        """
+        agora = time.time()
+        if self.cobertura_desde is None or self.cobertura_desde > agora - hours * 3600:
+            return None
+        # Compactação parada: os rollups podem estar desatualizados
+        if agora - self.atualizado_ate > 3 * self.intervalo_s:
+            return None
+
+        for resolucao, measurement in reversed(ROLLUPS):
+            if intervalo_s is not None:
+                if intervalo_s % resolucao == 0:
+                    return resolucao, measurement
+            elif resolucao <= hours * 3600 * FRACAO_MAXIMA_RESOLUCAO:
+                return resolucao, measurement
+        return None
+
+    def buscar_estatisticas(self, hours, measurement):
+        """
+        Calcular média, mín, máx, contagem e desvio padrão a partir de um rollup
+
+        Args:
+            hours: Janela em horas
+            measurement: Measurement do rollup
+
+        Returns:
+            dict: Estatísticas no formato de InfluxDBService.buscar_estatisticas
+        """
+        somaveis = '|'.join(ESTATISTICAS_SOMAVEIS)
+        query = f'''
+        dados = from(bucket: "{self.service.bucket}")
+            |> range(start: -{hours}h)
+            |> filter(fn: (r) => r["_measurement"] == "{measurement}")
+            |> group(columns: ["_field"])
+
+        union(tables: [
+            dados |> filter(fn: (r) => r["_field"] =~ /_({somaveis})$/) |> sum(),
+            dados |> filter(fn: (r) => r["_field"] =~ /_minimo$/) |> min(),
+            dados |> filter(fn: (r) => r["_field"] =~ /_maximo$/) |> max()
+        ])
+            |> keep(columns: ["_field", "_value"])
+        '''
+        result = self.service.query_api.query(org=self.service.org, query=query)
+
+        agregados = {campo: {} for campo in CAMPOS_ESTATISTICAS}
+        for table in result:
+            for record in table.records:
+                campo, estatistica = separar_campo(record.values.get('_field'))
+                if campo in agregados and estatistica:
+                    agregados[campo][estatistica] = record.get_value()
+
+        stats = {}
+        for campo, valores in agregados.items():
+            n = valores.get('contagem') or 0
+            brutos = {'contagem': n}
+            if n:
+                media = valores.get('soma', 0) / n
+                brutos.update(media=media, minimo=valores.get('minimo'),
+                              maximo=valores.get('maximo'))
+                if n > 1:
+                    variancia = (valores.get('soma_q', 0) - n * media * media) / (n - 1)
+                    brutos['desvio_padrao'] = math.sqrt(max(variancia, 0.0))
+            stats[campo] = formatar_estatisticas(brutos)
+        return stats
+
+    def buscar_leituras_agregadas(self, hours, intervalo_s, measurement, extremos=False):
+        """
+        Agregar um rollup em janelas de intervalo_s segundos
+
+        Args:
+            hours: Janela em horas
+            intervalo_s: Duração de cada janela (múltiplo da resolução do rollup)
+            measurement: Measurement do rollup
+            extremos: Se True, inclui mínimo e máximo de cada campo
+
+        Returns:
+            list: Janelas em ordem cronológica, como InfluxDBService.buscar_leituras_agregadas
+        """
+        janela = f'every: {intervalo_s}s, createEmpty: false, timeSrc: "_start"'
+        tabelas = [f'dados |> filter(fn: (r) => r["_field"] =~ /_(contagem|soma)$/) '
+                   f'|> aggregateWindow({janela}, fn: sum)']
+        if extremos:
+            tabelas.append(f'dados |> filter(fn: (r) => r["_field"] =~ /_minimo$/) '
+                           f'|> aggregateWindow({janela}, fn: min)')
+            tabelas.append(f'dados |> filter(fn: (r) => r["_field"] =~ /_maximo$/) '
+                           f'|> aggregateWindow({janela}, fn: max)')
+        uniao = ',\n            '.join(tabelas)
+
+        query = f'''
+        dados = from(bucket: "{self.service.bucket}")
+            |> range(start: -{hours}h)
+            |> filter(fn: (r) => r["_measurement"] == "{measurement}")
+            |> group(columns: ["_field"])
+
+        union(tables: [
+            {uniao}
+        ])
+            |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+            |> group()
+            |> sort(columns: ["_time"])
+        '''
+        result = self.service.query_api.query(org=self.service.org, query=query)
+
+        leituras = []
+        for table in result:
+            for record in table.records:
+                valores = {}
+                for campo in CAMPOS_AGREGADOS:
+                    contagem = record.values.get(f'{campo}_contagem')
+                    if contagem:
+                        valores[f'{campo}_media'] = record.values.get(f'{campo}_soma', 0) / contagem
+                    valores[f'{campo}_min'] = record.values.get(f'{campo}_minimo')
+                    valores[f'{campo}_max'] = record.values.get(f'{campo}_maximo')
+                leituras.append(formatar_leitura_agregada(valores, record.get_time(), extremos))
+        return leituras
+
+    def buscar_agregados_por_minuto(self, hours):
+        """
+        Ler o rollup de 1 minuto no formato de InfluxDBService.buscar_agregados_por_minuto
+
+        Returns:
+            list: Tuplas (campo, início do minuto em epoch segundos, estatística, valor)
+        """
+        query = f'''
+        from(bucket: "{self.service.bucket}")
+            |> range(start: -{hours}h)
+            |> filter(fn: (r) => r["_measurement"] == "{ROLLUPS[0][1]}")
+            |> keep(columns: ["_time", "_field", "_value"])
+        '''
+        result = self.service.query_api.query(org=self.service.org, query=query)
+
+        agregados = []
+        for table in result:
+            for record in table.records:
+                campo, estatistica = separar_campo(record.values.get('_field'))
+                if estatistica:
+                    agregados.append((campo, int(record.get_time().timestamp()),
+                                      estatistica, record.get_value()))
+        return agregados
+
+    def fechar(self, timeout=30):
+        """Parar a thread de compactação e liberar a trava"""
+        self._parar.set()
+        self._thread.join(timeout=timeout)
+        if self._trava is not None:
+            self._trava.close()
+            self._trava = None
+
+
+def _data(valor):
+    """Converter argumento ISO 8601 em datetime UTC (sem fuso = UTC)"""
+    momento = datetime.fromisoformat(valor.replace('Z', '+00:00'))
+    if momento.tzinfo is None:
+        momento = momento.replace(tzinfo=timezone.utc)
+    return momento.astimezone(timezone.utc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manutenção dos rollups')
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    reconstrucao = subparsers.add_parser('reconstruir',
+                                         help='Recompactar um período (ex: após importar leituras)')
+    reconstrucao.add_argument('--hours', type=int, default=24,
+                              help='Período recompactado, até agora (ignorado com --inicio)')
+    reconstrucao.add_argument('--inicio', type=_data, help='Início do período (ISO 8601)')
+    reconstrucao.add_argument('--fim', type=_data, help='Fim do período (ISO 8601, padrão: agora)')
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from influxdb_service import InfluxDBService
+
+    load_dotenv()
+    service = InfluxDBService(
+        url=os.getenv('INFLUXDB_URL'),
+        token=os.getenv('INFLUXDB_TOKEN'),
+        org=os.getenv('INFLUXDB_ORG'),
+        bucket=os.getenv('INFLUXDB_BUCKET')
+    )
+    inicio_execucao = time.perf_counter()
+    try:
+        fim = args.fim or datetime.now(timezone.utc)
+        inicio = args.inicio or fim - timedelta(hours=args.hours)
+        passos = reconstruir(service, inicio.timestamp(), fim.timestamp())
+        print(f"✅ Rollups reconstruídos de {formatar_rfc3339(inicio)} a {formatar_rfc3339(fim)} "
+              f"({passos} dias) em {time.perf_counter() - inicio_execucao:.1f}s")
+    finally:
+        service.fechar()
+
+
+if __name__ == '__main__':
+    main()
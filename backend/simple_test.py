@@ -3,11 +3,11 @@ Teste simples e direto - Envia uma leitura e mostra o resultado
 """
 import requests
 import json
-from datetime import datetime
+from datetime import datetime, timezone
 
 # Dados de teste
 dados = {
-    "timestamp": datetime.now().strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+    "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
     "temperatura_c": 25.5,
     "umidade_pct": 60.0,
     "luminosidade": 750,
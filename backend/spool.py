@@ -0,0 +1,334 @@
+"""
+Spool local de escrita (write-ahead) para o InfluxDB
+Grava cada leitura em arquivos de segmento no disco e envia ao InfluxDB
+em segundo plano, sobrevivendo a quedas da rede e reinícios do processo
+"""
+
+import json
+import os
+import random
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava, um processo por diretório
+    fcntl = None
+
+from fila_escrita import FilaCheiaError, escrever_isolando
+
+
+PREFIXO_SEGMENTO = 'segmento-'
+SUFIXO_SEGMENTO = '.lp'
+ARQUIVO_CHECKPOINT = 'checkpoint.json'
+# Linhas recusadas pelo banco (4xx): guardadas para análise e não reenviadas
+ARQUIVO_QUARENTENA = 'quarentena.lp'
+# Trava (flock) do processo que usa o diretório
+ARQUIVO_TRAVA = '.trava'
+PREFIXO_PROCESSO = 'processo-'
+
+# Volume máximo lido do disco a cada lote enviado
+BYTES_LEITURA = 4 * 1024 * 1024
+
+
+class SpoolEscrita:
+    """Arquivos de segmento append-only com thread de reenvio e checkpoint"""
+
+    def __init__(self, diretorio, escrever, tamanho_segmento=16 * 1024 * 1024,
+                 max_bytes=1024 * 1024 * 1024, fsync_intervalo_ms=100, tamanho_lote=5000,
+                 intervalo_retry_ms=1000, max_intervalo_retry_ms=60000, jitter_ms=500):
+        """
+        Inicializar spool e thread de envio
+
+        Vários processos (workers do Gunicorn) podem usar o mesmo diretório:
+        cada um trava um subdiretório livre (o próprio diretório, depois
+        processo-1, processo-2...). Um worker reiniciado ocupa o subdiretório
+        liberado e reenvia o que ficou pendente nele.
+
+        Args:
+            diretorio: Diretório onde os segmentos e o checkpoint são gravados
+            escrever: Função que recebe uma lista de linhas (line protocol) e grava
+                      no banco (deve lançar exceção em caso de falha)
+            tamanho_segmento: Tamanho (bytes) a partir do qual um novo segmento é aberto
+            max_bytes: Volume máximo pendente no disco antes de recusar leituras
+            fsync_intervalo_ms: Intervalo entre fsyncs agrupados (0 = fsync a cada escrita)
+            tamanho_lote: Número máximo de linhas por envio ao banco
+            intervalo_retry_ms: Espera base após uma falha de envio
+            max_intervalo_retry_ms: Espera máxima entre tentativas
+            jitter_ms: Atraso aleatório máximo somado a cada espera
+        """
+        self.escrever = escrever
+        self.tamanho_segmento = int(tamanho_segmento)
+        self.max_bytes = int(max_bytes)
+        self.fsync_intervalo = fsync_intervalo_ms / 1000.0
+        self.tamanho_lote = max(1, int(tamanho_lote))
+        self.intervalo_retry = intervalo_retry_ms / 1000.0
+        self.max_intervalo_retry = max_intervalo_retry_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+
+        self._trava = None
+        self.diretorio = self._ocupar_diretorio(diretorio)
+
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._novos_dados = threading.Event()
+        self._sujo = False
+
+        # Posição de leitura do envio: (número do segmento, offset em bytes)
+        self._checkpoint = self._carregar_checkpoint()
+
+        # Sempre escrever em um segmento novo: o último pode ter uma linha
+        # incompleta deixada por uma queda do processo
+        segmentos = self._listar_segmentos()
+        self._numero_ativo = (segmentos[-1] + 1) if segmentos else self._checkpoint[0]
+        self._arquivo = open(self._caminho(self._numero_ativo), 'ab')
+        self._tamanho_ativo = self._arquivo.tell()
+        self._pendentes = self._calcular_pendentes()
+
+        # Contadores de operação
+        self.enviados = 0
+        self.falhas = 0
+        self.rejeitados = 0
+
+        self._thread_envio = threading.Thread(target=self._executar_envio,
+                                              name='spool-envio', daemon=True)
+        self._thread_envio.start()
+        self._thread_fsync = None
+        if self.fsync_intervalo > 0:
+            self._thread_fsync = threading.Thread(target=self._executar_fsync,
+                                                  name='spool-fsync', daemon=True)
+            self._thread_fsync.start()
+
+    def _ocupar_diretorio(self, base):
+        """
+        Travar o primeiro diretório do spool que nenhum outro processo está usando
+
+        Returns:
+            str: Diretório ocupado por este processo
+        """
+        numero = 0
+        while True:
+            diretorio = base if numero == 0 else os.path.join(base, f'{PREFIXO_PROCESSO}{numero}')
+            os.makedirs(diretorio, exist_ok=True)
+            if fcntl is None:
+                return diretorio
+            trava = open(os.path.join(diretorio, ARQUIVO_TRAVA), 'a')
+            try:
+                fcntl.flock(trava.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                trava.close()
+                numero += 1
+                continue
+            self._trava = trava
+            if numero:
+                print(f"Spool: diretório {base} em uso por outro processo, usando {diretorio}")
+            return diretorio
+
+    def _caminho(self, numero):
+        """Caminho do arquivo de um segmento"""
+        return os.path.join(self.diretorio, f'{PREFIXO_SEGMENTO}{numero:010d}{SUFIXO_SEGMENTO}')
+
+    def _listar_segmentos(self):
+        """Números dos segmentos existentes, em ordem"""
+        numeros = []
+        for nome in os.listdir(self.diretorio):
+            if nome.startswith(PREFIXO_SEGMENTO) and nome.endswith(SUFIXO_SEGMENTO):
+                numeros.append(int(nome[len(PREFIXO_SEGMENTO):-len(SUFIXO_SEGMENTO)]))
+        return sorted(numeros)
+
+    def _carregar_checkpoint(self):
+        """Ler a última posição confirmada no banco"""
+        try:
+            with open(os.path.join(self.diretorio, ARQUIVO_CHECKPOINT)) as arquivo:
+                dados = json.load(arquivo)
+            return int(dados['segmento']), int(dados['offset'])
+        except (OSError, ValueError, KeyError):
+            segmentos = self._listar_segmentos()
+            return (segmentos[0] if segmentos else 0), 0
+
+    def _salvar_checkpoint(self, segmento, offset):
+        """Gravar checkpoint de forma atômica (arquivo temporário + rename)"""
+        caminho = os.path.join(self.diretorio, ARQUIVO_CHECKPOINT)
+        temporario = caminho + '.tmp'
+        with open(temporario, 'w') as arquivo:
+            json.dump({'segmento': segmento, 'offset': offset}, arquivo)
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+        os.replace(temporario, caminho)
+        self._checkpoint = (segmento, offset)
+
+    def _calcular_pendentes(self):
+        """Somar o volume dos segmentos a partir do checkpoint"""
+        segmento, offset = self._checkpoint
+        total = 0
+        for numero in self._listar_segmentos():
+            if numero < segmento:
+                continue
+            try:
+                tamanho = os.path.getsize(self._caminho(numero))
+            except OSError:
+                continue
+            total += tamanho - (offset if numero == segmento else 0)
+        return max(total, 0)
+
+    def pendentes_bytes(self):
+        """Volume (bytes) gravado no spool e ainda não confirmado no banco"""
+        return self._pendentes
+
+    def adicionar(self, linhas):
+        """
+        Gravar linhas (line protocol) no segmento ativo
+
+        Args:
+            linhas: Lista de strings, uma por ponto, com timestamp explícito
+
+        Raises:
+            FilaCheiaError: Se o volume pendente ultrapassar o limite configurado
+        """
+        if self._parar.is_set():
+            raise FilaCheiaError('Spool de escrita encerrado')
+        if self.max_bytes and self._pendentes > self.max_bytes:
+            raise FilaCheiaError(f'Spool de escrita cheio ({self.max_bytes} bytes pendentes)')
+
+        conteudo = ''.join(linha + '\n' for linha in linhas).encode('utf-8')
+        with self._lock:
+            if self._tamanho_ativo and self._tamanho_ativo + len(conteudo) > self.tamanho_segmento:
+                self._rotacionar()
+            self._arquivo.write(conteudo)
+            self._arquivo.flush()
+            self._tamanho_ativo += len(conteudo)
+            self._pendentes += len(conteudo)
+            if self.fsync_intervalo > 0:
+                self._sujo = True
+            else:
+                os.fsync(self._arquivo.fileno())
+        self._novos_dados.set()
+        return True
+
+    def _rotacionar(self):
+        """Fechar o segmento ativo e abrir o próximo (lock já adquirido)"""
+        self._arquivo.flush()
+        os.fsync(self._arquivo.fileno())
+        self._arquivo.close()
+        self._numero_ativo += 1
+        self._arquivo = open(self._caminho(self._numero_ativo), 'ab')
+        self._tamanho_ativo = 0
+        self._sujo = False
+
+    def _executar_fsync(self):
+        """Fsync agrupado: uma chamada por intervalo para todas as escritas"""
+        while not self._parar.wait(self.fsync_intervalo):
+            with self._lock:
+                if self._sujo:
+                    os.fsync(self._arquivo.fileno())
+                    self._sujo = False
+
+    def _ler_lote(self):
+        """
+        Ler o próximo lote de linhas completas a partir do checkpoint
+
+        Returns:
+            tuple: (linhas, segmento, novo offset) - linhas vazio se não há dados
+        """
+        segmento, offset = self._checkpoint
+        while True:
+            with self._lock:
+                ativo = self._numero_ativo
+            try:
+                with open(self._caminho(segmento), 'rb') as arquivo:
+                    arquivo.seek(offset)
+                    dados = arquivo.read(BYTES_LEITURA)
+            except FileNotFoundError:
+                dados = b''
+
+            # Considerar apenas linhas completas
+            fim = dados.rfind(b'\n') + 1
+            if fim > 0:
+                linhas = dados[:fim].split(b'\n')[:-1]
+                linhas = linhas[:self.tamanho_lote]
+                consumido = sum(len(linha) + 1 for linha in linhas)
+                return [linha.decode('utf-8') for linha in linhas], segmento, offset + consumido
+
+            if segmento >= ativo:
+                return [], segmento, offset
+
+            # Segmento antigo esgotado: descartar e seguir para o próximo
+            if dados:
+                print(f"Spool: descartando linha incompleta no segmento {segmento}")
+                with self._lock:
+                    self._pendentes -= len(dados)
+            try:
+                os.remove(self._caminho(segmento))
+            except FileNotFoundError:
+                pass
+            segmento, offset = segmento + 1, 0
+            self._salvar_checkpoint(segmento, offset)
+
+    def _executar_envio(self):
+        """Loop da thread que reenvia o spool ao banco"""
+        falhas_seguidas = 0
+        while True:
+            linhas, segmento, offset = self._ler_lote()
+            if not linhas:
+                if self._parar.is_set():
+                    return
+                self._novos_dados.wait(0.5)
+                self._novos_dados.clear()
+                continue
+
+            try:
+                recusadas = escrever_isolando(self.escrever, linhas)
+            except Exception as e:
+                self.falhas += 1
+                falhas_seguidas += 1
+                espera = min(self.intervalo_retry * (2 ** (falhas_seguidas - 1)),
+                             self.max_intervalo_retry) + random.uniform(0, self.jitter)
+                print(f"Erro ao enviar spool ({len(linhas)} linhas, "
+                      f"nova tentativa em {espera:.1f}s): {e}")
+                # Ao encerrar, os dados ficam no disco para o próximo início
+                if self._parar.wait(espera):
+                    return
+                continue
+
+            if recusadas:
+                self._quarentenar(recusadas)
+            falhas_seguidas = 0
+            self.enviados += len(linhas) - len(recusadas)
+            with self._lock:
+                self._pendentes -= offset - self._checkpoint[1]
+            self._salvar_checkpoint(segmento, offset)
+
+    def _quarentenar(self, recusadas):
+        """Mover linhas recusadas pelo banco para o arquivo de quarentena"""
+        self.rejeitados += len(recusadas)
+        print(f"Spool: {len(recusadas)} linhas recusadas pelo banco movidas para "
+              f"{ARQUIVO_QUARENTENA}: {recusadas[0][1]}")
+        with open(os.path.join(self.diretorio, ARQUIVO_QUARENTENA), 'a', encoding='utf-8') as arquivo:
+            for linha, _ in recusadas:
+                arquivo.write(linha + '\n')
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+
+    def fechar(self, timeout=30):
+        """
+        Encerrar o spool, tentando enviar o que estiver pendente
+
+        Dados não enviados permanecem no disco e são reenviados no
+        próximo início do processo.
+
+        Args:
+            timeout: Tempo máximo (segundos) para aguardar o envio final
+        """
+        if self._parar.is_set():
+            return
+        self._parar.set()
+        self._novos_dados.set()
+        self._thread_envio.join(timeout=timeout)
+        if self._thread_fsync is not None:
+            self._thread_fsync.join(timeout=timeout)
+        with self._lock:
+            self._arquivo.flush()
+            os.fsync(self._arquivo.fileno())
+            self._arquivo.close()
+        if self._trava is not None:
+            self._trava.close()
+            self._trava = None
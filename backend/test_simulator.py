@@ -6,7 +6,7 @@ Envia dados simulados para a API como se fosse o ESP32 real
 import requests
 import random
 import time
-from datetime import datetime
+from datetime import datetime, timezone
 import json
 
 # Configuração da API
@@ -52,7 +52,7 @@ def gerar_dados_simulados():
     probabilidade = round(probabilidade, 1)
     
     dados = {
-        "timestamp": datetime.now().strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+        "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
         "temperatura_c": temperatura,
         "umidade_pct": umidade,
         "luminosidade": luminosidade,
@@ -0,0 +1,281 @@
+"""
+Validação das leituras enviadas pelo robô
+Regras compartilhadas entre o endpoint individual e o de lote
+"""
+
+import json
+import re
+import time
+from datetime import datetime, timedelta, timezone
+
+
+# Campos que toda leitura precisa conter: (inteiro, mínimo, máximo)
+# Os limites são físicos (sensor/ADC), não de operação normal
+ESQUEMA_LEITURA = {
+    'temperatura_c': (False, -100.0, 150.0),
+    'umidade_pct': (False, 0.0, 100.0),
+    'luminosidade': (True, 0, 65535),
+    'presenca': (True, 0, 1),
+    'probabilidade_vida': (False, 0.0, 100.0)
+}
+CAMPOS_OBRIGATORIOS = list(ESQUEMA_LEITURA)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSSEGUNDO = timedelta(microseconds=1)
+
+# Intervalo de timestamps do InfluxDB (int64 em nanossegundos: ~1677 a 2262).
+# Uma linha fora dele é rejeitada pelo banco com 4xx depois do 201 ao robô
+TIMESTAMP_MIN_NS = -(2 ** 63) + 2
+TIMESTAMP_MAX_NS = 2 ** 63 - 2
+DATA_MIN = EPOCH + timedelta(microseconds=-(-TIMESTAMP_MIN_NS // 1000))
+DATA_MAX = EPOCH + timedelta(microseconds=TIMESTAMP_MAX_NS // 1000)
+TIMESTAMP_MAX_MS = TIMESTAMP_MAX_NS // 1_000_000
+
+# Quanto um timestamp pode estar à frente do relógio do servidor
+MAX_FUTURO_PADRAO_S = 300
+
+# Chave privada com o timestamp da leitura em epoch (ns), calculado uma única
+# vez por validar_leitura e lido pelas etapas seguintes (não vai nas respostas)
+CHAVE_NS = '_timestamp_ns'
+
+# Formato aceito para o identificador do robô (usado como tag no InfluxDB)
+PADRAO_ROBO_ID = re.compile(r'^[A-Za-z0-9_.:-]{1,64}$')
+
+
+def robo_id_valido(robo_id):
+    """Verificar se um identificador de robô tem o formato aceito"""
+    return isinstance(robo_id, str) and PADRAO_ROBO_ID.match(robo_id) is not None
+
+
+_AUSENTE = object()
+
+
+def _erro_tipo(campo, valor):
+    """Mensagem para um valor que não é int/float exato (None para subclasses numéricas)"""
+    if valor is _AUSENTE:
+        return f'Campo obrigatório ausente: {campo}'
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+        return f'Campo {campo} deve ser numérico'
+    return None
+
+
+def compilar_validador(esquema):
+    """
+    Gerar uma função que valida os campos medidos de uma leitura
+
+    As verificações de cada campo são desenroladas em código Python
+    (sem laço sobre o esquema nem consultas a dicionários de regras).
+    NaN e infinito falham na verificação de intervalo.
+
+    Args:
+        esquema: Dicionário campo -> (inteiro, mínimo, máximo)
+
+    Returns:
+        function: validar(dados) -> mensagem de erro ou None
+    """
+    linhas = ['def validar(dados):']
+    for campo, (inteiro, minimo, maximo) in esquema.items():
+        linhas += [
+            f'    v = dados.get({campo!r}, _AUSENTE)',
+            '    if type(v) is not float and type(v) is not int:',
+            f'        erro = _erro_tipo({campo!r}, v)',
+            '        if erro:',
+            '            return erro',
+            f'    if not ({minimo!r} <= v <= {maximo!r}):',
+            f'        return {f"Campo {campo} fora do intervalo [{minimo}, {maximo}]"!r}'
+        ]
+        if inteiro:
+            linhas += [
+                '    if type(v) is float and not v.is_integer():',
+                f'        return {f"Campo {campo} deve ser inteiro"!r}'
+            ]
+    linhas.append('    return None')
+    escopo = {'_AUSENTE': _AUSENTE, '_erro_tipo': _erro_tipo}
+    exec('\n'.join(linhas), escopo)
+    return escopo['validar']
+
+
+validar_campos = compilar_validador(ESQUEMA_LEITURA)
+
+
+def _timestamp_fora_do_intervalo(epoch_s, max_futuro_s, max_passado_s):
+    """Verificar a janela em torno do relógio do servidor (None = sem limite)"""
+    agora = time.time()
+    if max_futuro_s is not None and epoch_s > agora + max_futuro_s:
+        return True
+    return max_passado_s is not None and epoch_s < agora - max_passado_s
+
+
+def validar_leitura(dados, robo_id=None, max_futuro_s=MAX_FUTURO_PADRAO_S, max_passado_s=None):
+    """
+    Validar uma leitura e completar o timestamp quando ausente
+
+    O timestamp é convertido (ou gerado) uma única vez e guardado em epoch
+    (ns) na chave CHAVE_NS, lida por timestamp_leitura_ns.
+
+    Args:
+        dados: Dicionário com os dados da leitura (alterado in-place)
+        robo_id: Robô usado quando a leitura não traz 'robo_id' (ex: header X-Robo-Id)
+        max_futuro_s: Segundos que o timestamp pode estar à frente do servidor (None = sem limite)
+        max_passado_s: Idade máxima do timestamp em segundos (None = sem limite;
+                       leituras offline e importações costumam ser antigas)
+
+    Returns:
+        str: Mensagem de erro, ou None se a leitura for válida
+    """
+    if not isinstance(dados, dict):
+        return 'Leitura deve ser um objeto JSON'
+
+    erro = validar_campos(dados)
+    if erro:
+        return erro
+
+    if 'robo_id' not in dados and robo_id is not None:
+        dados['robo_id'] = robo_id
+    if 'robo_id' in dados and not robo_id_valido(dados['robo_id']):
+        return 'Campo robo_id inválido (até 64 caracteres: letras, números, _ . : -)'
+
+    # Se não houver timestamp, usar o atual (em microssegundos, como o ISO ecoado)
+    if 'timestamp' not in dados:
+        ns = time.time_ns() // 1000 * 1000
+        dados['timestamp'] = (EPOCH + timedelta(microseconds=ns // 1000)).isoformat().replace('+00:00', 'Z')
+    elif isinstance(dados['timestamp'], int) and not isinstance(dados['timestamp'], bool):
+        # Epoch em milissegundos (formatos binários): não precisa de parse
+        if not 0 <= dados['timestamp'] <= TIMESTAMP_MAX_MS:
+            return f'Timestamp inválido: {dados["timestamp"]}'
+        if _timestamp_fora_do_intervalo(dados['timestamp'] / 1000, max_futuro_s, max_passado_s):
+            return f'Timestamp inválido: {dados["timestamp"]} (fora da janela aceita)'
+        ns = dados['timestamp'] * 1_000_000
+    else:
+        try:
+            momento = datetime.fromisoformat(str(dados['timestamp']).replace('Z', '+00:00'))
+        except ValueError:
+            return f'Timestamp inválido: {dados["timestamp"]}'
+        if momento.tzinfo is None:
+            momento = momento.replace(tzinfo=timezone.utc)
+        if not DATA_MIN <= momento <= DATA_MAX:
+            return f'Timestamp inválido: {dados["timestamp"]}'
+        ns = _momento_ns(momento)
+        if _timestamp_fora_do_intervalo(ns / 1_000_000_000, max_futuro_s, max_passado_s):
+            return f'Timestamp inválido: {dados["timestamp"]} (fora da janela aceita)'
+
+    dados[CHAVE_NS] = ns
+    return None
+
+
+def leitura_publica(dados):
+    """Leitura sem as chaves privadas adicionadas pela validação (para respostas e arquivos)"""
+    if CHAVE_NS not in dados:
+        return dados
+    publica = dict(dados)
+    del publica[CHAVE_NS]
+    return publica
+
+
+def ler_lote(corpo, ndjson=False):
+    """
+    Extrair a lista de leituras do corpo de uma requisição de lote
+
+    Args:
+        corpo: Corpo da requisição (bytes ou str)
+        ndjson: True para uma leitura JSON por linha, False para array JSON
+
+    Returns:
+        tuple: (lista de leituras, lista de erros de parse por item)
+
+    Raises:
+        ValueError: Se o corpo não for um array JSON (modo não-NDJSON)
+    """
+    if isinstance(corpo, bytes):
+        corpo = corpo.decode('utf-8')
+
+    if ndjson:
+        leituras = []
+        erros = []
+        linhas = [linha for linha in corpo.splitlines() if linha.strip()]
+        for indice, linha in enumerate(linhas):
+            try:
+                leituras.append(json.loads(linha))
+            except ValueError as e:
+                leituras.append(None)
+                erros.append({'indice': indice, 'erro': f'JSON inválido: {e}'})
+        return leituras, erros
+
+    try:
+        leituras = json.loads(corpo)
+    except ValueError:
+        leituras = None
+    if not isinstance(leituras, list):
+        raise ValueError('Corpo deve ser um array JSON de leituras')
+    return leituras, []
+
+
+def validar_lote(leituras, erros, robo_id=None, max_futuro_s=MAX_FUTURO_PADRAO_S,
+                 max_passado_s=None):
+    """
+    Validar cada leitura de um lote com as regras de validar_leitura
+
+    Args:
+        leituras: Lista retornada por ler_lote
+        erros: Erros de parse já encontrados (itens ignorados na validação)
+        robo_id: Robô das leituras que não trazem 'robo_id'
+        max_futuro_s, max_passado_s: Janela do timestamp (ver validar_leitura)
+
+    Returns:
+        tuple: (leituras válidas, todos os erros ordenados por índice)
+    """
+    indices_com_erro = {erro['indice'] for erro in erros}
+    erros = list(erros)
+    validas = []
+    for indice, dados in enumerate(leituras):
+        if indice in indices_com_erro:
+            continue
+        erro = validar_leitura(dados, robo_id, max_futuro_s, max_passado_s)
+        if erro:
+            erros.append({'indice': indice, 'erro': erro})
+        else:
+            validas.append(dados)
+    erros.sort(key=lambda erro: erro['indice'])
+    return validas, erros
+
+
+def _momento_ns(momento):
+    """Converter datetime com fuso horário em epoch (ns)"""
+    # Aritmética inteira: o float de datetime.timestamp() perde microssegundos
+    return (momento - EPOCH) // MICROSSEGUNDO * 1000
+
+
+def timestamp_ns(timestamp):
+    """
+    Converter o timestamp de uma leitura em epoch (nanossegundos, inteiro)
+
+    Aceita ISO 8601 ou epoch inteiro em milissegundos. Timestamps ISO
+    sem fuso horário são tratados como UTC.
+
+    Raises:
+        ValueError: Se o timestamp não for ISO 8601 válido ou estiver fora do
+                    intervalo do InfluxDB
+    """
+    if isinstance(timestamp, int):
+        ns = timestamp * 1_000_000
+    else:
+        momento = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        if momento.tzinfo is None:
+            momento = momento.replace(tzinfo=timezone.utc)
+        ns = _momento_ns(momento)
+    if not TIMESTAMP_MIN_NS <= ns <= TIMESTAMP_MAX_NS:
+        raise ValueError(f'Timestamp fora do intervalo do InfluxDB: {timestamp}')
+    return ns
+
+
+def timestamp_leitura_ns(dados):
+    """
+    Timestamp de uma leitura em epoch (nanossegundos, inteiro)
+
+    Usa o valor calculado por validar_leitura; leituras que não passaram
+    pela validação (ex: vindas do banco) têm o timestamp convertido.
+    """
+    ns = dados.get(CHAVE_NS)
+    if ns is None:
+        return timestamp_ns(dados['timestamp'])
+    return ns
@@ -16,6 +16,9 @@ const char* password = "";
 
 String phoneNumber = "557181130658"; 
 String apiKey = "5000007"; // <-- COLOQUE A APIKEY QUE VOCÊ RECEBEU NO WHATSAPP
+// O backend avalia as regras de alerta e envia o WhatsApp (ALERTAS_CALLMEBOT_*).
+// true = enviar também daqui (o http.GET() bloqueia o loop de leitura)
+const bool alertaNoRobo = false;
 
 // --- Configurações MQTT ---
 const char* mqtt_server = "broker.hivemq.com"; // Broker MQTT público e gratuito
@@ -23,6 +26,8 @@ const char* mqtt_topic = "/robo/comandos"; // Tópico para receber comandos
 
 // --- Configurações do Backend Flask ---
 const char* backend_url = "http://10.0.11.142:5000/leituras"; // URL do backend Flask
+// true = envia o quadro binário compacto (33 bytes) em vez do JSON (~120 bytes)
+const bool usarQuadroBinario = false;
 
 // --- Mapeamento de Pinos ---
 const int DHT_PIN = 4;
@@ -57,6 +62,25 @@ String estadoRobo = "Desligado";
 unsigned long tempoAnterior = 0;
 const long intervalo = 2000;
 
+// --- Quadro binário (ver backend/formato_binario.py) ---
+// O ESP32 é little-endian, então as structs podem ser copiadas direto
+struct __attribute__((packed)) CabecalhoQuadro {
+  char magia[2];        // "RB"
+  uint8_t versao;       // 1
+  uint8_t flags;        // 0 = sem robo_id no quadro
+  uint16_t quantidade;  // número de amostras
+  int64_t base_ms;      // 0 = servidor usa o horário de recebimento
+};
+
+struct __attribute__((packed)) AmostraQuadro {
+  uint32_t idade_ms;    // idade da amostra no momento do envio
+  float temperatura_c;
+  float umidade_pct;
+  uint16_t luminosidade;
+  uint8_t presenca;
+  float probabilidade_vida;
+};
+
 // =======================================================================
 //              FUNÇÃO DE CALLBACK (CHAMADA PELO MQTT)
 // =======================================================================
@@ -309,7 +333,9 @@ void tomarDecisao() {
     estadoRobo = "Alerta";
 
     Serial.println("⚠️ ALERTA! Alta probabilidade de vida detectada!");
-    enviarAlertaWhatsApp();
+    if (alertaNoRobo) {
+      enviarAlertaWhatsApp();
+    }
   } 
   else if (estadoRobo == "Desligado") {
     // Robô desligado remotamente — LEDs indicam modo inativo
@@ -363,6 +389,11 @@ void enviarDadosBackend() {
     return;
   }
 
+  if (usarQuadroBinario) {
+    enviarQuadroBackend();
+    return;
+  }
+
   // Criar objeto JSON com os dados dos sensores
   StaticJsonDocument<256> doc;
   doc["temperatura_c"] = temperatura;
@@ -379,6 +410,8 @@ void enviarDadosBackend() {
   HTTPClient http;
   http.begin(backend_url);
   http.addHeader("Content-Type", "application/json");
+  // Sucesso volta sem corpo (o status basta); erros continuam com a mensagem
+  http.addHeader("Prefer", "return=minimal");
 
   // Enviar dados via POST
   int httpResponseCode = http.POST(jsonString);
@@ -409,6 +442,39 @@ void enviarDadosBackend() {
   Serial.println("------------------");
 }
 
+// =======================================================================
+//        ENVIAR DADOS NO QUADRO BINÁRIO COMPACTO
+// =======================================================================
+void enviarQuadroBackend() {
+  uint8_t quadro[sizeof(CabecalhoQuadro) + sizeof(AmostraQuadro)];
+
+  CabecalhoQuadro cabecalho = {{'R', 'B'}, 1, 0, 1, 0};
+  AmostraQuadro amostra;
+  amostra.idade_ms = 0;
+  amostra.temperatura_c = temperatura;
+  amostra.umidade_pct = umidade;
+  amostra.luminosidade = (uint16_t)luz;
+  amostra.presenca = presenca ? 1 : 0;
+  amostra.probabilidade_vida = (float)probabilidadeVida;
+
+  memcpy(quadro, &cabecalho, sizeof(cabecalho));
+  memcpy(quadro + sizeof(cabecalho), &amostra, sizeof(amostra));
+
+  HTTPClient http;
+  http.begin(backend_url);
+  http.addHeader("Content-Type", "application/vnd.robo.quadro");
+  http.addHeader("Prefer", "return=minimal");
+  int httpResponseCode = http.POST(quadro, sizeof(quadro));
+
+  if (httpResponseCode == 201) {
+    Serial.println("✅ Quadro binário registrado no backend!");
+  } else {
+    Serial.print("❌ Erro ao enviar quadro binário. Código: ");
+    Serial.println(httpResponseCode);
+  }
+  http.end();
+}
+
 // =======================================================================
 //               FUNÇÃO: ENVIAR ALERTA VIA CALLMEBOT (WHATSAPP)
 // =======================================================================